@@ -1,11 +1,11 @@
 import pandas as pd
-import sqlite3
 
 import plotly.express as px
 
 from adapter.serializer.samples import FinalAggregationSerializer
 from modules.queryManager import QueryManager
 from modules.configuration import Configuration
+from modules.connectionManager import ConnectionManager
 
 
 class Analyse:
@@ -17,12 +17,12 @@ class Analyse:
 
     def get_samples(self, sql_command: str) -> pd.DataFrame:
         """
-        Get samples from the database.
+        Get samples from the database, samples which are written meanwhile are not read halfway.
         """
-        connection = sqlite3.connect(self.configuration.get_database_file_path())
-        qm: QueryManager = QueryManager(connection=connection, configuration=self.configuration)
+        qm: QueryManager = QueryManager(configuration=self.configuration)
 
-        self.rows.deserialize(qm.get_result(sql_command))
+        with ConnectionManager.get(self.configuration).snapshot():
+            self.rows.deserialize(qm.get_result(sql_command))
 
         return self.rows.serialize()
 
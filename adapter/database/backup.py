@@ -0,0 +1,149 @@
+import os
+import sqlite3
+
+from adapter.database.storage_backend import StorageBackend, get_storage_backend
+from modules.configuration import Configuration
+from modules.connectionManager import ConnectionManager
+
+
+class DatabaseBackup:
+    """
+    Backup and restore of the database file with the online backup API of SQLite.
+    The pages are copied in steps of backup_pages pages, between the steps other connections can read and
+    write, so a running bootstrap does not have to stop. A full backup is written to a temporary file which
+    replaces the old backup when it is complete.
+    An incremental backup only copies the groups whose statistics in group_stats or whose write counter in
+    group_versions changed since the last backup, SQLite can not tell which pages changed. It needs a backup
+    with the same schema and both tables, otherwise a full backup is made.
+    Rows which are stored outside of the database, e.g. by the columnar storage, are copied by the storage
+    into a directory next to the backup.
+    """
+
+    # tables whose rows are copied with their group, the partitions of collections are added
+    group_tables: tuple[str, ...] = (
+        "collections", "sample_weights", "sample_aggregates", "group_stats", "group_versions", "import_digests"
+    )
+    stats_columns: str = "group_id, storage, nr_of_rows, nr_of_users, min_date, max_date, value_sum"
+
+    def __init__(self, configuration: Configuration) -> None:
+        self.configuration: Configuration = configuration
+        self.connection_manager: ConnectionManager = ConnectionManager.get(configuration)
+        self.pages: int = configuration.get_backup_pages()
+        self.storage: StorageBackend = get_storage_backend(configuration)
+
+    @staticmethod
+    def print_progress(status: int, remaining: int, total: int) -> None:
+        print(f"copied {total - remaining}/{total} pages")
+
+    def copy(self, source: sqlite3.Connection, target: sqlite3.Connection) -> None:
+        source.backup(target, pages=self.pages, progress=self.print_progress)
+
+    def get_storage_backup_path(self) -> str:
+        return f"{self.configuration.get_backup_database_file_path()}.{self.storage.name}"
+
+    def backup(self, incremental: bool = False) -> None:
+        backup_path: str = self.configuration.get_backup_database_file_path()
+        if incremental and os.path.exists(backup_path):
+            if not self.backup_changed_groups(backup_path):
+                print("[INFO] The backup can not be updated, a full backup is made.")
+                self.backup_database(backup_path)
+        else:
+            self.backup_database(backup_path)
+        # the storage only copies the chunks which are not in the backup yet
+        self.storage.backup(self.get_storage_backup_path())
+
+    def backup_database(self, backup_path: str) -> None:
+        temporary_path: str = f"{backup_path}.tmp"
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        source: sqlite3.Connection = self.connection_manager.connect()
+        target: sqlite3.Connection = sqlite3.connect(temporary_path)
+        try:
+            self.copy(source, target)
+        finally:
+            target.close()
+            source.close()
+        os.replace(temporary_path, backup_path)
+
+    def restore(self) -> None:
+        """
+        Copy the backup into the database file, the connections of this process are reopened afterwards.
+        """
+        self.connection_manager.close()
+        source: sqlite3.Connection = sqlite3.connect(self.configuration.get_backup_database_file_path())
+        target: sqlite3.Connection = self.connection_manager.connect(isolation_level=None)
+        try:
+            self.copy(source, target)
+        finally:
+            target.close()
+            source.close()
+        if os.path.exists(self.get_storage_backup_path()):
+            self.storage.restore(self.get_storage_backup_path())
+
+    def backup_changed_groups(self, backup_path: str) -> bool:
+        """
+        Copy the rows of the groups whose statistics changed into the backup. All groups are copied in
+        one transaction, which reads one snapshot of the database and only writes the backup, so an
+        interrupted backup keeps its last state and in WAL mode the writers of the database do not wait.
+        :return: false if the backup has another schema or the database has no group_stats or group_versions table
+        """
+        connection: sqlite3.Connection = self.connection_manager.connect(isolation_level=None)
+        try:
+            connection.execute("ATTACH DATABASE ? AS backup", (backup_path,))
+            schema: str = "SELECT type, name, sql FROM {}.sqlite_master WHERE name NOT LIKE 'sqlite_%' ORDER BY name"
+            if connection.execute(schema.format("main")).fetchall() != connection.execute(schema.format("backup")).fetchall():
+                return False
+            # the statistics alone do not change if a row is replaced by a row with the same value
+            if connection.execute(
+                    "SELECT COUNT(*) FROM main.sqlite_master WHERE type = 'table' AND name IN ('group_stats', 'group_versions')"
+            ).fetchone()[0] < 2:
+                return False
+
+            # databases which are not migrated may miss some of the tables
+            tables: list[str] = [
+                table_name for table_name in self.group_tables if connection.execute(
+                    "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+            ] + [partition[0] for partition in self.connection_manager.partitions.get_partitions(connection)]
+
+            # the transaction is rolled back when the connection is closed without a commit
+            connection.execute("BEGIN")
+            changed: list[int] = self.get_changed_groups(connection)
+            print(f"[INFO] {len(changed)} groups changed since the last backup.")
+            connection.execute("DELETE FROM backup.groups")
+            connection.execute("INSERT INTO backup.groups SELECT * FROM main.groups")
+            for number, group_id in enumerate(changed, start=1):
+                for table_name in tables:
+                    connection.execute(f"DELETE FROM backup.{table_name} WHERE group_id = ?", (group_id,))
+                    connection.execute(
+                        f"INSERT INTO backup.{table_name} SELECT * FROM main.{table_name} WHERE group_id = ?", (group_id,)
+                    )
+                print(f"copied {number}/{len(changed)} groups")
+            print("committing...", end="")
+            connection.execute("COMMIT")
+            print("done")
+            return True
+        finally:
+            connection.close()
+
+    def get_stamps(self, connection: sqlite3.Connection, database: str) -> dict[int, tuple]:
+        """
+        :return: group id -> statistics and write counter of every group of the database
+        """
+        stamps: dict[int, list] = {}
+        for row in connection.execute(f"SELECT {self.stats_columns} FROM {database}.group_stats"):
+            stamps[row[0]] = [row, None]
+        for group_id, version in connection.execute(f"SELECT group_id, version FROM {database}.group_versions"):
+            stamps.setdefault(group_id, [None, None])[1] = version
+        return {group_id: tuple(stamp) for group_id, stamp in stamps.items()}
+
+    def get_changed_groups(self, connection: sqlite3.Connection) -> list[int]:
+        """
+        :return: groups whose statistics or write counter differ between the database and the backup,
+                 including deleted groups
+        """
+        current: dict[int, tuple] = self.get_stamps(connection, "main")
+        backed_up: dict[int, tuple] = self.get_stamps(connection, "backup")
+        return sorted(
+            group_id for group_id in current.keys() | backed_up.keys()
+            if current.get(group_id) != backed_up.get(group_id)
+        )
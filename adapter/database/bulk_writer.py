@@ -0,0 +1,263 @@
+import re
+import sqlite3
+from itertools import repeat
+from typing import Iterable
+
+import numpy as np
+
+from adapter.database.group_stats import GroupStatsDelta, increase_versions
+from adapter.database.storage_backend import StorageBackend, get_storage_backend
+from modules.configuration import Configuration
+from modules.connectionManager import ConnectionManager
+from modules.dates import DateCodec
+from modules.partitionManager import PartitionManager
+
+
+class BulkWriter:
+    """
+    Writes large amounts of rows with sqlite3.executemany instead of the ORM.
+    All rows are written in one transaction until commit is called, the PRAGMAs of the
+    profile are applied to the connection and the indexes of a table can be dropped
+    during the load and rebuilt afterwards. The statistics of the written groups are
+    merged into the group_stats table in the same transaction.
+    """
+
+    PRAGMA_PROFILES: dict[str, dict[str, str | int]] = {
+        # fastest loading, a crash during the load can corrupt the database
+        "bulk": {
+            "journal_mode": "MEMORY",
+            "synchronous": "OFF",
+            "cache_size": -262144,
+            "temp_store": "MEMORY",
+        },
+        # fast loading which survives a crash of the process, but not of the operating system
+        "ingest": {
+            "journal_mode": "TRUNCATE",
+            "synchronous": "OFF",
+            "cache_size": -262144,
+            "temp_store": "MEMORY",
+        },
+        # durable writes
+        "safe": {
+            "journal_mode": "DELETE",
+            "synchronous": "FULL",
+            "cache_size": -65536,
+            "temp_store": "MEMORY",
+        },
+    }
+
+    def __init__(self, configuration: Configuration, profile: str | None = None) -> None:
+        self.configuration: Configuration = configuration
+        self.profile: str = profile if profile is not None else configuration.get_ingest_profile()
+
+        self._connection: sqlite3.Connection | None = None
+        self.deferred_indexes: list[tuple[str, str]] = []
+        self.group_stats: dict[int, GroupStatsDelta] = {}
+        # partitions which are known to exist
+        self.partition_tables: set[str] = set()
+        # partitions were created in the transaction, the views of the readers are recreated after the commit
+        self.created_partitions: bool = False
+        self.storage: StorageBackend = get_storage_backend(configuration)
+        self.date_codec: DateCodec = DateCodec(configuration.get_date_encoding())
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            # the transactions are handled by the writer
+            self._connection = ConnectionManager.get(self.configuration).acquire()
+            self.apply_profile(self.profile)
+        return self._connection
+
+    def apply_profile(self, profile: str) -> None:
+        for pragma, value in self.PRAGMA_PROFILES[profile].items():
+            # leaving WAL mode would make the readers wait for the writer again
+            if pragma == "journal_mode" and ConnectionManager.get(self.configuration).is_wal:
+                continue
+            self.connection.execute(f"PRAGMA {pragma} = {value}")
+
+    def begin(self) -> None:
+        ConnectionManager.get(self.configuration).begin_write(self.connection)
+
+    def commit(self, write_group_stats: bool = True) -> None:
+        """
+        :param write_group_stats: false keeps the statistics of the written groups for a later commit, so a
+                                  long import does not count the users of its group at every commit
+        """
+        if self._connection is not None and self._connection.in_transaction:
+            # the rows of a columnar storage are written before the groups and statistics are committed
+            self.storage.flush()
+            # the version of a group changes at every commit of its rows, also if its statistics are kept
+            increase_versions(self._connection, self.group_stats.keys())
+            if write_group_stats:
+                self.write_group_stats()
+            ConnectionManager.get(self.configuration).retry(self._connection.execute, "COMMIT")
+            if self.created_partitions:
+                ConnectionManager.get(self.configuration).partitions.changed()
+                self.created_partitions = False
+
+    def rollback(self) -> None:
+        self.storage.rollback()
+        self.group_stats = {}
+        self.partition_tables = set()
+        self.created_partitions = False
+        if self._connection is not None and self._connection.in_transaction:
+            self._connection.execute("ROLLBACK")
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self.commit()
+            ConnectionManager.get(self.configuration).release(self._connection)
+            self._connection = None
+            self.partition_tables = set()
+
+    def ensure_group(self, group_id: int, name: str) -> None:
+        self.begin()
+        self.connection.execute("INSERT OR IGNORE INTO groups (id, name) VALUES (?, ?)", (int(group_id), name))
+
+    def get_max_group_id(self) -> int:
+        return self.connection.execute("SELECT MAX(id) FROM groups").fetchone()[0] or 0
+
+    def insert_rows(self, table_name: str, columns: list[str], rows: Iterable[tuple]) -> int:
+        """
+        Insert tuples in the order of the columns.
+        :return: number of inserted rows
+        """
+        self.begin()
+        cursor: sqlite3.Cursor = self.connection.executemany(
+            f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+        )
+        return cursor.rowcount
+
+    def insert_columns(self, table_name: str, columns: dict[str, np.ndarray | list | int | str]) -> int:
+        """
+        Insert column arrays, a scalar is used for every row.
+        :return: number of inserted rows
+        """
+        length: int = max((len(values) for values in columns.values() if not np.isscalar(values)), default=1)
+        values: list[Iterable] = [
+            repeat(value, length) if np.isscalar(value) else self.to_list(value) for value in columns.values()
+        ]
+        return self.insert_rows(table_name, list(columns.keys()), zip(*values))
+
+    def insert_collections(self, group_id: int, user_ids, dates, values) -> int:
+        """
+        Insert rows into the collections table or the partition of the group, the dates are ISO date strings,
+        dates or day numbers and are written in the date encoding of the configuration.
+        With a columnar storage, the rows are written to the storage on commit.
+        """
+        dates = self.date_codec.encode(dates)
+        if self.storage.writes_collections:
+            self.begin()
+            inserted: int = self.storage.append(group_id, user_ids, dates, values)
+            self.add_group_stats(group_id, self.storage.name, inserted, user_ids=user_ids, dates=dates, values=values)
+            return inserted
+
+        table_name: str = self.get_collections_table(group_id)
+        inserted: int = self.insert_columns(f"main.{table_name}", {
+            "group_id": int(group_id),
+            "user_id": user_ids,
+            "date": dates,
+            "value": values
+        })
+        self.add_group_stats(group_id, "rows", inserted, user_ids=user_ids, dates=dates, values=values)
+        return inserted
+
+    def delete_collections(self, group_id: int, user_ids, dates) -> int:
+        """
+        Delete the rows of the group on the given days of the users, the user ids and dates are pairs.
+        The deleted rows are subtracted from the statistics of the group, see GroupStatsDelta.remove.
+        :return: number of deleted rows
+        """
+        if self.storage.writes_collections:
+            raise ValueError(f"rows of the {self.storage.name} storage can not be deleted")
+
+        table_name: str = self.get_collections_table(group_id)
+        self.begin()
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS deleted_days (user_id INTEGER, date)")
+        self.connection.execute("DELETE FROM temp.deleted_days")
+        self.connection.executemany(
+            "INSERT INTO temp.deleted_days VALUES (?, ?)",
+            zip(self.to_list(user_ids), self.to_list(self.date_codec.encode(dates)))
+        )
+        # CROSS JOIN keeps the days as the outer loop, so the rows are looked up through the user index
+        # instead of scanning the group for every day
+        rows: str = (
+            f"SELECT c.rowid FROM temp.deleted_days d CROSS JOIN main.{table_name} c "
+            f"ON c.user_id = d.user_id AND c.group_id = ? AND c.date = d.date"
+        )
+        deleted, value_sum = self.connection.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(value), 0) FROM main.{table_name} WHERE rowid IN ({rows})", (int(group_id),)
+        ).fetchone()
+        self.connection.execute(f"DELETE FROM main.{table_name} WHERE rowid IN ({rows})", (int(group_id),))
+
+        if int(group_id) not in self.group_stats:
+            self.group_stats[int(group_id)] = GroupStatsDelta(group_id, "rows")
+        self.group_stats[int(group_id)].remove(deleted, value_sum)
+        return deleted
+
+    def get_collections_table(self, group_id: int) -> str:
+        """
+        The table to which the rows of the group are written, a missing partition is created.
+        """
+        partitions: PartitionManager = ConnectionManager.get(self.configuration).partitions
+        table_name: str = partitions.get_table_name(group_id)
+        if table_name not in self.partition_tables:
+            self.begin()
+            if table_name != partitions.table_name and not partitions.table_exists(self.connection, table_name):
+                self.created_partitions = True
+            partitions.ensure_partition(self.connection, group_id)
+            self.partition_tables.add(table_name)
+        return table_name
+
+    def add_group_stats(self, group_id: int, storage: str, nr_of_rows: int,
+                        user_ids=None, dates=None, values=None) -> None:
+        """
+        Collect the statistics of rows written to a group, they are written on commit.
+        :param storage: rows, weighted or aggregate
+        """
+        if int(group_id) not in self.group_stats:
+            self.group_stats[int(group_id)] = GroupStatsDelta(group_id, storage)
+        self.group_stats[int(group_id)].add(nr_of_rows, user_ids=user_ids, dates=dates, values=values)
+
+    def write_group_stats(self) -> None:
+        # databases which are not migrated have no group_stats table
+        if self.group_stats and self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'group_stats'").fetchone():
+            for group_stats in self.group_stats.values():
+                group_stats.merge(self.connection)
+        self.group_stats = {}
+
+    def defer_indexes(self, table_name: str) -> None:
+        """
+        Drop the indexes of the table, they are rebuilt by restore_indexes.
+        """
+        indexes: list[tuple[str, str]] = self.connection.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (table_name,)
+        ).fetchall()
+        self.begin()
+        for name, _ in indexes:
+            self.connection.execute(f"DROP INDEX IF EXISTS {name}")
+        self.deferred_indexes.extend(indexes)
+
+    def restore_indexes(self) -> None:
+        self.begin()
+        for _, sql in self.deferred_indexes:
+            # a rollback may already have restored the index
+            self.connection.execute(re.sub(r"^CREATE (UNIQUE )?INDEX", r"CREATE \1INDEX IF NOT EXISTS", sql))
+        self.deferred_indexes = []
+
+    @staticmethod
+    def to_list(values) -> list:
+        # sqlite3 can not bind numpy scalars
+        return values.tolist() if isinstance(values, np.ndarray) else list(values)
+
+    def __enter__(self) -> "BulkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.rollback()
+        if self.deferred_indexes:
+            self.restore_indexes()
+        self.close()
@@ -0,0 +1,373 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from adapter.database.query_filters import QueryFilters
+from adapter.database.storage_backend import StorageBackend
+from modules.configuration import Configuration
+from modules.dates import DateCodec
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+class ColumnarStore(StorageBackend):
+    """
+    Stores every group as compressed column chunks, as .npz files or as Parquet files if pyarrow is installed.
+    The rows of a chunk are sorted by date and user. The manifest holds the row count and the date and user
+    range (zone map) of every chunk, so a scan skips the groups and chunks which can not match its filters
+    and reads only the columns it needs.
+    """
+
+    name: str = "columnar"
+    writes_collections: bool = True
+    native_queries: tuple[str, ...] = (
+        "group_dataset", "distinct_users", "data_as_bootstrap_sample", "all_data",
+        "join_users_to_dataset", "join_users_index_to_dataset", "final_aggregation", "final_aggregation_weighted"
+    )
+
+    # columns which are stored in the chunks, the group id is given by the directory
+    stored_columns: tuple[str, ...] = ("id", "user_id", "date", "value")
+
+    def __init__(self, configuration: Configuration) -> None:
+        self.configuration: Configuration = configuration
+        self.path: str = configuration.get_storage_path()
+        self.chunk_size: int = configuration.get_storage_chunk_size()
+        self.date_codec: DateCodec = DateCodec(configuration.get_date_encoding())
+
+        storage_format: str = configuration.get_storage_format()
+        if storage_format == "auto":
+            storage_format = "parquet" if pq is not None else "npz"
+        if storage_format == "parquet" and pq is None:
+            raise ImportError("the parquet storage format needs pyarrow (pip install pyarrow)")
+        self.format: str = storage_format
+
+        # rows which are written on flush: group id -> list of (user_ids, dates, values)
+        self.buffers: dict[int, list[tuple[np.ndarray, np.ndarray, np.ndarray]]] = {}
+
+        self._manifest: dict | None = None
+        self._manifest_mtime: float | None = None
+
+    def get_manifest_path(self) -> str:
+        return os.path.join(self.path, "manifest.json")
+
+    def get_group_directory(self, group_id: int) -> str:
+        return os.path.join(self.path, f"group_{group_id}")
+
+    @property
+    def manifest(self) -> dict:
+        """
+        The manifest, it is read again when another process changed it.
+        """
+        mtime: float | None = os.path.getmtime(self.get_manifest_path()) if os.path.exists(self.get_manifest_path()) else None
+        if self._manifest is None or mtime != self._manifest_mtime:
+            if mtime is None:
+                self._manifest = {"next_row_id": 1, "groups": {}}
+            else:
+                with open(self.get_manifest_path(), "r") as manifest_file:
+                    self._manifest = json.load(manifest_file)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def save_manifest(self) -> None:
+        # the manifest is replaced atomically, chunks which are not in it are never read
+        os.makedirs(self.path, exist_ok=True)
+        temporary_path: str = f"{self.get_manifest_path()}.tmp"
+        with open(temporary_path, "w") as manifest_file:
+            json.dump(self.manifest, manifest_file)
+        os.replace(temporary_path, self.get_manifest_path())
+        self._manifest_mtime = os.path.getmtime(self.get_manifest_path())
+
+    def append(self, group_id: int, user_ids, dates, values) -> int:
+        """
+        Buffer rows of a group, they are written as chunks on flush.
+        :return: number of buffered rows
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.buffers.setdefault(int(group_id), []).append(
+            (user_ids, self.date_codec.encode(dates), np.asarray(values, dtype=np.int64))
+        )
+        return len(user_ids)
+
+    def flush(self) -> None:
+        """
+        Write the buffered rows of every group as sorted chunks of at most chunk_size rows.
+        """
+        if not self.buffers:
+            return
+        manifest: dict = self.manifest
+        for group_id, parts in self.buffers.items():
+            user_ids: np.ndarray = np.concatenate([part[0] for part in parts])
+            dates: np.ndarray = np.concatenate([part[1] for part in parts])
+            values: np.ndarray = np.concatenate([part[2] for part in parts])
+            order: np.ndarray = np.lexsort((user_ids, dates))
+
+            chunks: list[dict] = manifest["groups"].setdefault(str(group_id), [])
+            os.makedirs(self.get_group_directory(group_id), exist_ok=True)
+            for start in range(0, len(order), self.chunk_size):
+                rows: np.ndarray = order[start:start + self.chunk_size]
+                columns: dict[str, np.ndarray] = {
+                    "id": np.arange(manifest["next_row_id"], manifest["next_row_id"] + len(rows), dtype=np.int64),
+                    "user_id": user_ids[rows],
+                    "date": dates[rows],
+                    "value": values[rows],
+                }
+                file_name: str = f"chunk_{len(chunks)}.{self.format}"
+                self.write_chunk(os.path.join(self.get_group_directory(group_id), file_name), columns)
+                chunks.append({
+                    "file": file_name,
+                    "rows": len(rows),
+                    "min_date": columns["date"][0].item(),
+                    "max_date": columns["date"][-1].item(),
+                    "min_user_id": int(columns["user_id"].min()),
+                    "max_user_id": int(columns["user_id"].max()),
+                    "value_sum": int(columns["value"].sum()),
+                })
+                manifest["next_row_id"] += len(rows)
+        self.buffers = {}
+        self.save_manifest()
+
+    def rollback(self) -> None:
+        self.buffers = {}
+
+    def write_chunk(self, path: str, columns: dict[str, np.ndarray]) -> None:
+        if self.format == "parquet":
+            pq.write_table(pa.table(columns), path, row_group_size=self.chunk_size, compression="zstd")
+        else:
+            np.savez_compressed(path, **columns)
+
+    def read_chunk(self, path: str, columns: list[str], filters: list[tuple]) -> dict[str, np.ndarray]:
+        """
+        Read only the given columns of a chunk, Parquet files also skip their row groups with the filters.
+        """
+        if path.endswith(".parquet"):
+            table = pq.read_table(path, columns=columns, filters=filters or None)
+            return {column: table.column(column).to_numpy().astype(self.date_codec.dtype if column == "date" else np.int64)
+                    for column in columns}
+        # the members of an .npz file are read lazily, one column at a time
+        with np.load(path) as chunk:
+            return {column: chunk[column] for column in columns}
+
+    def scan(self, group_ids: list[int] | None = None, columns: tuple[str, ...] = ("user_id", "date", "value"),
+             min_date: str | None = None, max_date: str | None = None,
+             user_ids: list[int] | None = None) -> dict[str, np.ndarray]:
+        wanted_users: np.ndarray | None = np.unique(np.asarray(user_ids, dtype=np.int64)) if user_ids is not None else None
+        min_date = self.date_codec.encode_value(min_date)
+        max_date = self.date_codec.encode_value(max_date)
+        filters: list[tuple] = []
+        if min_date is not None:
+            filters.append(("date", ">=", min_date))
+        if max_date is not None:
+            filters.append(("date", "<=", max_date))
+        if wanted_users is not None:
+            filters.append(("user_id", "in", wanted_users.tolist()))
+        read_columns: list[str] = sorted(
+            {column for column in columns if column != "group_id"} | {column for column, _, _ in filters},
+            key=self.stored_columns.index
+        )
+
+        groups: dict[str, list[dict]] = self.manifest["groups"]
+        parts: list[dict[str, np.ndarray]] = []
+        for group_id in (groups.keys() if group_ids is None else [str(int(group_id)) for group_id in group_ids]):
+            for chunk in groups.get(group_id, []):
+                # zone maps: the chunk is skipped without being opened
+                if (min_date is not None and chunk["max_date"] < min_date) or \
+                        (max_date is not None and chunk["min_date"] > max_date):
+                    continue
+                if wanted_users is not None and not np.any(
+                        (wanted_users >= chunk["min_user_id"]) & (wanted_users <= chunk["max_user_id"])):
+                    continue
+
+                rows: dict[str, np.ndarray] = self.read_chunk(
+                    os.path.join(self.get_group_directory(int(group_id)), chunk["file"]), read_columns, filters
+                )
+                mask: np.ndarray = np.ones(len(rows[read_columns[0]]) if read_columns else chunk["rows"], dtype=bool)
+                if min_date is not None:
+                    mask &= rows["date"] >= min_date
+                if max_date is not None:
+                    mask &= rows["date"] <= max_date
+                if wanted_users is not None:
+                    mask &= np.isin(rows["user_id"], wanted_users)
+                rows = {column: values[mask] for column, values in rows.items()}
+                rows["group_id"] = np.full(int(mask.sum()), int(group_id), dtype=np.int64)
+                parts.append(rows)
+
+        return {
+            column: np.concatenate([part[column] for part in parts]) if parts
+            else np.empty(0, dtype=self.date_codec.dtype if column == "date" else np.int64)
+            for column in columns
+        }
+
+    def get_version(self, group_id: int) -> list:
+        chunks: list[dict] = self.manifest["groups"].get(str(int(group_id)), [])
+        return [sum(chunk["rows"] for chunk in chunks), len(chunks), sum(chunk["value_sum"] for chunk in chunks)]
+
+    def run_query(self, query_manager, query_name: str, *args, **kwargs) -> list:
+        """
+        Answer a named query from the chunks, the rows have the same columns as the SQL of the query.
+        """
+        if query_name == "group_dataset":
+            return self.to_rows(self.scan([args[0]], ("user_id", "date", "value")))
+        if query_name == "distinct_users":
+            return [(user_id,) for user_id in np.unique(self.scan(columns=("user_id",))["user_id"]).tolist()]
+        if query_name == "data_as_bootstrap_sample":
+            return [
+                (user_id,) for user_id in np.unique(self.scan([kwargs["group_id"]], ("user_id",))["user_id"]).tolist()
+            ]
+        if query_name == "all_data":
+            return self.to_rows(self.scan(columns=self.columns))
+        if query_name == "join_users_to_dataset":
+            return self.to_rows(self.scan(columns=self.columns, user_ids=[args[0]]))
+        if query_name == "join_users_index_to_dataset":
+            user_ids: list[int] = [
+                row[0] for row in query_manager.connection.execute("SELECT user_id FROM temp.bootstrap_users")
+            ]
+            return self.to_rows(self.scan([kwargs["group_id"]], columns=self.columns, user_ids=user_ids))
+        if query_name == "final_aggregation":
+            return self.get_final_aggregation(QueryFilters(query_manager.get_query(query_name, **kwargs), args))
+        if query_name == "final_aggregation_weighted":
+            return self.get_weighted_aggregation(
+                query_manager, QueryFilters(query_manager.get_query(query_name, **kwargs), args))
+        return super().run_query(query_manager, query_name, *args, **kwargs)
+
+    def get_final_aggregation(self, filters: QueryFilters) -> list[tuple]:
+        """
+        The summed value of every date of the groups of the conditions of the query, the groups and chunks
+        which are outside of the group and date conditions are not read.
+        :return: (date, group_id, value) ordered by date and group like the rows of the SQL
+        """
+        filters.check(("collections", "group_id"), ("collections", "date"))
+        min_date, max_date = filters.get_range("collections", "date")
+        group_ids: np.ndarray = np.array(sorted(int(group_id) for group_id in self.manifest["groups"]), dtype=np.int64)
+
+        rows: list[tuple] = []
+        for group_id in group_ids[filters.matches("collections", "group_id", group_ids)].tolist():
+            dates, totals = self.get_daily_totals(group_id, min_date, max_date)
+            selected: np.ndarray = filters.matches("collections", "date", dates)
+            rows.extend(zip(dates[selected].tolist(), [group_id] * int(selected.sum()), totals[selected].tolist()))
+        return sorted(rows)
+
+    def get_weighted_aggregation(self, query_manager, filters: QueryFilters) -> list[tuple]:
+        """
+        The summed value times the multiplicity of the user of every date of the weighted samples of the
+        conditions of the query. Only the drawn users of a test-group are read, the chunks outside of their
+        user range and the date conditions are skipped.
+        :return: (date, group_id, value) ordered by date and sample like the rows of the SQL
+        """
+        filters.check(("sample_weights", "group_id"), ("sample_weights", "source_group_id"),
+                      ("collections", "group_id"), ("collections", "date"))
+        min_date, max_date = filters.get_range("collections", "date")
+        conditions: list[str] = []
+        parameters: list = []
+        for column in ("group_id", "source_group_id"):
+            condition, condition_parameters = filters.get_sql("sample_weights", column)
+            conditions.append(condition)
+            parameters.extend(condition_parameters)
+        weights: np.ndarray = np.array(query_manager.connection.execute(
+            f"SELECT group_id, source_group_id, user_id, multiplicity FROM sample_weights "
+            f"WHERE {' AND '.join(conditions)} ORDER BY group_id, user_id", parameters
+        ).fetchall(), dtype=np.int64).reshape(-1, 4)
+        # the test-group of a sample is the group of the rows which are joined to it
+        weights = weights[filters.matches("collections", "group_id", weights[:, 1])]
+
+        rows: list[tuple] = []
+        for source_group_id in np.unique(weights[:, 1]).tolist():
+            source_weights: np.ndarray = weights[weights[:, 1] == source_group_id]
+            source_rows: dict[str, np.ndarray] = self.scan(
+                [source_group_id], ("user_id", "date", "value"), min_date=min_date, max_date=max_date,
+                user_ids=np.unique(source_weights[:, 2])
+            )
+            selected: np.ndarray = filters.matches("collections", "date", source_rows["date"])
+            source_rows = {column: values[selected] for column, values in source_rows.items()}
+            dates, date_positions = np.unique(source_rows["date"], return_inverse=True)
+
+            for group_id in np.unique(source_weights[:, 0]).tolist():
+                # the users of a sample are sorted, every row gets the multiplicity of its user or 0
+                sample_users: np.ndarray = source_weights[source_weights[:, 0] == group_id][:, 2:]
+                positions: np.ndarray = np.minimum(
+                    np.searchsorted(sample_users[:, 0], source_rows["user_id"]), len(sample_users) - 1)
+                drawn: np.ndarray = sample_users[positions, 0] == source_rows["user_id"]
+                totals: np.ndarray = np.zeros(len(dates), dtype=np.int64)
+                np.add.at(totals, date_positions[drawn], source_rows["value"][drawn] * sample_users[positions[drawn], 1])
+                joined: np.ndarray = np.bincount(date_positions[drawn], minlength=len(dates)) > 0
+                rows.extend(zip(dates[joined].tolist(), [group_id] * int(joined.sum()), totals[joined].tolist()))
+        return sorted(rows)
+
+    @staticmethod
+    def to_rows(columns: dict[str, np.ndarray]) -> list[tuple]:
+        return list(zip(*(values.tolist() for values in columns.values())))
+
+    def delete_groups(self, min_group_id: int, max_group_id: int) -> None:
+        groups: dict[str, list[dict]] = self.manifest["groups"]
+        deleted: list[str] = [group_id for group_id in groups if min_group_id <= int(group_id) <= max_group_id]
+        if not deleted:
+            return
+        for group_id in deleted:
+            del groups[group_id]
+        # the manifest is written first, so a crash leaves only unreferenced files
+        self.save_manifest()
+        for group_id in deleted:
+            shutil.rmtree(self.get_group_directory(int(group_id)), ignore_errors=True)
+
+    def backup(self, path: str) -> None:
+        print(f"[INFO] {self.copy_store(self.path, path)} chunks of the {self.name} storage copied.")
+
+    def restore(self, path: str) -> None:
+        self.buffers = {}
+        self.copy_store(path, self.path)
+        self._manifest = None
+
+    @staticmethod
+    def copy_store(source: str, target: str) -> int:
+        """
+        Copy the chunks of the manifest of a storage directory. The chunks of a group are never changed, so
+        chunks with the same size and modification time in the target are kept. The manifest is written
+        last and the groups which are not in it are removed afterwards.
+        :return: number of copied chunks
+        """
+        manifest_path: str = os.path.join(source, "manifest.json")
+        manifest: dict = {"next_row_id": 1, "groups": {}}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as manifest_file:
+                manifest = json.load(manifest_file)
+
+        copied: int = 0
+        for group_id, chunks in manifest["groups"].items():
+            os.makedirs(os.path.join(target, f"group_{group_id}"), exist_ok=True)
+            for chunk in chunks:
+                source_path: str = os.path.join(source, f"group_{group_id}", chunk["file"])
+                target_path: str = os.path.join(target, f"group_{group_id}", chunk["file"])
+                if os.path.exists(target_path) and (os.stat(source_path).st_size, os.stat(source_path).st_mtime_ns) \
+                        == (os.stat(target_path).st_size, os.stat(target_path).st_mtime_ns):
+                    continue
+                shutil.copy2(source_path, target_path)
+                copied += 1
+
+        os.makedirs(target, exist_ok=True)
+        temporary_path: str = os.path.join(target, "manifest.json.tmp")
+        with open(temporary_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temporary_path, os.path.join(target, "manifest.json"))
+        for directory in os.listdir(target):
+            if directory.startswith("group_") and directory[len("group_"):] not in manifest["groups"]:
+                shutil.rmtree(os.path.join(target, directory), ignore_errors=True)
+        return copied
+
+    def get_group_stats(self, group_id: int | None = None) -> list[tuple]:
+        stats: list[tuple] = []
+        for stored_group_id, chunks in self.manifest["groups"].items():
+            if group_id is not None and int(stored_group_id) != int(group_id) or not chunks:
+                continue
+            user_ids: np.ndarray = self.scan([int(stored_group_id)], ("user_id",))["user_id"]
+            stats.append((
+                int(stored_group_id), self.name, sum(chunk["rows"] for chunk in chunks), len(np.unique(user_ids)),
+                min(chunk["min_date"] for chunk in chunks), max(chunk["max_date"] for chunk in chunks),
+                sum(chunk["value_sum"] for chunk in chunks)
+            ))
+        return stats
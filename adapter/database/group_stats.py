@@ -0,0 +1,92 @@
+import sqlite3
+from typing import Iterable
+
+import numpy as np
+
+
+def increase_versions(connection: sqlite3.Connection, group_ids: Iterable[int]) -> None:
+    """
+    Increase the write counters of the groups in the group_versions table, inside the transaction of the rows.
+    Databases which are not migrated have no group_versions table.
+    """
+    group_ids = [(int(group_id),) for group_id in group_ids]
+    if group_ids and connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'group_versions'").fetchone():
+        connection.executemany(
+            "INSERT INTO group_versions (group_id, version) VALUES (?, 1) "
+            "ON CONFLICT (group_id) DO UPDATE SET version = version + 1", group_ids
+        )
+
+
+class GroupStatsDelta:
+    """
+    Statistics of the rows which are written to one group in a transaction. They are merged into
+    the group_stats table on commit, so only the users of a group whose rows changed are counted again.
+    """
+
+    def __init__(self, group_id: int, storage: str) -> None:
+        self.group_id: int = int(group_id)
+        self.storage: str = storage
+
+        self.nr_of_rows: int = 0
+        # None if the users, dates or values of the storage are not known
+        self.user_ids: set[int] | None = None
+        # dates in the encoding of the rows
+        self.min_date: str | int | None = None
+        self.max_date: str | int | None = None
+        self.value_sum: int | None = None
+
+    def add(self, nr_of_rows: int, user_ids=None, dates=None, values=None) -> None:
+        """
+        Add the statistics of written rows.
+        :param nr_of_rows: number of written rows
+        :param user_ids: user ids of the rows
+        :param dates: encoded dates of the rows
+        :param values: values of the rows
+        """
+        self.nr_of_rows += int(nr_of_rows)
+        if user_ids is not None:
+            self.user_ids = (self.user_ids or set()) | set(np.unique(np.asarray(user_ids)).tolist())
+        if dates is not None and len(dates) > 0:
+            # numpy can not take the minimum of strings, but it can sort them
+            dates = np.unique(np.asarray(dates))
+            self.min_date = min(date for date in [self.min_date, dates[0].item()] if date is not None)
+            self.max_date = max(date for date in [self.max_date, dates[-1].item()] if date is not None)
+        if values is not None:
+            self.value_sum = (self.value_sum or 0) + int(np.sum(values, dtype=np.int64))
+
+    def remove(self, nr_of_rows: int, value_sum: int) -> None:
+        """
+        Subtract deleted rows. The dates are kept, so the deleted days of the users must be written
+        again, like the changed days of an incremental import. The users are counted again when they are read.
+        """
+        self.nr_of_rows -= int(nr_of_rows)
+        self.user_ids = self.user_ids or set()
+        self.value_sum = (self.value_sum or 0) - int(value_sum)
+
+    def merge(self, connection: sqlite3.Connection) -> None:
+        """
+        Merge the statistics into the group_stats table, inside the transaction of the rows.
+        """
+        existing: tuple | None = connection.execute(
+            "SELECT nr_of_rows, nr_of_users, min_date, max_date, value_sum FROM group_stats WHERE group_id = ?",
+            (self.group_id,)
+        ).fetchone()
+        nr_of_users: int | None = len(self.user_ids) if self.user_ids is not None else None
+        nr_of_rows, min_date, max_date, value_sum = self.nr_of_rows, self.min_date, self.max_date, self.value_sum
+
+        if existing is not None and existing[0] > 0:
+            nr_of_rows += existing[0]
+            min_date = min((date for date in [existing[2], min_date] if date is not None), default=None)
+            max_date = max((date for date in [existing[3], max_date] if date is not None), default=None)
+            value_sum = value_sum + existing[4] if value_sum is not None and existing[4] is not None else None
+            # the users of the new rows may already be in the group, counting them would read the whole group
+            # at every commit, so they are counted once when they are read, see QueryManager.count_users
+            nr_of_users = None
+
+        connection.execute(
+            "INSERT OR REPLACE INTO group_stats "
+            "(group_id, storage, nr_of_rows, nr_of_users, min_date, max_date, value_sum) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.group_id, self.storage, nr_of_rows, nr_of_users, min_date, max_date, value_sum)
+        )
@@ -0,0 +1,84 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from adapter.generator.matrix import UserDateMatrix
+from modules.configuration import Configuration
+from modules.queryManager import QueryManager
+
+
+class MatrixCache:
+    """
+    Persistent cache of the user x date matrices of the groups.
+    Every group is stored as .npy files, which are opened with numpy.memmap, together with
+    the data version of the group. A group whose data version changed is rebuilt on the next access.
+    """
+
+    arrays: tuple[str, ...] = ("user_ids", "dates", "values")
+
+    def __init__(self, configuration: Configuration, query_manager: QueryManager | None = None) -> None:
+        self.configuration: Configuration = configuration
+        self.query_manager: QueryManager = query_manager if query_manager is not None else QueryManager(configuration)
+
+        self.path: str = self.configuration.get_matrix_cache_path()
+
+    def get_group_directory(self, group_id: int) -> str:
+        return os.path.join(self.path, f"group_{group_id}")
+
+    def get_meta_path(self, group_id: int) -> str:
+        return os.path.join(self.get_group_directory(group_id), "meta.json")
+
+    def get(self, group_id: int) -> UserDateMatrix:
+        """
+        The matrix of the group, it is read from the cache or rebuilt if the group changed.
+        """
+        version: list = self.query_manager.get_group_version(group_id)
+        matrix: UserDateMatrix | None = self.load(group_id, version)
+        if matrix is None:
+            print(f"[INFO] Building the matrix cache of group {group_id}...")
+            self.build(group_id, version)
+            matrix = self.load(group_id, version)
+        return matrix
+
+    def load(self, group_id: int, version: list) -> UserDateMatrix | None:
+        """
+        Open the arrays of the group read-only as memory maps.
+        :return: None if the group is not cached or the cache is outdated
+        """
+        meta_path: str = self.get_meta_path(group_id)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r") as meta_file:
+            if json.load(meta_file)["version"] != version:
+                return None
+
+        directory: str = self.get_group_directory(group_id)
+        return UserDateMatrix(**{
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in self.arrays
+        })
+
+    def build(self, group_id: int, version: list) -> None:
+        matrix: UserDateMatrix = UserDateMatrix.from_group_rows(self.query_manager.get_result("group_dataset", group_id))
+
+        self.invalidate(group_id)
+        directory: str = self.get_group_directory(group_id)
+        os.makedirs(directory)
+        np.save(os.path.join(directory, "user_ids.npy"), matrix.user_ids)
+        # ISO dates are saved as strings instead of objects, day numbers as they are
+        np.save(os.path.join(directory, "dates.npy"),
+                matrix.dates if matrix.dates.dtype.kind in "iu" else matrix.dates.astype(str))
+        np.save(os.path.join(directory, "values.npy"), matrix.values)
+
+        # the meta file is written last, an interrupted build is never treated as valid
+        with open(self.get_meta_path(group_id), "w") as meta_file:
+            json.dump({"group_id": group_id, "version": version}, meta_file)
+
+    def invalidate(self, group_id: int) -> None:
+        if os.path.exists(self.get_group_directory(group_id)):
+            shutil.rmtree(self.get_group_directory(group_id))
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
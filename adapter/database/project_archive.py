@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import sqlite3
+from typing import Iterator
+
+from adapter.database.backup import DatabaseBackup
+from modules.configuration import Configuration
+from modules.connectionManager import ConnectionManager
+from modules.executors import bounded_map
+
+
+class ProjectArchive:
+    """
+    Snapshots of the project files which share their chunks.
+    Every file is split into chunks of chunk_size bytes, a chunk is stored once under its SHA-256 hash in
+    the chunks directory next to the snapshot, compressed with zlib. A snapshot is a JSON file which lists
+    the chunks of every file, so a backup only compresses and writes the chunks which changed since the
+    last backup. SQLite changes pages in place, so a database which only got new groups shares most of
+    its chunks with the last snapshot. The database is not read as it is, it is first copied with the backup
+    API of SQLite, so the snapshot holds its committed state including the WAL while a bootstrap keeps writing.
+    The chunks are hashed and compressed on a thread pool (hashlib and zlib release the GIL), the restore
+    streams the chunks of every file into a temporary file which replaces the file when it is complete.
+    """
+
+    format_version: int = 1
+    extension: str = ".snapshot"
+    chunk_directory: str = "chunks"
+
+    def __init__(self, configuration: Configuration, path: str) -> None:
+        """
+        :param path: path of the snapshot file, the chunks are stored in its directory
+        """
+        self.configuration: Configuration = configuration
+        self.path: str = path
+        self.chunk_path: str = os.path.join(os.path.dirname(os.path.abspath(path)), self.chunk_directory)
+
+        self.chunk_size: int = configuration.get_project_backup_chunk_size()
+        self.workers: int = configuration.get_project_backup_workers()
+        self.compression_level: int = configuration.get_project_backup_compression_level()
+
+    def get_files(self) -> list[tuple[str, str]]:
+        """
+        :return: (path, name in the snapshot) of every file of the project, the names are the ones of the zip backups
+        """
+        files: list[tuple[str, str]] = []
+        for root, directories, directory_files in os.walk(self.configuration.get_database_directory_path()):
+            # the snapshots and their chunks may be stored in the database directory, the journal and the
+            # WAL of SQLite must not be restored next to another version of the database
+            directories[:] = sorted(
+                directory for directory in directories
+                if os.path.abspath(os.path.join(root, directory)) != self.chunk_path
+            )
+            files.extend(
+                (os.path.join(root, file), os.path.relpath(os.path.join(root, file), self.configuration.get_data_directory_path()))
+                for file in sorted(directory_files)
+                if not file.endswith((self.extension, ".tmp", "-journal", "-wal", "-shm"))
+            )
+        files.append((os.path.abspath(self.configuration.get_query_path()), "queries.ini"))
+        files.append((os.path.abspath(self.configuration.get_config_path()), "configuration.ini"))
+        return files
+
+    def get_chunk_file_path(self, chunk_hash: str) -> str:
+        return os.path.join(self.chunk_path, chunk_hash[:2], chunk_hash)
+
+    def read_chunks(self, path: str) -> Iterator[tuple[bytes]]:
+        with open(path, "rb") as file:
+            while chunk := file.read(self.chunk_size):
+                yield (chunk,)
+
+    def store_chunk(self, chunk: bytes) -> tuple[str, int, bool]:
+        """
+        Store a chunk if it is not stored yet.
+        :return: hash and size of the chunk and whether it was written
+        """
+        chunk_hash: str = hashlib.sha256(chunk).hexdigest()
+        chunk_file_path: str = self.get_chunk_file_path(chunk_hash)
+        if os.path.exists(chunk_file_path):
+            return chunk_hash, len(chunk), False
+
+        os.makedirs(os.path.dirname(chunk_file_path), exist_ok=True)
+        temporary_path: str = f"{chunk_file_path}.{os.getpid()}.{id(chunk)}.tmp"
+        with open(temporary_path, "wb") as chunk_file:
+            chunk_file.write(zlib.compress(chunk, self.compression_level))
+        # a chunk file is complete once it has its name, an interrupted backup only leaves temporary files
+        os.replace(temporary_path, chunk_file_path)
+        return chunk_hash, len(chunk), True
+
+    def load_chunk(self, chunk_hash: str) -> bytes:
+        with open(self.get_chunk_file_path(chunk_hash), "rb") as chunk_file:
+            chunk: bytes = zlib.decompress(chunk_file.read())
+        if hashlib.sha256(chunk).hexdigest() != chunk_hash:
+            raise ValueError(f"the chunk {chunk_hash} of the backup is damaged")
+        return chunk
+
+    def copy_database(self, path: str) -> None:
+        """
+        Copy the committed state of the database into a file, other connections can write meanwhile.
+        """
+        source: sqlite3.Connection = ConnectionManager.get(self.configuration).connect()
+        target: sqlite3.Connection = sqlite3.connect(path)
+        try:
+            DatabaseBackup(self.configuration).copy(source, target)
+        finally:
+            target.close()
+            source.close()
+
+    def create(self) -> None:
+        snapshot: dict = {
+            "version": self.format_version,
+            "created": datetime.now().isoformat(),
+            "chunk_size": self.chunk_size,
+            "files": []
+        }
+        written: int = 0
+        reused: int = 0
+        database_file_path: str = os.path.abspath(self.configuration.get_database_file_path())
+        database_copy_path: str = f"{self.path}.database.tmp"
+        if os.path.exists(database_file_path):
+            self.copy_database(database_copy_path)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for path, name in self.get_files():
+                    if os.path.abspath(path) == database_file_path:
+                        path = database_copy_path
+                    chunks: list[str] = []
+                    size: int = 0
+                    for chunk_hash, chunk_size, is_new in bounded_map(
+                            executor, self.store_chunk, self.read_chunks(path), self.workers * 2):
+                        chunks.append(chunk_hash)
+                        size += chunk_size
+                        written += is_new
+                        reused += not is_new
+                    snapshot["files"].append({"name": name, "size": size, "chunks": chunks})
+                    print(f"- {name} ({len(chunks)} chunks)")
+        finally:
+            if os.path.exists(database_copy_path):
+                os.remove(database_copy_path)
+
+        # the snapshot is written last, it only refers to chunks which are stored
+        temporary_path: str = f"{self.path}.tmp"
+        with open(temporary_path, "w") as snapshot_file:
+            json.dump(snapshot, snapshot_file, indent=1)
+        os.replace(temporary_path, self.path)
+        print(f"[INFO] {written} chunks written, {reused} chunks reused from earlier backups.")
+
+    def restore(self) -> None:
+        with open(self.path, "r") as snapshot_file:
+            snapshot: dict = json.load(snapshot_file)
+        if snapshot.get("version") != self.format_version:
+            raise ValueError(f"unknown backup format {snapshot.get('version')}")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for file in snapshot["files"]:
+                if file["name"] in ("queries.ini", "configuration.ini"):
+                    path: str = os.path.join(self.configuration.get_config_directory_path(), file["name"])
+                else:
+                    path: str = os.path.join(self.configuration.get_data_directory_path(), file["name"])
+                print(f"- {file['name']}")
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+                # the chunks are loaded ahead on the pool and written in their order
+                temporary_path: str = f"{path}.restore.tmp"
+                with open(temporary_path, "wb") as target:
+                    for chunk in bounded_map(executor, self.load_chunk,
+                                             ((chunk_hash,) for chunk_hash in file["chunks"]), self.workers * 2):
+                        target.write(chunk)
+                    size: int = target.tell()
+                if size != file["size"]:
+                    os.remove(temporary_path)
+                    raise ValueError(f"{file['name']} has {size} bytes instead of {file['size']} bytes")
+                os.replace(temporary_path, path)
@@ -0,0 +1,140 @@
+import re
+from typing import Iterator
+
+import numpy as np
+
+from modules.dates import to_days
+
+
+class QueryFilters:
+    """
+    The conditions of the WHERE clause of a named query, for a storage which answers the query from its own
+    rows instead of running its SQL. The conditions must be joined by AND and compare a column with constants
+    or ? parameters: =, IN (...), BETWEEN ... AND ..., <, <=, > or >=. A condition becomes a set of values
+    and an inclusive range of integers, the dates are compared as day numbers.
+    """
+
+    condition_pattern: re.Pattern = re.compile(
+        r"(?:(\w+)\.)?(\w+)\s*(<=|>=|=|<|>|\bIN\b|\bBETWEEN\b)\s*(.+)", re.IGNORECASE | re.DOTALL
+    )
+    # a constant: a quoted string, an integer or a parameter
+    operand_pattern: str = r"'[^']*'|\"[^\"]*\"|-?\d+|\?"
+    keywords: set[str] = {"ON", "WHERE", "JOIN", "LEFT", "INNER", "CROSS", "GROUP", "ORDER", "LIMIT"}
+
+    def __init__(self, query: str, parameters: tuple = ()) -> None:
+        # alias or name -> table
+        self.tables: dict[str, str] = {}
+        for table, alias in re.findall(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", query, re.IGNORECASE):
+            self.tables.setdefault(table.lower(), table.lower())
+            if alias and alias.upper() not in self.keywords:
+                self.tables[alias.lower()] = table.lower()
+        # columns without an alias belong to the first table
+        self.first_table: str | None = next(iter(self.tables.values()), None)
+        # (table, column) -> values (None for every value), lowest and highest value
+        self.filters: dict[tuple[str, str], tuple[set[int] | None, int | None, int | None]] = {}
+
+        where: re.Match | None = re.search(
+            r"\bWHERE\b(.*?)(?:\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|$)", query, re.IGNORECASE | re.DOTALL
+        )
+        if where is None:
+            return
+        # the parameters before the WHERE clause are not conditions
+        parameter_iterator: Iterator = iter(parameters[query[:where.start(1)].count("?"):])
+        # the AND of a BETWEEN does not join two conditions
+        clause: str = re.sub(r"\bBETWEEN\s+(\S+)\s+AND\s+(\S+)", r"BETWEEN \1 \2", where.group(1), flags=re.IGNORECASE)
+        for condition in re.split(r"\bAND\b", clause, flags=re.IGNORECASE):
+            self.add(condition.strip(), parameter_iterator)
+
+    def add(self, condition: str, parameters: Iterator) -> None:
+        match: re.Match | None = self.condition_pattern.fullmatch(condition)
+        if match is None or re.search(r"\b(?:OR|NOT|SELECT)\b", condition, re.IGNORECASE) \
+                or not re.fullmatch(rf"[\s(),]*(?:(?:{self.operand_pattern})[\s(),]*)+", match.group(4)):
+            raise ValueError(f"the condition '{condition}' can not be applied without SQL")
+        alias, column, operator, operands = match.groups()
+        table: str | None = self.tables.get(alias.lower()) if alias else self.first_table
+        column = column.lower()
+
+        constants: list = [
+            next(parameters) if operand == "?" else operand.strip("'\"") if operand[0] in "'\"" else int(operand)
+            for operand in re.findall(self.operand_pattern, operands)
+        ]
+        numbers: list[int] = (to_days(constants) if column == "date" else np.asarray(constants, dtype=np.int64)).tolist()
+        values: set[int] | None = None
+        lowest: int | None = None
+        highest: int | None = None
+        operator = operator.upper()
+        if operator in ("=", "IN"):
+            values = set(numbers)
+        elif operator == "BETWEEN":
+            lowest, highest = numbers
+        elif operator in (">", ">="):
+            lowest = numbers[0] + (operator == ">")
+        else:
+            highest = numbers[0] - (operator == "<")
+
+        # conditions on the same column are all applied
+        old_values, old_lowest, old_highest = self.filters.get((table, column), (None, None, None))
+        if values is None:
+            values = old_values
+        elif old_values is not None:
+            values &= old_values
+        self.filters[(table, column)] = (
+            values,
+            max((number for number in (lowest, old_lowest) if number is not None), default=None),
+            min((number for number in (highest, old_highest) if number is not None), default=None)
+        )
+
+    def check(self, *columns: tuple[str, str]) -> None:
+        """
+        :param columns: (table, column) of the conditions which the storage applies
+        """
+        for table, column in self.filters:
+            if (table, column) not in columns:
+                raise ValueError(f"the condition on {table}.{column} can not be applied without SQL")
+
+    def get_range(self, table: str, column: str) -> tuple[int | None, int | None]:
+        """
+        :return: lowest and highest value which matches, None if any value matches
+        """
+        values, lowest, highest = self.filters.get((table, column), (None, None, None))
+        if values is not None:
+            if not values:
+                # no value matches
+                return 1, 0
+            lowest = max(number for number in (min(values), lowest) if number is not None)
+            highest = min(number for number in (max(values), highest) if number is not None)
+        return lowest, highest
+
+    def matches(self, table: str, column: str, values) -> np.ndarray:
+        """
+        :return: mask of the values which match the conditions on the column
+        """
+        values = to_days(values) if column == "date" else np.asarray(values, dtype=np.int64)
+        wanted, lowest, highest = self.filters.get((table, column), (None, None, None))
+        mask: np.ndarray = np.ones(len(values), dtype=bool)
+        if wanted is not None:
+            mask &= np.isin(values, list(wanted))
+        if lowest is not None:
+            mask &= values >= lowest
+        if highest is not None:
+            mask &= values <= highest
+        return mask
+
+    def get_sql(self, table: str, column: str) -> tuple[str, list]:
+        """
+        :return: the conditions on an integer column as SQL and their parameters
+        """
+        wanted, lowest, highest = self.filters.get((table, column), (None, None, None))
+        conditions: list[str] = []
+        parameters: list = []
+        if wanted is not None:
+            # an empty IN () is not valid SQL
+            conditions.append(f"{column} IN ({', '.join('?' * len(wanted))})" if wanted else "0")
+            parameters.extend(sorted(wanted))
+        if lowest is not None:
+            conditions.append(f"{column} >= ?")
+            parameters.append(lowest)
+        if highest is not None:
+            conditions.append(f"{column} <= ?")
+            parameters.append(highest)
+        return " AND ".join(conditions) or "1", parameters
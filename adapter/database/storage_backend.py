@@ -0,0 +1,164 @@
+import json
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from modules.configuration import Configuration
+from modules.connectionManager import ConnectionManager
+from modules.dates import DateCodec
+
+
+class StorageBackend(ABC):
+    """
+    Storage of the rows (group_id, user_id, date, value) of the collections table.
+    A scan only returns the requested columns of the rows which match the filters, a backend
+    pushes the filters down as far as it can.
+    """
+
+    name: str = ""
+    # the rows are written by the backend itself instead of the collections table
+    writes_collections: bool = False
+    # named queries which the backend answers itself instead of running their SQL
+    native_queries: tuple[str, ...] = ()
+
+    columns: tuple[str, ...] = ("id", "group_id", "user_id", "date", "value")
+
+    @abstractmethod
+    def scan(self, group_ids: list[int] | None = None, columns: tuple[str, ...] = ("user_id", "date", "value"),
+             min_date: str | None = None, max_date: str | None = None,
+             user_ids: list[int] | None = None) -> dict[str, np.ndarray]:
+        """
+        Read columns of the rows which match all given filters.
+        :param group_ids: groups which are read (default: all groups)
+        :param columns: columns which are returned
+        :param min_date: first date which is read (ISO string, date or day number)
+        :param max_date: last date which is read
+        :param user_ids: users which are read
+        :return: column name -> array, the dates are in the date encoding of the storage
+        """
+
+    @abstractmethod
+    def get_version(self, group_id: int) -> list:
+        """
+        A stamp of the data of a group, it changes when rows of the group are inserted, deleted or changed.
+        """
+
+    def get_daily_totals(self, group_id: int, min_date: str | None = None,
+                         max_date: str | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: dates and the summed value of every date, the sums are exact integers like the ones of SQL
+        """
+        rows: dict[str, np.ndarray] = self.scan([group_id], ("date", "value"), min_date=min_date, max_date=max_date)
+        dates, date_positions = np.unique(rows["date"], return_inverse=True)
+        totals: np.ndarray = np.zeros(len(dates), dtype=np.int64)
+        np.add.at(totals, date_positions, rows["value"])
+        return dates, totals
+
+    def run_query(self, query_manager, query_name: str, *args, **kwargs) -> list:
+        raise KeyError(f"{self.name} storage has no native query {query_name}")
+
+    def append(self, group_id: int, user_ids, dates, values) -> int:
+        raise NotImplementedError(f"{self.name} storage does not write the rows itself")
+
+    def flush(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def delete_groups(self, min_group_id: int, max_group_id: int) -> None:
+        pass
+
+    def get_group_stats(self, group_id: int | None = None) -> list[tuple]:
+        """
+        Statistics of the groups which are stored outside of the database, see QueryManager.refresh_group_stats.
+        """
+        return []
+
+    def backup(self, path: str) -> None:
+        """
+        Copy the rows which are stored outside of the database to the path, see DatabaseBackup.
+        """
+
+    def restore(self, path: str) -> None:
+        """
+        Replace the rows which are stored outside of the database with the copy of backup.
+        """
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    The rows are stored in the collections table (and its partitions) of the database.
+    """
+
+    name: str = "sqlite"
+
+    def __init__(self, configuration: Configuration) -> None:
+        self.configuration: Configuration = configuration
+        self.date_codec: DateCodec = DateCodec(configuration.get_date_encoding())
+
+    def scan(self, group_ids: list[int] | None = None, columns: tuple[str, ...] = ("user_id", "date", "value"),
+             min_date: str | None = None, max_date: str | None = None,
+             user_ids: list[int] | None = None) -> dict[str, np.ndarray]:
+        conditions: list[str] = []
+        parameters: list = []
+        for column, values in (("group_id", group_ids), ("user_id", user_ids)):
+            if values is not None:
+                conditions.append(f"{column} IN (SELECT value FROM json_each(?))")
+                parameters.append(json.dumps([int(value) for value in values]))
+        if min_date is not None:
+            conditions.append("date >= ?")
+            parameters.append(self.date_codec.encode_value(min_date))
+        if max_date is not None:
+            conditions.append("date <= ?")
+            parameters.append(self.date_codec.encode_value(max_date))
+
+        rows: list[tuple] = ConnectionManager.get(self.configuration).connection.execute(
+            f"SELECT {', '.join(columns)} FROM collections "
+            f"{'WHERE ' + ' AND '.join(conditions) if conditions else ''}", parameters
+        ).fetchall()
+        return {
+            column: np.array([row[position] for row in rows], dtype=self.date_codec.dtype if column == "date" else np.int64)
+            for position, column in enumerate(columns)
+        }
+
+    def get_version(self, group_id: int) -> list:
+        """
+        The write counter and the statistics of the group, every commit of rows of the group increases the counter.
+        """
+        connection = ConnectionManager.get(self.configuration).connection
+        if connection.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('group_versions', 'group_stats')"
+        ).fetchone()[0] < 2:
+            # databases which are not migrated have no write counters, the rows of the group are counted
+            return list(connection.execute(
+                "SELECT COUNT(*), MAX(id), TOTAL(value) FROM collections WHERE group_id = ?", (group_id,)
+            ).fetchone())
+        version: tuple | None = connection.execute(
+            "SELECT version FROM group_versions WHERE group_id = ?", (group_id,)).fetchone()
+        stats: tuple | None = connection.execute(
+            "SELECT storage, nr_of_rows, min_date, max_date, value_sum FROM group_stats WHERE group_id = ?",
+            (group_id,)
+        ).fetchone()
+        return [version[0] if version is not None else 0, *(stats or ())]
+
+
+backends: dict[tuple[str, str], StorageBackend] = {}
+
+
+def get_storage_backend(configuration: Configuration) -> StorageBackend:
+    """
+    The storage backend of the configuration, every backend is created once so that all writers share its buffers.
+    """
+    name: str = configuration.get_storage_backend()
+    key: tuple[str, str] = (name, configuration.get_storage_path() if name != SQLiteBackend.name
+                            else configuration.get_database_file_path())
+    if key not in backends:
+        if name == SQLiteBackend.name:
+            backends[key] = SQLiteBackend(configuration)
+        elif name == "columnar":
+            from adapter.database.columnar_store import ColumnarStore
+            backends[key] = ColumnarStore(configuration)
+        else:
+            raise ValueError(f"unknown storage backend {name}")
+    return backends[key]
@@ -1,92 +1,462 @@
-import random
 import time
-from datetime import datetime, timedelta
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from typing import Iterable, Iterator
+
+import numpy as np
 
 from modules.configuration import Configuration
-from adapter.database.database import Database
+from modules.executors import bounded_map
+from adapter.database.bulk_writer import BulkWriter
+from adapter.database.matrix_cache import MatrixCache
 from modules.queryManager import QueryManager
 
-from model.model import Collections, Groups
+from adapter.generator.checkpoint import BootstrapCheckpoint
+from adapter.generator.matrix import UserDateMatrix
+
+
+def draw_batch(seed_sequence: np.random.SeedSequence, size: int, output_size: int, dataset_size: int) -> np.ndarray:
+    """
+    Draw the indices of a batch of samples from the random stream of the batch.
+    :param seed_sequence: seed of the batch
+    :param size: number of samples in the batch
+    :param output_size: number of elements per sample
+    :param dataset_size: number of elements in the original dataset
+    :return: index array with one row per sample
+    """
+    # the smallest unsigned type which can address every element of the dataset
+    index_type: np.dtype = np.min_scalar_type(max(dataset_size - 1, 0))
+    return np.random.default_rng(seed_sequence).integers(
+        0, dataset_size, size=(size, output_size), dtype=index_type)
+
+
+def join_samples(user_index: dict[int, list], first_sample_index: int, samples: list[np.ndarray]) -> list[list]:
+    """
+    Replace the drawn users of the samples with their rows.
+    :param user_index: user_id -> rows of the user
+    :param first_sample_index: index of the first sample in the batch
+    :param samples: user ids of every sample
+    :return: joined samples
+    """
+    joined_samples: list[list] = []
+    for index, sample in enumerate(samples, start=first_sample_index):
+        joined_sample: list = []
+        for user_id in sample.tolist():
+            for row in user_index[user_id]:
+                joined_sample.append((row[0], index, row[2], row[3], row[4]))
+        joined_samples.append(joined_sample)
+    return joined_samples
+
+
+def bootstrap_batch(user_index: dict[int, list], dataset_user_ids: np.ndarray, matrix: UserDateMatrix | None,
+                    seed_sequence: np.random.SeedSequence, size: int, output_size: int, first_sample_index: int,
+                    output: str) -> list | np.ndarray:
+    """
+    Draw a batch of samples and turn it into the requested output.
+    :param output: 'indices', 'rows' (joined samples) or 'aggregates' (daily totals of the matrix)
+    :return: index arrays, joined samples or one row of daily totals per sample
+    """
+    indices: np.ndarray = draw_batch(seed_sequence, size, output_size, len(dataset_user_ids))
+    if output == "aggregates":
+        return matrix.resample_totals(indices)
+    if output == "rows":
+        return join_samples(user_index, first_sample_index, [dataset_user_ids[sample] for sample in indices])
+    return list(indices)
+
+
+# the state of a worker process is set once by the initializer
+_worker_user_index: dict[int, list] = {}
+_worker_dataset_user_ids: np.ndarray = np.empty(0, dtype=np.int64)
+_worker_matrix: UserDateMatrix | None = None
+
+
+def _initialize_worker(user_index: dict[int, list], dataset_user_ids: np.ndarray | None = None,
+                       matrix: UserDateMatrix | None = None) -> None:
+    global _worker_user_index, _worker_dataset_user_ids, _worker_matrix
+    _worker_user_index = user_index
+    if dataset_user_ids is not None:
+        _worker_dataset_user_ids = dataset_user_ids
+    _worker_matrix = matrix
+
+
+def _join_samples_in_worker(first_sample_index: int, samples: list[np.ndarray]) -> list[list]:
+    return join_samples(_worker_user_index, first_sample_index, samples)
+
+
+def _bootstrap_batch_in_worker(*arguments) -> list:
+    return bootstrap_batch(_worker_user_index, _worker_dataset_user_ids, _worker_matrix, *arguments)
 
 
 class Bootstrap:
-    def __init__(self, config, org: list | None = None) -> None:
+    def __init__(self, config, org: list | None = None, seed: int | None = None) -> None:
         if org is None:
             self.dataset: list = []
         else:
             self.dataset: list = org
+        self.dataset_user_ids: np.ndarray = np.array([data[0] for data in self.dataset], dtype=np.int64)
 
         self.config: Configuration = config
+        self.storage: str = self.config.get_bootstrap_storage()
+        self.source_group_id: int | None = None
+        self.matrix: UserDateMatrix | None = None
 
+        # every sample is an array of indices into the original dataset until the users are joined
         self.samples: list = []
+        self.seed_sequence: np.random.SeedSequence = np.random.SeedSequence(seed)
 
-        self.database: Database = Database(self.config)
-        self.query_manager: QueryManager = QueryManager(self.config, connection=self.database.get_sqlite3_session())
+        self.writer: BulkWriter = BulkWriter(self.config)
+        self.query_manager: QueryManager = QueryManager(self.config)
 
-    def set_original_dataset(self, dataset: list) -> None:
+    def set_original_dataset(self, dataset: list, group_id: int | None = None) -> None:
         self.dataset = dataset
+        self.dataset_user_ids = np.array([data[0] for data in self.dataset], dtype=np.int64)
+        self.source_group_id = group_id
+        self.matrix = None
 
-    def choice(self, nr_of_samples: int, output_size: int = None) -> list:
+    def check_dataset(self) -> None:
+        """
+        The samples are drawn from the users of the original dataset, an empty test-group has none.
+        """
+        if len(self.dataset) == 0:
+            if self.source_group_id is None:
+                raise ValueError("the original dataset is empty, there are no users to draw the samples from")
+            raise ValueError(f"the test-group {self.source_group_id} has no rows, there are no users to draw the samples from")
+
+    def choice(self, nr_of_samples: int, output_size: int = None, batch_size: int = 1000, workers: int = 1) -> list:
         """
         Bootstrapping
+        All indices of a batch of samples are drawn with one call of the random generator.
+        Every batch has its own random stream spawned from the seed, so the samples only depend
+        on the seed and the batch size and not on the number of workers.
+        :param nr_of_samples: number of samples to generate
+        :param output_size: number of elements per sample (default: size of the original dataset)
+        :param batch_size: number of samples which are drawn at once
+        :param workers: number of processes which draw the batches
+        :return: the samples as index arrays into the original dataset
         """
+        self.check_dataset()
         if output_size is None:
             output_size = len(self.dataset)
 
+        sizes: list[int] = self.get_batch_sizes(nr_of_samples, batch_size)
+        seeds: list[np.random.SeedSequence] = self.seed_sequence.spawn(len(sizes))
+        arguments: tuple = (seeds, sizes, [output_size] * len(sizes), [len(self.dataset)] * len(sizes))
+
         start_time: float = time.time()
-        for i in range(nr_of_samples):
-            temp_sample: list = []
-            for j in range(output_size):
-                temp_sample.append(random.choice(self.dataset))
-            self.samples.append(temp_sample)
-            print(f"created {i + 1}/{nr_of_samples} samples in {timedelta(seconds=(time.time() - start_time))}")
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                self._collect_batches(executor.map(draw_batch, *arguments), nr_of_samples, start_time)
+        else:
+            self._collect_batches(map(draw_batch, *arguments), nr_of_samples, start_time)
         print(f"inserted {nr_of_samples} samples in {timedelta(seconds=(time.time() - start_time))}")
         return self.samples
 
-    def join_users(self) -> None:
+    @staticmethod
+    def get_batch_sizes(nr_of_samples: int, batch_size: int) -> list[int]:
+        return [min(batch_size, nr_of_samples - batch_start) for batch_start in range(0, nr_of_samples, batch_size)]
+
+    def _collect_batches(self, batches, nr_of_samples: int, start_time: float) -> None:
+        created: int = 0
+        for indices in batches:
+            self.samples.extend(indices)
+            created += len(indices)
+            print(f"created {created}/{nr_of_samples} samples in {timedelta(seconds=(time.time() - start_time))}")
+
+    def get_sample_rows(self, sample) -> list:
+        """
+        Resolve a sample to the rows of the original dataset.
+        :param sample: index array or already joined rows
+        :return: rows of the sample
+        """
+        if isinstance(sample, np.ndarray):
+            return [self.dataset[index] for index in sample]
+        return sample
+
+    def build_user_index(self, user_ids: Iterable[int] | None = None) -> dict[int, list]:
+        """
+        Load the rows of every drawn user with a single query.
+        :param user_ids: users which should be loaded (default: all users of the samples)
+        :return: user_id -> rows of the user
+        """
+        if user_ids is None:
+            drawn: set[int] = set()
+            for sample in self.samples:
+                if isinstance(sample, np.ndarray):
+                    drawn.update(np.unique(sample).tolist())
+                else:
+                    drawn.update(range(len(self.dataset)))
+                    break
+            user_ids = {self.dataset[index][0] for index in drawn}
+
+        if self.source_group_id is None:
+            raise ValueError("the group of the original dataset is not known, see set_original_dataset")
+        user_ids = set(user_ids)
+        # the drawn users are also in the stored samples and other groups, only the rows of the test-group are joined
+        self.query_manager.set_bootstrap_users(user_ids, self.source_group_id)
+        user_index: dict[int, list] = {user_id: [] for user_id in user_ids}
+        for row in self.query_manager.get_result('join_users_index_to_dataset', group_id=self.source_group_id):
+            user_index[row[2]].append(row)
+        return user_index
+
+    def get_sample_user_ids(self, sample) -> np.ndarray:
+        if isinstance(sample, np.ndarray):
+            return self.dataset_user_ids[sample]
+        return np.array([data[0] for data in sample], dtype=np.int64)
+
+    def join_users(self, batch_size: int = 1000, workers: int = 1) -> None:
         print("joining users")
         start_time: float = time.time()
 
-        new_samples: list[list] = []
-        for index, sample in enumerate(self.samples):
-            new_sample: list = []
-            for i, data in enumerate(sample):
-                user_id: int = data[0]
-                result: list = self.query_manager.get_result('join_users_to_dataset', user_id)
-                for row in result:
-                    new_sample.append((row[0], index, row[2], row[3], row[4]))
+        user_index: dict[int, list] = self.build_user_index()
+        print(f"loaded {len(user_index)} users in {timedelta(seconds=(time.time() - start_time))}")
 
-            new_samples.append(new_sample)
+        batches: list[tuple[int, list[np.ndarray]]] = [
+            (batch_start, [self.get_sample_user_ids(sample) for sample in self.samples[batch_start:batch_start + batch_size]])
+            for batch_start in range(0, len(self.samples), batch_size)
+        ]
 
-            print(f"joined {index + 1}/{len(self.samples)} samples in {timedelta(seconds=(time.time() - start_time))}")
+        new_samples: list[list] = []
+        if workers > 1:
+            with ProcessPoolExecutor(
+                    max_workers=workers, initializer=_initialize_worker, initargs=(user_index,)) as executor:
+                for joined_samples in executor.map(_join_samples_in_worker, *zip(*batches)):
+                    new_samples.extend(joined_samples)
+                    print(f"joined {len(new_samples)}/{len(self.samples)} samples in {timedelta(seconds=(time.time() - start_time))}")
+        else:
+            for batch_start, samples in batches:
+                new_samples.extend(join_samples(user_index, batch_start, samples))
+                print(f"joined {len(new_samples)}/{len(self.samples)} samples in {timedelta(seconds=(time.time() - start_time))}")
 
         self.samples = new_samples
         print(f"joined {len(self.samples)} samples in {timedelta(seconds=(time.time() - start_time))}")
 
     def save_samples(self, sample_start_id: int = None) -> None:
         if sample_start_id is None:
-            sample_start_id = self.database.get_max_group_id() + 1
+            sample_start_id = self.writer.get_max_group_id() + 1
 
         total_time_start: float = time.time()
-        for sample_id, sample in enumerate(self.samples):
-            new_sample: Groups = Groups(
-                id=sample_id + sample_start_id,
-                name=f"Sample {sample_id + 1}",
-            )
-            self.database.get_or_create(model=Groups, id=new_sample.id, name=new_sample.name)
-            start_time: float = time.time()
-            rows: list[dict] = []
-            for index, data in enumerate(sample):
-                rows.append({
-                    'group_id': new_sample.id,
-                    'user_id': data[2],
-                    'date': datetime.strptime(data[3], "%Y-%m-%d").date(),
-                    'value': data[4]
-                })
-                if index % 10000 == 0 and index != 0:
-                    print(f"inserted {index} rows")
-            self.database.session.bulk_insert_mappings(Collections, rows)
-            self.database.commit()
-            print(f"inserted {len(rows)} rows in {timedelta(seconds=(time.time() - start_time))}")
+        self.save_batch(self.samples, first_sample_index=0, sample_start_id=sample_start_id)
         print(f"inserted {len(self.samples)} samples in {timedelta(seconds=(time.time() - total_time_start))}")
-        self.database.close()
+        self.writer.close()
+
+    def save_batch(self, samples: list | np.ndarray, first_sample_index: int, sample_start_id: int,
+                   checkpoint: BootstrapCheckpoint | None = None) -> None:
+        """
+        Save a batch of samples, every sample is committed on its own.
+        :param samples: index arrays, joined samples or daily totals (aggregate storage)
+        :param first_sample_index: index of the first sample of the batch
+        :param sample_start_id: group id of the first sample of the run
+        :param checkpoint: samples which are completed in the checkpoint are skipped, saved samples are recorded,
+                           the samples are saved with the storage of its run
+        """
+        completed: set[int] = checkpoint.get_completed_sample_indices() if checkpoint is not None else set()
+        # a resumed run keeps its storage, the configured storage of this bootstrap is not changed
+        storage: str = checkpoint.storage if checkpoint is not None else self.storage
+
+        if storage == "aggregate" and not isinstance(samples, np.ndarray):
+            samples = self.get_matrix().resample_totals(np.array(samples))
+
+        for sample_index, sample in enumerate(samples, start=first_sample_index):
+            if sample_index in completed:
+                continue
+            group_id: int = sample_index + sample_start_id
+            self.writer.ensure_group(group_id, f"Sample {sample_index + 1}")
+            start_time: float = time.time()
+            if storage == "aggregate":
+                self.save_aggregated_sample(group_id, sample)
+            elif storage == "weighted":
+                self.save_weighted_sample(group_id, sample)
+            else:
+                self.save_sample(group_id, sample)
+            self.writer.commit()
+            if checkpoint is not None:
+                checkpoint.complete_sample(sample_index)
+            print(f"saved sample {sample_index + 1} in {timedelta(seconds=(time.time() - start_time))}")
+
+    def save_sample(self, group_id: int, sample) -> None:
+        rows: list = self.get_sample_rows(sample)
+        # the dates are already encoded and are written as they are
+        inserted: int = self.writer.insert_collections(
+            group_id, [data[2] for data in rows], [data[3] for data in rows], [data[4] for data in rows]
+        )
+        print(f"inserted {inserted} rows")
+
+    def save_weighted_sample(self, group_id: int, sample) -> None:
+        """
+        Save the sample as (group_id, user_id, multiplicity) instead of copying the rows of the users.
+        The sample must not be joined.
+        """
+        if not isinstance(sample, np.ndarray):
+            raise ValueError("joined samples can not be saved with the weighted storage")
+
+        drawn_users, multiplicities = np.unique(self.dataset_user_ids[sample], return_counts=True)
+        inserted: int = self.writer.insert_columns("sample_weights", {
+            "group_id": group_id,
+            "source_group_id": self.source_group_id,
+            "user_id": drawn_users,
+            "multiplicity": multiplicities
+        })
+        self.writer.add_group_stats(group_id, "weighted", inserted, user_ids=drawn_users)
+        print(f"inserted {inserted} weighted users")
+
+    def save_aggregated_sample(self, group_id: int, totals: np.ndarray) -> None:
+        """
+        Save only the daily totals of the sample, which is what the final_aggregation query computes.
+        :param totals: one total per date of the matrix
+        """
+        values: np.ndarray = np.rint(totals).astype(np.int64)
+        dates: np.ndarray = self.writer.date_codec.encode(self.get_matrix().dates)
+        inserted: int = self.writer.insert_columns("sample_aggregates", {
+            "group_id": group_id,
+            "date": dates,
+            "value": values
+        })
+        self.writer.add_group_stats(group_id, "aggregate", inserted, dates=dates, values=values)
+        print(f"inserted {inserted} daily totals")
+
+    def get_matrix(self) -> UserDateMatrix:
+        """
+        The user x date matrix of the original dataset, it is built on first use from the matrix cache of
+        the test-group if it is enabled. The rows are in the order of the dataset.
+        """
+        if self.matrix is None:
+            if self.source_group_id is None:
+                raise ValueError("the group of the original dataset is not known, see set_original_dataset")
+            if self.config.matrix_cache_enabled():
+                matrix: UserDateMatrix = MatrixCache(self.config, self.query_manager).get(self.source_group_id)
+            else:
+                matrix: UserDateMatrix = UserDateMatrix.from_group_rows(
+                    self.query_manager.get_result("group_dataset", self.source_group_id))
+            self.matrix = matrix.select_users(self.dataset_user_ids)
+        return self.matrix
+
+    def stream(self, nr_of_samples: int, output_size: int = None, batch_size: int = 1000, workers: int = 1,
+               max_in_flight: int = 2, join: bool = True, sample_start_id: int = None,
+               checkpoint_path: str | None = None, overwrite_checkpoint: bool = False) -> Iterator[int]:
+        """
+        Resample, join and save the samples batch by batch.
+        Only max_in_flight batches are held in memory at the same time, none of them is kept in self.samples.
+        The samples are the same as the ones of choice with the same seed and batch size.
+        :param nr_of_samples: number of samples to generate
+        :param output_size: number of elements per sample (default: size of the original dataset)
+        :param batch_size: number of samples which are drawn, joined and saved at once
+        :param workers: number of processes which draw and join the batches
+        :param max_in_flight: number of batches which may be drawn and joined ahead of the database writer
+        :param join: join the rows of the users to the samples (ignored by the weighted and aggregate storage)
+        :param sample_start_id: group id of the first sample (default: next free group id)
+        :param checkpoint_path: the progress is written to this file after every batch (default: no checkpoints)
+        :param overwrite_checkpoint: replace the checkpoint of an unfinished run, which can not be resumed afterwards
+        :return: yields the number of saved samples after every batch
+        """
+        if not overwrite_checkpoint and BootstrapCheckpoint.is_unfinished(checkpoint_path):
+            raise FileExistsError(f"{checkpoint_path} holds the checkpoint of an unfinished run, resume it first")
+        self.check_dataset()
+        if output_size is None:
+            output_size = len(self.dataset)
+        if sample_start_id is None:
+            sample_start_id = self.writer.get_max_group_id() + 1
+        output: str = "indices"
+        if self.storage == "aggregate":
+            output = "aggregates"
+        elif join and self.storage != "weighted":
+            output = "rows"
+
+        checkpoint: BootstrapCheckpoint = BootstrapCheckpoint(
+            path=checkpoint_path, entropy=self.seed_sequence.entropy,
+            spawn_offset=self.seed_sequence.n_children_spawned, source_group_id=self.source_group_id,
+            dataset_size=len(self.dataset), nr_of_samples=nr_of_samples, output_size=output_size,
+            batch_size=batch_size, storage=self.storage, output=output, sample_start_id=sample_start_id,
+            dataset_hash=BootstrapCheckpoint.get_dataset_hash(self.dataset_user_ids)
+        )
+        # the streams of the batches belong to this run, a later run gets new ones
+        self.seed_sequence.spawn(len(checkpoint.get_batch_sizes()))
+
+        yield from self.run(checkpoint, workers=workers, max_in_flight=max_in_flight)
+
+    def resume(self, checkpoint: BootstrapCheckpoint, workers: int = 1, max_in_flight: int = 2) -> Iterator[int]:
+        """
+        Continue a run from its last checkpoint, the original dataset must be the one of the run.
+        Samples of the pending batch which are not recorded as completed may be partly written,
+        so they are deleted and saved again.
+        :return: yields the number of saved samples after every batch
+        """
+        if len(self.dataset) != checkpoint.dataset_size:
+            raise ValueError(
+                f"the dataset has {len(self.dataset)} elements, but the checkpoint was written "
+                f"for {checkpoint.dataset_size} elements")
+        if checkpoint.dataset_hash is None:
+            print("[WARNING] The checkpoint has no hash of the dataset, only its size is checked.")
+        elif BootstrapCheckpoint.get_dataset_hash(self.dataset_user_ids) != checkpoint.dataset_hash:
+            raise ValueError("the users of the dataset changed since the checkpoint was written, "
+                             "the drawn indices would map to other users")
+
+        if checkpoint.pending_batch is not None:
+            completed: set[int] = checkpoint.get_completed_sample_indices()
+            first_sample_index: int = checkpoint.pending_batch * checkpoint.batch_size
+            size: int = checkpoint.get_batch_sizes()[checkpoint.pending_batch]
+            for sample_index in range(first_sample_index, first_sample_index + size):
+                if sample_index not in completed:
+                    self.query_manager.delete_sample(checkpoint.sample_start_id + sample_index)
+
+        yield from self.run(checkpoint, workers=workers, max_in_flight=max_in_flight)
+
+    def run(self, checkpoint: BootstrapCheckpoint, workers: int = 1, max_in_flight: int = 2) -> Iterator[int]:
+        """
+        Save every sample of the checkpoint which is not completed yet.
+        :return: yields the number of saved samples after every batch
+        """
+        start_time: float = time.time()
+        output: str = checkpoint.output
+        user_index: dict[int, list] = self.build_user_index(self.dataset_user_ids.tolist()) if output == "rows" else {}
+        matrix: UserDateMatrix | None = self.get_matrix() if output == "aggregates" else None
+
+        completed: set[int] = checkpoint.get_completed_sample_indices()
+        sizes: list[int] = checkpoint.get_batch_sizes()
+        first_sample_indices: dict[int, int] = {
+            batch_number: batch_number * checkpoint.batch_size for batch_number in range(len(sizes))
+        }
+        open_batches: list[int] = [
+            batch_number for batch_number, first_sample_index in first_sample_indices.items()
+            if not completed.issuperset(range(first_sample_index, first_sample_index + sizes[batch_number]))
+        ]
+        arguments: Iterable[tuple] = (
+            (checkpoint.get_seed_sequence(batch_number), sizes[batch_number], checkpoint.output_size,
+             first_sample_indices[batch_number], output)
+            for batch_number in open_batches
+        )
+
+        with ExitStack() as stack:
+            if workers > 1:
+                executor: ProcessPoolExecutor = stack.enter_context(ProcessPoolExecutor(
+                    max_workers=workers, initializer=_initialize_worker,
+                    initargs=(user_index, self.dataset_user_ids, matrix)))
+                batches: Iterator[list] = bounded_map(executor, _bootstrap_batch_in_worker, arguments, max_in_flight)
+            else:
+                batches: Iterator[list] = (
+                    bootstrap_batch(user_index, self.dataset_user_ids, matrix, *argument) for argument in arguments)
+
+            for batch_number, samples in zip(open_batches, batches):
+                checkpoint.pending_batch = batch_number
+                self.save_checkpoint(checkpoint)
+
+                self.save_batch(
+                    samples, first_sample_index=first_sample_indices[batch_number],
+                    sample_start_id=checkpoint.sample_start_id, checkpoint=checkpoint
+                )
+
+                checkpoint.pending_batch = None
+                self.save_checkpoint(checkpoint)
+
+                saved: int = len(checkpoint.completed_sample_ids)
+                print(f"saved {saved}/{checkpoint.nr_of_samples} samples in {timedelta(seconds=(time.time() - start_time))}")
+                yield saved
+
+        if checkpoint.path is not None and checkpoint.is_finished():
+            checkpoint.remove()
+        self.writer.close()
+
+    @staticmethod
+    def save_checkpoint(checkpoint: BootstrapCheckpoint) -> None:
+        if checkpoint.path is not None:
+            checkpoint.save()
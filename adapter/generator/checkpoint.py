@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+class BootstrapCheckpoint:
+    """
+    Progress of a bootstrap run, which is written after every batch.
+    The random state is stored as the entropy of the seed and the spawn offset of the run,
+    so the stream of every batch can be recreated and the run continued where it stopped.
+    """
+
+    def __init__(self, path: str, entropy: int, spawn_offset: int, source_group_id: int | None,
+                 dataset_size: int, nr_of_samples: int, output_size: int, batch_size: int, storage: str,
+                 output: str, sample_start_id: int, completed_sample_ids: list[int] | None = None,
+                 pending_batch: int | None = None, dataset_hash: str | None = None) -> None:
+        self.path: str = path
+
+        # random state
+        self.entropy: int = entropy
+        self.spawn_offset: int = spawn_offset
+
+        # parameters of the run
+        self.source_group_id: int | None = source_group_id
+        self.dataset_size: int = dataset_size
+        # the drawn indices only map to the same users if the dataset has the same users in the same order
+        self.dataset_hash: str | None = dataset_hash
+        self.nr_of_samples: int = nr_of_samples
+        self.output_size: int = output_size
+        self.batch_size: int = batch_size
+        self.storage: str = storage
+        self.output: str = output
+        self.sample_start_id: int = sample_start_id
+
+        # progress of the run
+        self.completed_sample_ids: list[int] = completed_sample_ids or []
+        self.pending_batch: int | None = pending_batch
+
+    @staticmethod
+    def get_dataset_hash(dataset_user_ids: np.ndarray) -> str:
+        return hashlib.sha256(np.ascontiguousarray(dataset_user_ids, dtype=np.int64).tobytes()).hexdigest()
+
+    def get_seed_sequence(self, batch_number: int) -> np.random.SeedSequence:
+        """
+        The seed of a batch, it is the same child which SeedSequence.spawn returned for the batch.
+        """
+        return np.random.SeedSequence(self.entropy, spawn_key=(self.spawn_offset + batch_number,))
+
+    def get_batch_sizes(self) -> list[int]:
+        return [
+            min(self.batch_size, self.nr_of_samples - batch_start)
+            for batch_start in range(0, self.nr_of_samples, self.batch_size)
+        ]
+
+    def get_completed_sample_indices(self) -> set[int]:
+        return {sample_id - self.sample_start_id for sample_id in self.completed_sample_ids}
+
+    def complete_sample(self, sample_index: int) -> None:
+        self.completed_sample_ids.append(self.sample_start_id + sample_index)
+
+    def is_finished(self) -> bool:
+        return len(self.completed_sample_ids) >= self.nr_of_samples
+
+    def save(self) -> None:
+        """
+        Write the checkpoint atomically, a crash while writing keeps the previous checkpoint.
+        """
+        temporary_path: str = f"{self.path}.tmp"
+        with open(temporary_path, "w") as checkpoint_file:
+            json.dump(self.to_dict(), checkpoint_file)
+        os.replace(temporary_path, self.path)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def to_dict(self) -> dict:
+        return {
+            "entropy": self.entropy,
+            "spawn_offset": self.spawn_offset,
+            "source_group_id": self.source_group_id,
+            "dataset_size": self.dataset_size,
+            "dataset_hash": self.dataset_hash,
+            "nr_of_samples": self.nr_of_samples,
+            "output_size": self.output_size,
+            "batch_size": self.batch_size,
+            "storage": self.storage,
+            "output": self.output,
+            "sample_start_id": self.sample_start_id,
+            "completed_sample_ids": self.completed_sample_ids,
+            "pending_batch": self.pending_batch
+        }
+
+    @classmethod
+    def load(cls, path: str) -> "BootstrapCheckpoint":
+        with open(path, "r") as checkpoint_file:
+            return cls(path=path, **json.load(checkpoint_file))
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(path)
+
+    @classmethod
+    def is_unfinished(cls, path: str | None) -> bool:
+        """
+        Whether the file holds a checkpoint of a run which can still be resumed.
+        """
+        return path is not None and cls.exists(path) and not cls.load(path).is_finished()
+
+    def __repr__(self) -> str:
+        return (f'<BootstrapCheckpoint(source_group_id={self.source_group_id}, '
+                f'completed={len(self.completed_sample_ids)}/{self.nr_of_samples})>')
@@ -1,21 +1,32 @@
-import random
 import datetime
+import os
 import time
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
 
 from modules.configuration import Configuration
-from adapter.database.database import Database
-from model.model import Collections
+from modules.dates import to_days, to_iso
+from adapter.inserting.csv import ImportCSV
 
 
 class Generator:
+    """
+    Generates rows with random values for every day of every user. The rows are drawn as numpy columns
+    in chunks of about chunk_size rows and written to the database or to files, the same seed and chunk
+    size give the same rows. The database is written like an import, see ImportCSV.write_chunks.
+    """
+
     def __init__(
             self,
             start_date: datetime.date = datetime.date(1970, 1, 1),
             date_steps: datetime.timedelta = datetime.timedelta(days=1),
-            start_user_id: int = 1, group_id: int = 1, value_range: tuple = (0, 100)
+            start_user_id: int = 1, group_id: int = 1, value_range: tuple = (0, 100),
+            seed: int | None = None, chunk_size: int | None = None, config: Configuration | None = None
     ):
-        self.config = Configuration()
-        self.database: Database = Database(self.config)
+        self.config = config if config is not None else Configuration()
+        self.importer: ImportCSV = ImportCSV(self.config)
 
         self.user_id_start: int = start_user_id
         self.start_date: datetime.date = start_date
@@ -23,27 +34,64 @@ class Generator:
         self.value_range = value_range
         self.group_id = group_id
 
-    def generate_data(self, users: int = 100, days_per_user: int = 100):
+        self.seed_sequence: np.random.SeedSequence = np.random.SeedSequence(seed)
+        self.chunk_size: int = chunk_size if chunk_size is not None else self.config.get_insert_chunk_size()
+
+    def generate_chunks(self, users: int, days_per_user: int) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        :return: yields the user ids, the day numbers and the values of the rows of the next users
+        """
+        random: np.random.Generator = np.random.default_rng(self.seed_sequence)
+        # the dates are the same for every user
+        days: np.ndarray = to_days([self.start_date])[0] + np.arange(days_per_user, dtype=np.int64) * self.date_steps.days
+        users_per_chunk: int = max(1, self.chunk_size // max(1, days_per_user))
+
+        for first_user in range(0, users, users_per_chunk):
+            user_ids: np.ndarray = self.user_id_start + np.arange(
+                first_user, min(first_user + users_per_chunk, users), dtype=np.int64
+            )
+            yield (
+                np.repeat(user_ids, days_per_user),
+                np.tile(days, len(user_ids)),
+                # randint includes the upper bound of the value range
+                random.integers(self.value_range[0], self.value_range[1], len(user_ids) * days_per_user,
+                                dtype=np.int64, endpoint=True)
+            )
+
+    def generate_data(self, users: int = 100, days_per_user: int = 100, path: str | None = None):
+        """
+        :param path: a csv file (also .gz, .bz2, .xz or .zst) or a directory which gets a .npz file per chunk,
+                     the rows are written to the group in the database if it is None
+        """
         total_start_time = time.time()
-        for u in range(users):
-            start_time = time.time()
-            rows: list[dict] = []
-            for d in range(days_per_user):
-                date = self.start_date + d * self.date_steps
-                value = random.randint(self.value_range[0], self.value_range[1])
-
-                rows.append(dict(
-                    user_id=self.user_id_start + u,
-                    date=date,
-                    value=value,
-                    group_id=self.group_id
-                ))
-
-            self.database.insert_rows(Collections, rows)
-            print(f"inserted {u + 1}/{users} users in {datetime.timedelta(seconds=(time.time() - start_time))}")
-
-        self.database.commit()
-        print(f"Total time: {time.time() - total_start_time}")
+        generated: int = 0
+
+        if path is None:
+            # the group is created, the import is committed every commit_rows rows
+            generated = self.importer.write_chunks(
+                self.group_id, f"Generated {self.group_id}", self.generate_chunks(users, days_per_user), total_start_time
+            )
+        else:
+            for number, (user_ids, days, values) in enumerate(self.generate_chunks(users, days_per_user)):
+                self.write_file(path, number, user_ids, days, values)
+                generated += len(user_ids)
+                print(f"wrote {generated}/{users * days_per_user} rows in "
+                      f"{datetime.timedelta(seconds=(time.time() - total_start_time))}")
 
-        self.database.close()
+        print(f"Total time: {time.time() - total_start_time}")
         print("I am done")
+
+    @staticmethod
+    def write_file(path: str, number: int, user_ids: np.ndarray, days: np.ndarray, values: np.ndarray) -> None:
+        """
+        Write a chunk with the columns user_id, date and value, the files can be imported with 'insert csv'.
+        """
+        if ".csv" in os.path.basename(path):
+            # the chunks are appended, a compressed file gets one compressed stream per chunk
+            pd.DataFrame({"user_id": user_ids, "date": to_iso(days), "value": values}).to_csv(
+                path, mode="w" if number == 0 else "a", header=number == 0, index=False, compression="infer"
+            )
+        else:
+            os.makedirs(path, exist_ok=True)
+            np.savez(os.path.join(path, f"part-{number:05d}.npz"),
+                     user_id=user_ids, date=days.astype("datetime64[D]"), value=values)
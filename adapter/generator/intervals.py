@@ -0,0 +1,116 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from adapter.database.matrix_cache import MatrixCache
+from adapter.generator.bootstrap import Bootstrap, draw_batch
+from adapter.generator.matrix import UserDateMatrix
+from modules.configuration import Configuration
+from modules.dates import to_iso
+from modules.queryManager import QueryManager
+
+
+class BootstrapIntervals:
+    """
+    Confidence intervals of the daily totals of a group, computed from bootstrap
+    replicates in memory instead of saving every replicate as a sample.
+    """
+
+    def __init__(self, config: Configuration, seed: int | None = None) -> None:
+        self.config: Configuration = config
+        self.seed_sequence: np.random.SeedSequence = np.random.SeedSequence(seed)
+
+        self.matrix: UserDateMatrix | None = None
+        self.replicates: np.ndarray = np.empty((0, 0))
+
+    def load_group(self, group_id: int) -> UserDateMatrix:
+        """
+        Load the group once as a user x date matrix, from the matrix cache if it is enabled.
+        """
+        if self.config.matrix_cache_enabled():
+            self.matrix = MatrixCache(self.config).get(group_id)
+        else:
+            query_manager: QueryManager = QueryManager(self.config)
+            self.matrix = UserDateMatrix.from_group_rows(query_manager.get_result("group_dataset", group_id))
+            query_manager.close()
+        return self.matrix
+
+    def resample(self, nr_of_replicates: int, batch_size: int = 1000) -> np.ndarray:
+        """
+        Compute the daily totals of bootstrap replicates of the users of the group.
+        The replicates are drawn with the same per-batch random streams as the Bootstrap.
+        :return: one row of daily totals per replicate
+        """
+        nr_of_users: int = len(self.matrix.user_ids)
+        sizes: list[int] = Bootstrap.get_batch_sizes(nr_of_replicates, batch_size)
+
+        start_time: float = time.time()
+        replicates: list[np.ndarray] = []
+        for seed_sequence, size in zip(self.seed_sequence.spawn(len(sizes)), sizes):
+            indices: np.ndarray = draw_batch(seed_sequence, size, nr_of_users, nr_of_users)
+            replicates.append(self.matrix.resample_totals(indices))
+        self.replicates = np.concatenate(replicates) if replicates else np.empty((0, len(self.matrix.dates)))
+        print(f"resampled {nr_of_replicates} replicates in {timedelta(seconds=(time.time() - start_time))}")
+        return self.replicates
+
+    def get_totals(self) -> np.ndarray:
+        return self.matrix.get_daily_totals()
+
+    def percentile_intervals(self, confidence: float = 0.95) -> tuple[np.ndarray, np.ndarray]:
+        alpha: float = (1 - confidence) / 2
+        lower, upper = np.quantile(self.replicates, [alpha, 1 - alpha], axis=0)
+        return lower, upper
+
+    def bca_intervals(self, confidence: float = 0.95) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Bias-corrected and accelerated intervals, the acceleration is estimated with the
+        leave-one-user-out jackknife.
+        """
+        nr_of_replicates: int = len(self.replicates)
+        totals: np.ndarray = self.get_totals()
+
+        # bias correction, the proportion is clipped so that z0 stays finite
+        proportion: np.ndarray = np.clip(
+            (self.replicates < totals).mean(axis=0), 1 / (nr_of_replicates + 1), nr_of_replicates / (nr_of_replicates + 1)
+        )
+        z0: np.ndarray = norm.ppf(proportion)
+
+        # the jackknife totals are scaled to the size of the group
+        nr_of_users: int = len(self.matrix.user_ids)
+        jackknife: np.ndarray = (totals - self.matrix.values) * nr_of_users / max(nr_of_users - 1, 1)
+        deviations: np.ndarray = jackknife.mean(axis=0) - jackknife
+        denominator: np.ndarray = 6 * (deviations ** 2).sum(axis=0) ** 1.5
+        acceleration: np.ndarray = np.divide(
+            (deviations ** 3).sum(axis=0), denominator, out=np.zeros_like(denominator), where=denominator > 0)
+
+        alpha: float = (1 - confidence) / 2
+        sorted_replicates: np.ndarray = np.sort(self.replicates, axis=0)
+        bounds: list[np.ndarray] = []
+        for z_alpha in norm.ppf([alpha, 1 - alpha]):
+            adjusted: np.ndarray = norm.cdf(z0 + (z0 + z_alpha) / (1 - acceleration * (z0 + z_alpha)))
+            positions: np.ndarray = np.clip(
+                np.round(adjusted * (nr_of_replicates - 1)).astype(np.int64), 0, nr_of_replicates - 1)
+            bounds.append(np.take_along_axis(sorted_replicates, positions[None, :], axis=0)[0])
+        return bounds[0], bounds[1]
+
+    def intervals(self, group_id: int, nr_of_replicates: int, confidence: float = 0.95,
+                  batch_size: int = 1000) -> pd.DataFrame:
+        """
+        Percentile and BCa intervals of the daily totals of a group.
+        :return: one row per date
+        """
+        self.load_group(group_id)
+        self.resample(nr_of_replicates, batch_size=batch_size)
+        percentile_lower, percentile_upper = self.percentile_intervals(confidence)
+        bca_lower, bca_upper = self.bca_intervals(confidence)
+        return pd.DataFrame({
+            "date": to_iso(self.matrix.dates),
+            "total": self.get_totals(),
+            "percentile_lower": percentile_lower,
+            "percentile_upper": percentile_upper,
+            "bca_lower": bca_lower,
+            "bca_upper": bca_upper
+        })
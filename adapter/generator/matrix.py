@@ -0,0 +1,95 @@
+import numpy as np
+
+
+class UserDateMatrix:
+    """
+    Dense user x date matrix of the summed values of a dataset.
+    The rows are in the order of the given users, so an index into the original
+    dataset of a bootstrap is also a row index of the matrix.
+    """
+
+    def __init__(self, user_ids: np.ndarray, dates: np.ndarray, values: np.ndarray) -> None:
+        self.user_ids: np.ndarray = user_ids
+        self.dates: np.ndarray = dates
+        self.values: np.ndarray = values
+
+    @classmethod
+    def from_user_index(cls, user_index: dict[int, list], user_ids: np.ndarray) -> "UserDateMatrix":
+        """
+        Build the matrix from the rows (id, group_id, user_id, date, value) of every user.
+        :param user_index: user_id -> rows of the user
+        :param user_ids: users in the order of the matrix rows
+        """
+        rows: list = [row for user_id in dict.fromkeys(user_ids.tolist()) for row in user_index[user_id]]
+        row_user_ids: np.ndarray = np.array([row[2] for row in rows], dtype=np.int64)
+        row_dates: np.ndarray = np.array([row[3] for row in rows])
+        row_values: np.ndarray = np.array([row[4] for row in rows], dtype=np.float64)
+        return cls.from_columns(user_ids, row_user_ids, row_dates, row_values)
+
+    @classmethod
+    def from_group_rows(cls, rows: list) -> "UserDateMatrix":
+        """
+        Build the matrix from the rows (user_id, date, value) of a group, the users are sorted by id.
+        """
+        row_user_ids: np.ndarray = np.array([row[0] for row in rows], dtype=np.int64)
+        return cls.from_columns(
+            user_ids=np.unique(row_user_ids),
+            row_user_ids=row_user_ids,
+            row_dates=np.array([row[1] for row in rows]),
+            row_values=np.array([row[2] for row in rows], dtype=np.float64)
+        )
+
+    @classmethod
+    def from_columns(cls, user_ids: np.ndarray, row_user_ids: np.ndarray, row_dates: np.ndarray,
+                     row_values: np.ndarray) -> "UserDateMatrix":
+        """
+        Build the matrix from column arrays, values of the same user and date are summed.
+        :param user_ids: users in the order of the matrix rows
+        """
+        dates, date_positions = np.unique(row_dates, return_inverse=True)
+
+        # users which appear more than once in user_ids get the same values in every row
+        known_users: np.ndarray = np.unique(user_ids)
+        user_positions: np.ndarray = np.searchsorted(known_users, row_user_ids)
+
+        values: np.ndarray = np.zeros((len(known_users), len(dates)), dtype=np.float64)
+        np.add.at(values, (user_positions, date_positions), row_values)
+        return cls(user_ids, dates, values[np.searchsorted(known_users, user_ids)])
+
+    def select_users(self, user_ids: np.ndarray) -> "UserDateMatrix":
+        """
+        The matrix with one row per given user, e.g. in the order of an original dataset.
+        The users of this matrix must be sorted, users without rows get a row of zeros.
+        """
+        if np.array_equal(self.user_ids, user_ids):
+            return self
+        values: np.ndarray = np.zeros((len(user_ids), len(self.dates)), dtype=np.float64)
+        if len(self.user_ids) > 0:
+            positions: np.ndarray = np.minimum(np.searchsorted(self.user_ids, user_ids), len(self.user_ids) - 1)
+            found: np.ndarray = self.user_ids[positions] == user_ids
+            values[found] = self.values[positions[found]]
+        return UserDateMatrix(user_ids, self.dates, values)
+
+    def get_daily_totals(self) -> np.ndarray:
+        return self.values.sum(axis=0)
+
+    def resample_totals(self, indices: np.ndarray, chunk_size: int = 64) -> np.ndarray:
+        """
+        Daily totals of bootstrap samples.
+        :param indices: one row of matrix row indices per sample
+        :param chunk_size: number of samples whose draw counts are held in memory at once
+        :return: one row of daily totals per sample
+        """
+        totals: np.ndarray = np.empty((len(indices), len(self.dates)), dtype=np.float64)
+        nr_of_users: int = len(self.user_ids)
+        for start in range(0, len(indices), chunk_size):
+            chunk: np.ndarray = indices[start:start + chunk_size]
+            offsets: np.ndarray = np.arange(len(chunk))[:, None] * nr_of_users
+            counts: np.ndarray = np.bincount(
+                (offsets + chunk).ravel(), minlength=len(chunk) * nr_of_users
+            ).reshape(len(chunk), nr_of_users).astype(np.float64)
+            totals[start:start + len(chunk)] = counts @ self.values
+        return totals
+
+    def __repr__(self) -> str:
+        return f'<UserDateMatrix(users={len(self.user_ids)}, dates={len(self.dates)})>'
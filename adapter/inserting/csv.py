@@ -1,68 +1,331 @@
+import glob
+import multiprocessing
+import multiprocessing.queues
+import os
 import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator
 
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import timedelta
 
-from model.model import Collections, Groups
 from modules.configuration import Configuration
-from adapter.database.database import Database
+from modules.dates import DateCodec
+from modules.queryManager import QueryManager
+from adapter.database.bulk_writer import BulkWriter
+from adapter.inserting.incremental import IncrementalImport
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+def read_csv_chunks(path: str, columns: list[str], chunk_size: int) -> Iterator[list[np.ndarray]]:
+    """
+    Read a csv file chunk by chunk, a compressed file (.gz, .bz2, .xz, .zst) is decompressed while it is read.
+    """
+    # the file is also closed when a failed import stops reading
+    with pd.read_csv(path, usecols=columns, chunksize=chunk_size, compression="infer") as reader:
+        for chunk in reader:
+            yield [chunk[column].to_numpy() for column in columns]
+
+
+def read_parquet_chunks(path: str, columns: list[str], chunk_size: int) -> Iterator[list[np.ndarray]]:
+    """
+    Read the row groups of a parquet file as record batches, the file is memory mapped.
+    """
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        yield [batch.column(column).to_numpy(zero_copy_only=False) for column in columns]
+
+
+def read_arrow_chunks(path: str, columns: list[str], chunk_size: int) -> Iterator[list[np.ndarray]]:
+    """
+    Read an Arrow IPC (feather) file, the record batches are slices of the memory mapped file.
+    """
+    with pa.memory_map(path, "r") as source:
+        reader = pa.ipc.open_file(source)
+        for batch_number in range(reader.num_record_batches):
+            batch = reader.get_batch(batch_number).select(columns)
+            for offset in range(0, batch.num_rows, chunk_size):
+                chunk = batch.slice(offset, chunk_size)
+                yield [chunk.column(column).to_numpy(zero_copy_only=False) for column in columns]
+
+
+def read_npz_chunks(path: str, columns: list[str], chunk_size: int) -> Iterator[list[np.ndarray]]:
+    """
+    Read the columns of a .npz file which were saved with numpy.savez under the column names.
+    The columns are loaded one by one when the file is opened, a .npz file can not be memory mapped.
+    """
+    with np.load(path) as npz_file:
+        missing: list[str] = [column for column in columns if column not in npz_file.files]
+        if missing:
+            raise ValueError(f"{path} has no column {', '.join(missing)}, found {', '.join(npz_file.files)}")
+        arrays: list[np.ndarray] = [npz_file[column] for column in columns]
+    for offset in range(0, len(arrays[0]), chunk_size):
+        yield [array[offset:offset + chunk_size] for array in arrays]
+
+
+# readers of the file types which can be imported, by file name extension
+readers: dict[str, Callable[[str, list[str], int], Iterator[list[np.ndarray]]]] = {
+    ".csv": read_csv_chunks,
+    ".csv.gz": read_csv_chunks,
+    ".csv.bz2": read_csv_chunks,
+    ".csv.xz": read_csv_chunks,
+    ".csv.zst": read_csv_chunks,
+    ".parquet": read_parquet_chunks,
+    ".arrow": read_arrow_chunks,
+    ".feather": read_arrow_chunks,
+    ".npz": read_npz_chunks
+}
+# file types which need pyarrow
+arrow_readers: tuple = (read_parquet_chunks, read_arrow_chunks)
+
+
+def get_reader(path: str) -> Callable[[str, list[str], int], Iterator[list[np.ndarray]]]:
+    for extension, reader in readers.items():
+        if path.lower().endswith(extension):
+            if reader in arrow_readers and pa is None:
+                raise ImportError(f"pyarrow is needed to read {os.path.basename(path)} (pip install pyarrow)")
+            return reader
+    raise ValueError(f"unknown file type of {os.path.basename(path)}, use one of {', '.join(readers.keys())}")
+
+
+def read_chunks(path: str, user_id_column_name: str, date_column_name: str, value_column_name: str,
+                chunk_size: int, date_encoding: str) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Read the mapped columns of a file chunk by chunk, only one chunk is held in memory.
+    The reader is chosen by the file name extension, see readers.
+    :return: yields the user ids, the encoded dates and the values of every chunk
+    """
+    date_codec: DateCodec = DateCodec(date_encoding)
+    reader = get_reader(path)
+    for user_ids, dates, values in reader(path, [user_id_column_name, date_column_name, value_column_name], chunk_size):
+        # the columns are converted at once instead of row by row
+        yield (
+            np.asarray(user_ids, dtype=np.int64),
+            date_codec.encode(dates),
+            np.asarray(values, dtype=np.int64)
+        )
+
+
+# the state of a reading worker process is set once by the initializer
+_worker_chunks: multiprocessing.queues.Queue | None = None
+_worker_stop = None
+
+
+def _initialize_reader(chunks: multiprocessing.queues.Queue, stop) -> None:
+    global _worker_chunks, _worker_stop
+    _worker_chunks = chunks
+    _worker_stop = stop
+
+
+def read_file(file_number: int, *arguments) -> None:
+    """
+    Read and convert a file in a worker process and put its chunks on the queue of the writer, see read_chunks.
+    The queue is bounded, so the worker waits while the writer is behind. The end of the file is put as
+    None and an error as the exception, one of them is always the last item of the file.
+    """
+    try:
+        for chunk in read_chunks(*arguments):
+            if _worker_stop.is_set():
+                break
+            _worker_chunks.put((file_number, chunk))
+        _worker_chunks.put((file_number, None))
+    except BaseException as error:
+        _worker_chunks.put((file_number, error))
 
 
 class ImportCSV:
-    def __init__(self) -> None:
-        self.config = Configuration()
-        self.database: Database = Database(self.config)
+    def __init__(self, config: Configuration | None = None) -> None:
+        self.config = config if config is not None else Configuration()
+        self.writer: BulkWriter = BulkWriter(self.config)
 
         self.csv_file = self.config.get_insert_csv_file_path('csv')
+        # rows which are read, converted and written at once
+        self.chunk_size: int = self.config.get_insert_chunk_size()
+        self.commit_rows: int = self.config.get_insert_commit_rows()
+
+    @staticmethod
+    def get_files(path: str) -> list[str]:
+        """
+        The files of a directory or a glob pattern which can be imported, or the file itself.
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, "*")
+        elif not any(character in path for character in "*?["):
+            return [path] if os.path.isfile(path) else []
+        return sorted(
+            file for file in glob.glob(path)
+            if os.path.isfile(file) and file.lower().endswith(tuple(readers.keys()))
+        )
+
+    @staticmethod
+    def check_files(files: list[str], path: str) -> bool:
+        """
+        An import without files would only create an empty group, so it is not started.
+        """
+        if not files:
+            print(f"[ERROR] No file found in {path}.")
+            print(f"[INFO] Supported files: {', '.join(readers.keys())}")
+        return len(files) > 0
 
     def insert(self, group_id: int, name: str,
                user_id_column_name: str, date_column_name: str, value_column_name: str, csv_file=None) -> None:
         if csv_file is None:
             csv_file = self.csv_file
 
-        print("loading csv file...")
+        print(f"creating new group {name}")
+        print("--------------------------------------------------------------------------------")
+
+        print(f"inserting data into database")
         start_time: float = time.time()
-        data: pd.DataFrame = pd.read_csv(csv_file, chunksize=10000000, iterator=True).get_chunk()
-        print(f"...has finished [{timedelta(seconds=(time.time() - start_time))}]")
+        inserted: int = self.write_chunks(group_id, name, read_chunks(
+            csv_file, user_id_column_name, date_column_name, value_column_name,
+            self.chunk_size, self.config.get_date_encoding()
+        ), start_time)
 
         print("--------------------------------------------------------------------------------")
+        print(f"Inserted {inserted} rows [{timedelta(seconds=(time.time() - start_time))}]")
+        print("I am done")
 
-        print(f"creating new group {name}")
-        self.database.get_or_create(model=Groups, id=group_id, name=name)
-
+    def insert_files(self, group_id: int, name: str,
+                     user_id_column_name: str, date_column_name: str, value_column_name: str, path: str) -> None:
+        """
+        Import all files of a directory or glob pattern into one group.
+        The files are read and converted by a process pool, every worker streams the chunks of its file
+        through a queue to this process, which writes them to the database. The queue holds at most
+        max_in_flight chunks and every worker one more chunk which it converts, so the memory of the import
+        is bounded by (max_in_flight + workers) * chunk_size rows, whatever the size of the files.
+        """
+        files: list[str] = self.get_files(path)
+        if not self.check_files(files, path):
+            return
+        workers: int = self.config.get_insert_workers()
+        print(f"importing {len(files)} files with {workers} processes into group {name}")
         print("--------------------------------------------------------------------------------")
 
-        print(f"inserting data into database")
-        start_time = time.time()
-        rows: list = []
-        for index, (_, row) in enumerate(data.iterrows()):
-            rows.append({
-                'group_id': group_id,
-                'user_id': row[user_id_column_name],
-                'date': datetime.strptime(row[date_column_name], '%Y-%m-%d').date(),
-                'value': row[value_column_name]
-            })
-
-            if index % 1000 == 0 and index != 0:
-                print(f"inserted {index} rows")
-                self.database.session.bulk_insert_mappings(Collections, rows)
-                rows = []
-
-        print(f"{len(rows)} rows are now buffered")
+        start_time: float = time.time()
+        chunks_to_write: multiprocessing.queues.Queue = multiprocessing.Queue(maxsize=self.config.get_insert_max_in_flight())
+        stop = multiprocessing.Event()
+        # files whose last item was received
+        ended: set[int] = set()
+
+        def chunks() -> Iterator[tuple]:
+            while len(ended) < len(files):
+                number, chunk = chunks_to_write.get()
+                if chunk is None or isinstance(chunk, BaseException):
+                    ended.add(number)
+                    if chunk is not None:
+                        raise chunk
+                    print(f"read {len(ended)}/{len(files)} files ({os.path.basename(files[number])})")
+                else:
+                    yield chunk
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initialize_reader,
+                                 initargs=(chunks_to_write, stop)) as executor:
+            futures: list[Future] = [
+                executor.submit(read_file, number, file, user_id_column_name, date_column_name, value_column_name,
+                                self.chunk_size, self.config.get_date_encoding())
+                for number, file in enumerate(files)
+            ]
+            try:
+                inserted: int = self.write_chunks(group_id, name, chunks(), start_time)
+            except BaseException:
+                # the workers stop at their next chunk, the queue is drained until every started file
+                # ended, so that no worker waits for the writer
+                stop.set()
+                for future in futures:
+                    future.cancel()
+                while any(number not in ended and not future.cancelled() for number, future in enumerate(futures)):
+                    number, chunk = chunks_to_write.get()
+                    if chunk is None or isinstance(chunk, BaseException):
+                        ended.add(number)
+                raise
 
         print("--------------------------------------------------------------------------------")
-        print("bulking insert...", end="")
-        self.database.session.bulk_insert_mappings(Collections, rows)
-        print("done")
+        print(f"Inserted {inserted} rows [{timedelta(seconds=(time.time() - start_time))}]")
+        print("I am done")
+
+    def insert_incremental(self, group_id: int, name: str,
+                           user_id_column_name: str, date_column_name: str, value_column_name: str, path: str) -> None:
+        """
+        Import the files of a path into a group which already holds most of their rows, only the days of the
+        users whose rows are new or changed are written, see IncrementalImport.
+        """
+        # databases which are not migrated have no import_digests table
+        if not QueryManager(self.config).table_exists("import_digests"):
+            print("[ERROR] The database has no import digests, which an incremental import needs.")
+            print("[TIPP] You can add them with the command 'database migrate'.")
+            return
+        files: list[str] = self.get_files(path)
+        if not self.check_files(files, path):
+            return
 
+        def chunks() -> Iterator[tuple]:
+            for file in files:
+                yield from read_chunks(file, user_id_column_name, date_column_name, value_column_name,
+                                       self.chunk_size, self.config.get_date_encoding())
+
+        print(f"importing {len(files)} files incrementally into group {name}")
         print("--------------------------------------------------------------------------------")
+        start_time: float = time.time()
+        with self.writer:
+            self.writer.ensure_group(group_id, name)
+            incremental_import: IncrementalImport = IncrementalImport(self.writer, group_id, self.chunk_size)
+            incremental_import.prepare()
+            for user_ids, dates, values in chunks():
+                incremental_import.add_file_chunk(user_ids, dates, values)
 
-        print("committing...", end="")
-        self.database.session.commit()
+            days: dict[str, int] = incremental_import.compare()
+            print(f"days of the users: {days.get('new', 0)} new, {days.get('changed', 0)} changed, "
+                  f"{days.get('unchanged', 0)} unchanged")
+            deleted: int = incremental_import.delete_changed()
+            inserted: int = incremental_import.insert_rows(chunks())
+            incremental_import.store_digests()
+            print("committing...", end="")
         print("done")
 
         print("--------------------------------------------------------------------------------")
-
-        print(f"Inserted {len(data)} rows [{timedelta(seconds=(time.time() - start_time))}]")
+        print(f"Inserted {inserted} rows, replaced {deleted} rows [{timedelta(seconds=(time.time() - start_time))}]")
         print("I am done")
-        self.database.close()
+
+    def write_chunks(self, group_id: int, name: str, chunks: Iterable[tuple], start_time: float) -> int:
+        """
+        Write converted chunks to the group, the import is committed every commit_rows rows.
+        :return: number of inserted rows
+        """
+        inserted: int = 0
+        uncommitted: int = 0
+        try:
+            with self.writer:
+                self.writer.ensure_group(group_id, name)
+                IncrementalImport.clear(self.writer.connection, group_id)
+                if not self.writer.storage.writes_collections:
+                    table_name: str = self.writer.get_collections_table(group_id)
+                    # rebuilding the indexes of a table with other groups would take longer than updating them
+                    if self.writer.connection.execute(f"SELECT 1 FROM main.{table_name} LIMIT 1").fetchone() is None:
+                        self.writer.defer_indexes(table_name)
+
+                for user_ids, dates, values in chunks:
+                    written: int = self.writer.insert_collections(group_id, user_ids, dates, values)
+                    inserted += written
+                    uncommitted += written
+                    print(f"inserted {inserted} rows [{timedelta(seconds=(time.time() - start_time))}]")
+                    if 0 < self.commit_rows <= uncommitted:
+                        # the statistics of the group are written once with the last commit
+                        self.writer.commit(write_group_stats=False)
+                        uncommitted = 0
+                print("committing...", end="")
+            print("done")
+        except BaseException:
+            if inserted > uncommitted:
+                # some rows of the import are committed without their statistics
+                QueryManager(self.config).refresh_group_stats(group_id)
+            raise
+        return inserted
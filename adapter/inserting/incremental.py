@@ -0,0 +1,200 @@
+import sqlite3
+from typing import Iterable
+
+import numpy as np
+
+from adapter.database.bulk_writer import BulkWriter
+from modules.dates import to_days
+
+# the digests are sums of 48 bit row hashes, sqlite adds them without an overflow
+DIGEST_MODULUS: int = 2 ** 48
+
+
+def mix(values: np.ndarray) -> np.ndarray:
+    """
+    The finalizer of splitmix64, every bit of the input changes about half of the bits of the output.
+    """
+    with np.errstate(over="ignore"):
+        values = values ^ (values >> np.uint64(30))
+        values = values * np.uint64(0xbf58476d1ce4e5b9)
+        values = values ^ (values >> np.uint64(27))
+        values = values * np.uint64(0x94d049bb133111eb)
+        return values ^ (values >> np.uint64(31))
+
+
+def get_row_hashes(user_ids, days, values) -> np.ndarray:
+    """
+    A 48 bit hash of every row, the dates are day numbers so that the hash does not depend on the date encoding.
+    """
+    with np.errstate(over="ignore"):
+        hashes: np.ndarray = mix(np.asarray(user_ids, dtype=np.int64).astype(np.uint64))
+        hashes = mix(hashes + np.asarray(days, dtype=np.int64).astype(np.uint64))
+        hashes = mix(hashes + np.asarray(values, dtype=np.int64).astype(np.uint64))
+    return hashes >> np.uint64(16)
+
+
+# a day of a user, the records compare, sort and search like pairs for every 64 bit user id
+DAY_KEY: np.dtype = np.dtype([("user_id", np.int64), ("day", np.int64)])
+
+
+def get_day_keys(user_ids, days) -> np.ndarray:
+    """
+    One (user_id, day) record per day of a user.
+    """
+    keys: np.ndarray = np.empty(len(user_ids), dtype=DAY_KEY)
+    keys["user_id"] = user_ids
+    keys["day"] = days
+    return keys
+
+
+def get_digests(user_ids, dates, values) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The digest of the rows of every day of a user is the sum of their row hashes, so it does not depend on
+    the order of the rows and the digests of the chunks of a file can be added.
+    :return: user ids, dates, number of rows and digests of the days
+    """
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    dates = np.asarray(dates)
+    days: np.ndarray = to_days(dates)
+    if len(user_ids) == 0:
+        return user_ids, dates, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    order: np.ndarray = np.lexsort((days, user_ids))
+    keys: np.ndarray = get_day_keys(user_ids, days)[order]
+    starts: np.ndarray = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+    nr_of_rows: np.ndarray = np.diff(np.append(starts, len(keys)))
+    # the sums wrap around at 2^64, which is a multiple of the modulus
+    digests: np.ndarray = np.add.reduceat(get_row_hashes(user_ids, days, values)[order], starts) % np.uint64(DIGEST_MODULUS)
+    return user_ids[order][starts], dates[order][starts], nr_of_rows, digests.astype(np.int64)
+
+
+class IncrementalImport:
+    """
+    Import of a file which mostly holds rows that are already in the group, e.g. a daily export of all data.
+    The import_digests table holds the number of rows and a digest of every day of every user of the group.
+    The file is read twice: first its digests are compared with the stored ones, then only the rows of
+    new days are inserted, and the rows of changed days replace the stored rows of these days. Days which
+    are missing in the file are kept. Only the SQLite storage can replace rows.
+    """
+
+    # digests of the file, the state of a day is new, changed or unchanged
+    file_digests: str = "temp.import_file_digests"
+
+    def __init__(self, writer: BulkWriter, group_id: int, chunk_size: int) -> None:
+        self.writer: BulkWriter = writer
+        self.group_id: int = int(group_id)
+        self.chunk_size: int = chunk_size
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self.writer.connection
+
+    @staticmethod
+    def clear(connection: sqlite3.Connection, group_id: int) -> None:
+        """
+        Forget the digests of a group which gets rows by another import, they are computed again from the rows.
+        """
+        if connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'import_digests'").fetchone():
+            connection.execute("DELETE FROM main.import_digests WHERE group_id = ?", (int(group_id),))
+
+    def prepare(self) -> None:
+        if self.writer.storage.writes_collections:
+            raise ValueError(f"the {self.writer.storage.name} storage can not replace rows, "
+                             f"an incremental import needs the sqlite storage")
+        self.writer.begin()
+        self.connection.execute(f"DROP TABLE IF EXISTS {self.file_digests}")
+        self.connection.execute(
+            f"CREATE TABLE {self.file_digests} (group_id INTEGER, user_id INTEGER, date, nr_of_rows INTEGER, "
+            f"digest INTEGER, state TEXT, PRIMARY KEY (group_id, user_id, date))"
+        )
+
+        table_name: str = self.writer.get_collections_table(self.group_id)
+        has_rows: bool = self.connection.execute(
+            f"SELECT 1 FROM main.{table_name} WHERE group_id = ? LIMIT 1", (self.group_id,)).fetchone() is not None
+        has_digests: bool = self.connection.execute(
+            "SELECT 1 FROM main.import_digests WHERE group_id = ? LIMIT 1", (self.group_id,)).fetchone() is not None
+        if has_rows and not has_digests:
+            print("[INFO] The group has no digests yet, they are computed from its rows once.")
+            cursor: sqlite3.Cursor = self.connection.execute(
+                f"SELECT user_id, date, value FROM main.{table_name} WHERE group_id = ?", (self.group_id,)
+            )
+            while rows := cursor.fetchmany(self.chunk_size):
+                user_ids, dates, values = zip(*rows)
+                self.add_digests("main.import_digests", user_ids, dates, values)
+
+    def add_digests(self, table_name: str, user_ids, dates, values) -> None:
+        """
+        Add the digests of rows to the digests of their days in the table.
+        """
+        user_ids, dates, nr_of_rows, digests = get_digests(user_ids, self.writer.date_codec.encode(dates), values)
+        self.connection.executemany(
+            f"INSERT INTO {table_name} (group_id, user_id, date, nr_of_rows, digest) VALUES (?, ?, ?, ?, ?) "
+            f"ON CONFLICT (group_id, user_id, date) DO UPDATE SET nr_of_rows = nr_of_rows + excluded.nr_of_rows, "
+            f"digest = (digest + excluded.digest) % {DIGEST_MODULUS}",
+            zip([self.group_id] * len(user_ids), user_ids.tolist(), dates.tolist(), nr_of_rows.tolist(), digests.tolist())
+        )
+
+    def add_file_chunk(self, user_ids, dates, values) -> None:
+        self.add_digests(self.file_digests, user_ids, dates, values)
+
+    def compare(self) -> dict[str, int]:
+        """
+        Compare the digests of the file with the stored digests of the group.
+        :return: number of days per state
+        """
+        self.connection.execute(
+            f"UPDATE {self.file_digests} AS f SET state = COALESCE(("
+            f"SELECT CASE WHEN d.nr_of_rows = f.nr_of_rows AND d.digest = f.digest THEN 'unchanged' ELSE 'changed' END "
+            f"FROM main.import_digests d WHERE d.group_id = f.group_id AND d.user_id = f.user_id AND d.date = f.date"
+            f"), 'new')"
+        )
+        return dict(self.connection.execute(f"SELECT state, COUNT(*) FROM {self.file_digests} GROUP BY state").fetchall())
+
+    def get_days(self, *states: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: user ids and dates of the days in one of the states
+        """
+        rows: list[tuple] = self.connection.execute(
+            f"SELECT user_id, date FROM {self.file_digests} WHERE state IN ({', '.join('?' * len(states))})", states
+        ).fetchall()
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        user_ids, dates = zip(*rows)
+        return np.asarray(user_ids, dtype=np.int64), np.asarray(dates)
+
+    def delete_changed(self) -> int:
+        """
+        Delete the stored rows of the changed days.
+        :return: number of deleted rows
+        """
+        user_ids, dates = self.get_days("changed")
+        if len(user_ids) == 0:
+            return 0
+        return self.writer.delete_collections(self.group_id, user_ids, dates)
+
+    def insert_rows(self, chunks: Iterable[tuple]) -> int:
+        """
+        Insert the rows of the new and changed days from the chunks of the file.
+        :return: number of inserted rows
+        """
+        user_ids, dates = self.get_days("new", "changed")
+        if len(user_ids) == 0:
+            return 0
+        written_days: np.ndarray = get_day_keys(user_ids, to_days(dates))
+
+        inserted: int = 0
+        for user_ids, dates, values in chunks:
+            selected: np.ndarray = np.isin(get_day_keys(user_ids, to_days(dates)), written_days)
+            if selected.any():
+                inserted += self.writer.insert_collections(
+                    self.group_id, user_ids[selected], dates[selected], values[selected]
+                )
+        return inserted
+
+    def store_digests(self) -> None:
+        self.connection.execute(
+            f"INSERT OR REPLACE INTO main.import_digests (group_id, user_id, date, nr_of_rows, digest) "
+            f"SELECT group_id, user_id, date, nr_of_rows, digest FROM {self.file_digests} WHERE state != 'unchanged'"
+        )
+        self.connection.execute(f"DROP TABLE {self.file_digests}")
@@ -2,6 +2,8 @@ import datetime as dt
 import numpy as np
 import pandas as pd
 
+from modules.dates import to_date
+
 
 class FinalAggregationRow:
     date: dt.date
@@ -9,15 +11,14 @@ class FinalAggregationRow:
     value: int
     index: int
 
-    # Date format for incoming data and outgoing data
-    incoming_date_format: str = "%Y-%m-%d"
+    # Date format for outgoing data, the incoming dates are ISO strings or day numbers
     outgoing_date_format: str = "%d.%m.%Y"
 
     def __init__(self, index: int):
         self.index: int = index
 
-    def deserialize(self, row: list[str, int, int]):
-        self.date = dt.datetime.strptime(row[0], self.incoming_date_format).date()
+    def deserialize(self, row: list[str | int, int, int]):
+        self.date = to_date(row[0])
         self.sample_id = int(row[1])
         self.value = int(row[2])
         return self
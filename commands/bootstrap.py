@@ -1,11 +1,11 @@
-import sqlite3
-
 from adapter.generator.bootstrap import Bootstrap
+from adapter.generator.checkpoint import BootstrapCheckpoint
+from adapter.generator.intervals import BootstrapIntervals
 from modules.queryManager import QueryManager
 from modules.configuration import Configuration
 from modules.commandlineInput import CommandlineInput
 
-from commands.interfaces import Command
+from commands.interfaces import Command, AbstractKeyword
 from commands.commandManager import CommandManager
 
 
@@ -14,11 +14,20 @@ class Bootstrapping(Command):
         super().__init__(cm, "bootstrap", "This Command creates an Set of Samples", **kwargs)
         self.cm = cm
         self.configuration = configuration
-        self.connection = sqlite3.connect(self.configuration.get_database_file_path())
-        self.query_manager: QueryManager = QueryManager(self.configuration, connection=self.connection)
-        self.bootstrap: Bootstrap = Bootstrap(config=self.configuration)
+        self.query_manager: QueryManager = QueryManager(self.configuration)
+        self.bootstrap: Bootstrap = Bootstrap(config=self.configuration, seed=self.configuration.get_bootstrap_seed())
 
     def execute(self, *attributes) -> None:
+        if len(attributes) > 0:
+            if attributes[0] == AbstractKeyword.INTERVALS:
+                self.intervals()
+            elif attributes[0] == AbstractKeyword.RESUME:
+                self.resume()
+            else:
+                print(f"[ERROR] Attribute {attributes[0]} not found.")
+                self.help()
+            return
+
         sample_id: int = CommandlineInput.int_input(
             "Witch sample do you want to use as test-group? ",
             default=0
@@ -28,34 +37,116 @@ class Bootstrapping(Command):
             dataset=self.query_manager.get_result(
                 query_name="data_as_bootstrap_sample",
                 group_id=sample_id
-            )
+            ),
+            group_id=sample_id
         )
+        if len(self.bootstrap.dataset) == 0:
+            print(f"[ERROR] The test-group {sample_id} has no rows.")
+            print("[TIPP] You can list the samples with the command 'show samples'.")
+            print("--------------------------------------------------------------------------------")
+            return
 
         nr_of_samples: int = CommandlineInput.int_input(
             "How many samples do you want to generate?", default=100)
 
-        print("Generating the bootstrap samples...")
-        self.bootstrap.choice(nr_of_samples=nr_of_samples)
-        print("...done.")
-
-        if CommandlineInput.yes_no_input(
-                "Do you want to join the users to the bootstrap samples? (y/n)", default="yes"):
-            self.bootstrap.join_users()
+        join_users: bool = False
+        if self.bootstrap.storage == "weighted":
+            print("[INFO] The samples are stored weighted, the users are joined when the samples are read.")
+        elif self.bootstrap.storage == "aggregate":
+            print("[INFO] Only the daily totals of the samples are stored.")
+        else:
+            join_users = CommandlineInput.yes_no_input(
+                "Do you want to join the users to the bootstrap samples? (y/n)", default="yes")
 
-        # save the bootstrap samples
+        # the samples are generated, joined and saved batch by batch
         saving_the_samples: bool = CommandlineInput.yes_no_input("Do you want to save the samples? (y/n)")
+        overwrite_checkpoint: bool = False
+        checkpoint_path: str = self.configuration.get_bootstrap_checkpoint_path()
+        if saving_the_samples and BootstrapCheckpoint.is_unfinished(checkpoint_path):
+            print(f"[WARNING] {checkpoint_path} holds an unfinished bootstrap run.")
+            print("[TIPP] You can continue it with the command 'bootstrap resume'.")
+            overwrite_checkpoint = CommandlineInput.yes_no_input(
+                "Do you want to overwrite it? The unfinished run can not be resumed afterwards. (y/n)")
+            saving_the_samples = overwrite_checkpoint
         if saving_the_samples:
-            print("Saving the bootstrap samples...")
-            self.bootstrap.save_samples()
+            print("Generating and saving the bootstrap samples...")
+            for _ in self.bootstrap.stream(
+                    nr_of_samples=nr_of_samples,
+                    batch_size=self.configuration.get_bootstrap_batch_size(),
+                    workers=self.configuration.get_bootstrap_workers(),
+                    max_in_flight=self.configuration.get_bootstrap_max_in_flight(),
+                    join=join_users,
+                    checkpoint_path=checkpoint_path, overwrite_checkpoint=overwrite_checkpoint
+            ):
+                pass
             print("...done.")
         else:
             print("Samples not saved.")
 
         print("--------------------------------------------------------------------------------")
 
+    def resume(self) -> None:
+        checkpoint_path: str = self.configuration.get_bootstrap_checkpoint_path()
+        if not BootstrapCheckpoint.exists(checkpoint_path):
+            print(f"[ERROR] There is no bootstrap checkpoint in {checkpoint_path}.")
+            print("--------------------------------------------------------------------------------")
+            return
+
+        checkpoint: BootstrapCheckpoint = BootstrapCheckpoint.load(checkpoint_path)
+        print(f"[INFO] Test-group: {checkpoint.source_group_id}")
+        print(f"[INFO] Completed samples: {len(checkpoint.completed_sample_ids)}/{checkpoint.nr_of_samples}")
+        print(f"[INFO] Storage: {checkpoint.storage}")
+        if not CommandlineInput.yes_no_input("Do you want to resume this bootstrap run? (y/n)", default="yes"):
+            print("Bootstrap run not resumed.")
+            print("--------------------------------------------------------------------------------")
+            return
+
+        print("Reading the test-group dataset...")
+        self.bootstrap.set_original_dataset(
+            dataset=self.query_manager.get_result(
+                query_name="data_as_bootstrap_sample",
+                group_id=checkpoint.source_group_id
+            ),
+            group_id=checkpoint.source_group_id
+        )
+
+        print("Generating and saving the remaining bootstrap samples...")
+        for _ in self.bootstrap.resume(
+                checkpoint,
+                workers=self.configuration.get_bootstrap_workers(),
+                max_in_flight=self.configuration.get_bootstrap_max_in_flight()
+        ):
+            pass
+        print("...done.")
+        print("--------------------------------------------------------------------------------")
+
+    def intervals(self) -> None:
+        sample_id: int = CommandlineInput.int_input(
+            "Witch sample do you want to use as test-group? ",
+            default=0
+        )
+        nr_of_replicates: int = CommandlineInput.int_input(
+            "How many bootstrap replicates do you want to compute?", default=10000)
+        confidence: float = CommandlineInput.float_input("Confidence level:", default=0.95)
+
+        print("Computing the confidence intervals...")
+        bootstrap_intervals: BootstrapIntervals = BootstrapIntervals(
+            config=self.configuration, seed=self.configuration.get_bootstrap_seed())
+        intervals = bootstrap_intervals.intervals(
+            group_id=sample_id, nr_of_replicates=nr_of_replicates, confidence=confidence,
+            batch_size=self.configuration.get_bootstrap_batch_size()
+        )
+        print("...done.")
+        print("--------------------------------------------------------------------------------")
+        print(intervals.to_string(index=False))
+        print("--------------------------------------------------------------------------------")
+
     def help(self) -> None:
         print("With this command you can create a set of samples for the bootstrapping.")
         print("You can choose how many samples you want to generate and if the users should be joined to the samples.")
+        print("- resume: Continue an interrupted bootstrap run from its last checkpoint.")
+        print("- intervals: Compute percentile and BCa confidence intervals of the daily totals of a group")
+        print("  without saving the bootstrap samples.")
 
     def __repr__(self):
         return f"<Command: {self.name}>"
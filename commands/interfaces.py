@@ -20,6 +20,12 @@ class AbstractKeyword:
     SETUP: str = "setup"
     F: str = "f"
     FILE: str = "file"
+    INTERVALS: str = "intervals"
+    RESUME: str = "resume"
+    CACHE: str = "cache"
+    MIGRATE: str = "migrate"
+    I: str = "i"
+    INCREMENTAL: str = "incremental"
 
 
 class Command:
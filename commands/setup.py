@@ -1,18 +1,21 @@
 import os
+import sqlite3
 from abc import ABC
 from datetime import datetime, date, timedelta
-import shutil
 from zipfile import ZipFile
 
-from sqlalchemy import create_engine
-from sqlalchemy.future import Engine
 
+from adapter.database.backup import DatabaseBackup
+from adapter.database.matrix_cache import MatrixCache
+from adapter.database.project_archive import ProjectArchive
 from adapter.generator.generate_testdata import Generator
-from adapter.inserting.csv import ImportCSV
+from adapter.inserting.csv import ImportCSV, readers
 
 from modules.configuration import Configuration
 from modules.commandlineInput import CommandlineInput
 from modules.queryManager import QueryManager
+from modules.connectionManager import ConnectionManager
+from modules.dates import to_date
 
 from model.model import Base
 
@@ -65,32 +68,40 @@ class DatabaseCommand(Command):
             elif command.name == AbstractKeyword.DELETE:
                 self.delete(*args[1:] if len(args) > 1 else [])
             elif command.name == AbstractKeyword.BACKUP:
-                self.backup()
+                self.backup(*args[1:] if len(args) > 1 else [])
             elif command.name == AbstractKeyword.RESTORE:
                 self.restore()
             elif command.name == AbstractKeyword.INFO:
                 self.info()
             elif command.name == AbstractKeyword.REBUILD:
                 self.rebuild()
+            elif command.name == AbstractKeyword.CACHE:
+                self.clear_cache()
+            elif command.name == AbstractKeyword.MIGRATE:
+                self.migrate()
             else:
                 print(f"[ERROR] Command '{command}' not found.")
                 self.help()
 
     def create(self) -> None:
         print("[INFO] Creating database...", end="")
-        Base.metadata.create_all(create_engine(self.configuration.get_database_path()))
+        Base.metadata.create_all(ConnectionManager.get(self.configuration).engine)
         print("done.")
 
     def delete(self, *args) -> None:
         if len(args) == 0:
             print("[INFO] Deleting database...")
-            engine: Engine = create_engine(self.configuration.get_database_file_path())
-            Base.metadata.drop_all(engine)
+            connection_manager: ConnectionManager = ConnectionManager.get(self.configuration)
+            connection_manager.partitions.drop_all(connection_manager.orm_connection)
+            connection_manager.orm_connection.commit()
+            connection_manager.partitions.changed()
+            Base.metadata.drop_all(connection_manager.engine)
             print("[INFO] Database deleted.")
         elif len(args) > 0:
             if args[0] == AbstractKeyword.F or args[0] == AbstractKeyword.FILE:
                 if self.configuration.database_file_exists():
                     print("[INFO] Deleting database...")
+                    ConnectionManager.get(self.configuration).close()
                     os.remove(self.configuration.get_database_file_path())
                     print("[INFO] Database deleted.")
                     print("[TIPP] You can now create a new database with the command 'database create'.")
@@ -101,10 +112,13 @@ class DatabaseCommand(Command):
                 print("[ERROR] Invalid argument.")
                 self.help()
 
-    def backup(self) -> None:
-        if self.configuration.database_file_exists():
+    def backup(self, *args) -> None:
+        if len(args) > 0 and args[0] not in (AbstractKeyword.I, AbstractKeyword.INCREMENTAL):
+            print("[ERROR] Invalid argument.")
+            self.help()
+        elif self.configuration.database_file_exists():
             print("[INFO] Backing up database...")
-            shutil.copy(self.configuration.get_database_file_path(), self.configuration.get_backup_database_file_path())
+            DatabaseBackup(self.configuration).backup(incremental=len(args) > 0)
             print("[INFO] Database backed up.")
         else:
             print("[ERROR] Database file not found.")
@@ -118,7 +132,7 @@ class DatabaseCommand(Command):
     def restore(self) -> None:
         if self.configuration.database_backup_file_exists():
             print("[INFO] Restoring database...")
-            shutil.copy(self.configuration.get_backup_database_file_path(), self.configuration.get_database_file_path())
+            DatabaseBackup(self.configuration).restore()
             print("[INFO] Database restored.")
         else:
             print("[ERROR] Database backup file not found.")
@@ -134,15 +148,82 @@ class DatabaseCommand(Command):
         self.delete(AbstractKeyword.FILE)
         self.create()
 
+    def migrate(self) -> None:
+        if not self.configuration.database_file_exists():
+            print("[ERROR] Database file not found.")
+            print("[TIPP] You can create a new database with the command 'database create'.")
+            return
+
+        query_manager: QueryManager = QueryManager(self.configuration)
+        plans_before: dict[str, list[str]] = {
+            query_name: self.get_query_plan(query_manager, query_name) for query_name in query_manager.get_query_names()
+        }
+
+        print("[INFO] Migrating database...")
+        connection_manager: ConnectionManager = ConnectionManager.get(self.configuration)
+        # new tables are created with their indexes, existing tables only get the missing indexes
+        Base.metadata.create_all(connection_manager.engine)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                print(f"- {index.name}")
+                index.create(bind=connection_manager.engine, checkfirst=True)
+        for table_name, _, _ in connection_manager.partitions.get_partitions(connection_manager.orm_connection):
+            print(f"- indexes of the partition {table_name}")
+            connection_manager.partitions.create_indexes(connection_manager.orm_connection, table_name)
+        connection_manager.orm_connection.commit()
+        # the statement cache of the old connection still holds the plans without the indexes
+        connection_manager.close()
+        if self.configuration.get_partition_size() > 0:
+            connection: sqlite3.Connection = connection_manager.connect(isolation_level=None)
+            if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                # the pages of dropped partitions can only be given back if the file is rebuilt once
+                print("- enabling incremental vacuum (the database file is rebuilt)")
+                connection.execute("VACUUM")
+            connection.close()
+        print("- counting the group statistics")
+        query_manager.refresh_group_stats()
+        print("[INFO] Database migrated.")
+
+        print("--------------------------------------------------------------------------------")
+        print("Query plans:")
+        for query_name, plan_before in plans_before.items():
+            plan_after: list[str] = self.get_query_plan(query_manager, query_name)
+            print(f"- {query_name}{'' if plan_after != plan_before else ' (unchanged)'}")
+            for line in plan_before:
+                print(f"    before: {line}")
+            for line in plan_after:
+                print(f"    after:  {line}")
+        query_manager.close()
+        print("--------------------------------------------------------------------------------")
+
+    @staticmethod
+    def get_query_plan(query_manager: QueryManager, query_name: str) -> list[str]:
+        try:
+            return query_manager.get_query_plan(query_name)
+        except sqlite3.OperationalError as error:
+            # e.g. a query on a table that is created by the migration
+            return [str(error)]
+
+    def clear_cache(self) -> None:
+        print("[INFO] Deleting the matrix cache...", end="")
+        MatrixCache(self.configuration).clear()
+        print("done.")
+        print("[INFO] The matrices are rebuilt when they are used the next time.")
+
     def help(self) -> None:
         print("--------------------------------------------------------------------------------")
         print("Database commands:")
         print("- create: Create the database with the given model")
-        print("- backup: Backup the database to the backup path in the configuration file")
+        print("- backup [i or incremental]: Backup the database to the backup path in the configuration file")
+        print("  The database can be used during the backup. If 'i' or 'incremental' is specified, only the")
+        print("  groups which changed since the last backup are copied.")
         print("- restore: Reload the database from the backup path in the configuration file")
         print("- rebuild: Delete the database and create a new one")
+        print("- migrate: Add missing tables and indexes to an existing database and show the query plans.")
+        print("           With partitioning, the partitions get missing indexes and the file can shrink again.")
         print("- delete [f or file]: Delete the database.")
         print("  If 'f' or 'file' is specified, the database file will be deleted.")
+        print("- cache: Delete the cached user x date matrices of the groups.")
         print("- info: Show information about the database management in this project.")
         print("--------------------------------------------------------------------------------")
         print(">> Note: all databases will not be versioned.")
@@ -233,7 +314,7 @@ class ProjectCommand(Command, ABC):
 
         if not database_file_exists:
             print("- Creating database file...", end="")
-            Base.metadata.create_all(create_engine(self.configuration.get_database_path()))
+            Base.metadata.create_all(ConnectionManager.get(self.configuration).engine)
             print("done.")
             print("  [TIPP] This can also be done by typing 'database create'.")
         else:
@@ -293,7 +374,7 @@ class ProjectCommand(Command, ABC):
 
             if os.path.exists(path):
                 if os.path.isdir(path):
-                    filename: str = f"project-backup_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.zip"
+                    filename: str = f"project-backup_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}{ProjectArchive.extension}"
                     self.generate_backup_file(path=os.path.join(path, filename))
                 elif os.path.isfile(path):
                     print("[WARNING] The backup file already exists.")
@@ -306,11 +387,11 @@ class ProjectCommand(Command, ABC):
                         print("[INFO] Backup file not overwritten.")
             else:
                 if os.path.exists(os.path.dirname(path)):
-                    if os.path.exists(path=path + ".zip"):
+                    if os.path.exists(path=path + ProjectArchive.extension):
                         print("[WARNING] The backup file already exists.")
                         print("Would you like to overwrite it? (y/n)", end=" ")
                         if input().lower() == "y":
-                            os.remove(path + ".zip")
+                            os.remove(path + ProjectArchive.extension)
                             self.generate_backup_file(path=path)
                             print("[INFO] Backup file overwritten.")
                         else:
@@ -322,25 +403,16 @@ class ProjectCommand(Command, ABC):
                     print("          Please specify a valid path.")
 
     def generate_backup_file(self, path: str) -> None:
-        if os.path.splitext(path)[1] != ".zip":
-            path += ".zip"
+        if os.path.splitext(path)[1] != ProjectArchive.extension:
+            path += ProjectArchive.extension
 
         print(f"[INFO] Creating backup file {path}...")
+        # the open transactions of this process are not in the file
+        ConnectionManager.close_all()
+        archive: ProjectArchive = ProjectArchive(self.configuration, path)
+        archive.create()
 
-        with ZipFile(path, "w") as backup_file:
-            for root, dirs, files in os.walk(self.configuration.get_database_directory_path()):
-                for file in files:
-                    backup_file.write(
-                        os.path.join(root, file),
-                        os.path.relpath(
-                            os.path.join(root, file),
-                            self.configuration.get_database_directory_path().split("/")[0]
-                        )
-                    )
-            backup_file.write(os.path.abspath(self.configuration.get_query_path()), "queries.ini")
-            backup_file.write(os.path.abspath(self.configuration.get_config_path()), "configuration.ini")
-
-        print(f"[INFO] Backup file {path} created.")
+        print(f"[INFO] Backup file {path} created, its chunks are stored in {archive.chunk_path}.")
         print(f"[TIPP] To restore the backup, type 'project restore {path}'.")
 
     def restore_dialog(self, *args) -> None:
@@ -358,7 +430,15 @@ class ProjectCommand(Command, ABC):
 
     def restore_backup_file(self, path: str) -> None:
         print(f"[INFO] Restoring backup file {path}...")
+        # the database file is replaced
+        ConnectionManager.close_all()
+
+        if os.path.splitext(path)[1] != ".zip":
+            ProjectArchive(self.configuration, path).restore()
+            print("[INFO] Backup restored.")
+            return
 
+        # backups of older versions
         with ZipFile(path, "r") as backup_file:
             for file in backup_file.namelist():
                 print(f"[DEBUG] Extracting {file}...")
@@ -378,8 +458,9 @@ class ProjectCommand(Command, ABC):
         print("Project commands:")
         print("- guide: Show the guide for this project.")
         print("- setup: With this command you can setup the project.")
-        print("- backup [path]: zip all your specific files and put them in the given path.")
-        print("- restore [path]: restore the project from the given path.")
+        print("- backup [path]: back up all your specific files to a snapshot in the given path.")
+        print("  Unchanged parts of the files are shared with the earlier snapshots in the same directory.")
+        print("- restore [path]: restore the project from the given snapshot (or zip file of older versions).")
         print("- rebuild: Rebuild this project. THIS WILL CLEANUP ALL SPECIFIED FILES!")
         print("- info: Show information about the project structure.")
         print("  You can also read the README.md file for all information.")
@@ -412,7 +493,6 @@ class DeleteCommand(Command):
         super().__init__(cm, name="delete",
                          description="This command will clean up the project in different ways.")
         self.configuration = configuration
-        self.query_manager: QueryManager = QueryManager(configuration)
 
     def execute(self, *args) -> None:
         if len(args) > 0:
@@ -432,11 +512,11 @@ class DeleteCommand(Command):
         print("--------------------------------------------------------------------------------")
 
     def delete_samples(self):
-        self.query_manager: QueryManager = QueryManager(self.configuration)
+        query_manager: QueryManager = QueryManager(self.configuration)
         print("[INFO] with this command you can delete specific samples in the database.")
         print("[INFO] Following samples are available:")
         print("--------------------------------------------------------------------------------")
-        samples: list[tuple] = self.query_manager.get_samples()
+        samples: list[tuple] = query_manager.get_samples()
         for sample in samples:
             print(f"- {sample[0]} > {sample[1]}")
         print("--------------------------------------------------------------------------------")
@@ -451,7 +531,7 @@ class DeleteCommand(Command):
             delete_samples: bool = CommandlineInput.bool_input("Do you want to delete this samples? (y/n)")
             print("--------------------------------------------------------------------------------")
             if delete_samples:
-                self.query_manager.delete_samples(min_group_id, max_group_id)
+                query_manager.delete_samples(min_group_id, max_group_id)
                 print("[INFO] Samples deleted.")
             else:
                 print("[INFO] Samples not deleted.")
@@ -462,12 +542,12 @@ class DeleteCommand(Command):
             delete_samples: bool = CommandlineInput.yes_no_input("Do you want to delete this samples? (y/n)")
             print("--------------------------------------------------------------------------------")
             if delete_samples:
-                self.query_manager.delete_sample(sample_id)
+                query_manager.delete_sample(sample_id)
                 print("[INFO] Sample deleted.")
             else:
                 print("[INFO] Sample not deleted.")
 
-        self.query_manager.close()
+        query_manager.close()
 
 
 class InsertDataCommand(Command):
@@ -475,13 +555,15 @@ class InsertDataCommand(Command):
         super().__init__(cm, name="insert",
                          description="This command will insert data into the database.")
         self.configuration = configuration
-        self.query_manager: QueryManager = QueryManager(configuration)
 
     def execute(self, *args) -> None:
         if len(args) > 0:
             command: InputParser = InputParser(args[0])
             if command.get_command() == AbstractKeyword.CSV:
-                self.insert_samples()
+                if len(args) > 1 and args[1] not in (AbstractKeyword.I, AbstractKeyword.INCREMENTAL):
+                    print(f"[ERROR] Invalid argument {args[1]}.")
+                else:
+                    self.insert_samples(incremental=len(args) > 1)
             else:
                 print(f"[ERROR] Attribute {command.get_command()} not found.")
             print("--------------------------------------------------------------------------------")
@@ -491,41 +573,60 @@ class InsertDataCommand(Command):
     def help(self) -> None:
         print("--------------------------------------------------------------------------------")
         print("insert <attribute>:")
-        print("- csv: This command will insert data from csv into the database.")
+        print("- csv: This command will insert data from csv (also compressed), parquet, arrow or npz files into the database.")
+        print("- csv i|incremental: Only insert the new and changed days of the users, e.g. of a daily full export.")
         print("--------------------------------------------------------------------------------")
 
-    def insert_samples(self) -> None:
+    def insert_samples(self, incremental: bool = False) -> None:
         import_csv: ImportCSV = ImportCSV()
 
         print("--------------------------------------------------------------------------------")
         csv_file_path: str = self.configuration.get_insert_csv_file_path(file_type="csv")
         print(f"[INFO] The CSV file path: {csv_file_path}")
         csv_file_path_correct: bool = CommandlineInput.yes_no_input("Is the CSV file path correct? (y/n)")
+        if csv_file_path_correct and not ImportCSV.get_files(csv_file_path):
+            print("[ERROR] No file found.")
+            csv_file_path_correct = False
         if not csv_file_path_correct:
-            csv_file_path = CommandlineInput.special_file_input("Please enter the CSV file path:", file_type="csv")
+            print("[INFO] All files of a directory or a glob pattern (e.g. exports/*.csv.gz) are imported in parallel.")
+            print(f"[INFO] Supported files: {', '.join(readers.keys())}")
+            while not ImportCSV.get_files(
+                    csv_file_path := CommandlineInput.string_input("Please enter the file, directory or pattern:")):
+                print("[ERROR] No file found.")
 
         print("--------------------------------------------------------------------------------")
         group_id: int = CommandlineInput.int_input("Please enter the sample id:")
         group_name: str = CommandlineInput.string_input("Please enter the sample name:")
         print("--------------------------------------------------------------------------------")
 
-        print("CSV column mapping:")
-        user_id_column: str = CommandlineInput.string_input("Name of the user id column in CSV File:")
-        date_column_name: str = CommandlineInput.string_input("Name of the date column in CSV File:")
-        value_column_name: str = CommandlineInput.string_input("Name of the value column in CSV File:")
+        print("Column mapping:")
+        user_id_column: str = CommandlineInput.string_input("Name of the user id column in the file:")
+        date_column_name: str = CommandlineInput.string_input("Name of the date column in the file:")
+        value_column_name: str = CommandlineInput.string_input("Name of the value column in the file:")
         print("--------------------------------------------------------------------------------")
 
-        import_csv.insert(
-            # set id and name of the group which the data should be connected to
-            group_id=group_id, name=group_name,
+        if incremental:
+            import_csv.insert_incremental(
+                group_id=group_id, name=group_name, path=csv_file_path,
+                user_id_column_name=user_id_column, date_column_name=date_column_name, value_column_name=value_column_name
+            )
+        elif ImportCSV.get_files(csv_file_path) == [csv_file_path]:
+            import_csv.insert(
+                # set id and name of the group which the data should be connected to
+                group_id=group_id, name=group_name,
 
-            # set the path to the csv file
-            csv_file=csv_file_path,
+                # set the path to the csv file
+                csv_file=csv_file_path,
 
-            # mapping column from csv file to table column
-            # write here the column name of the csv file
-            user_id_column_name=user_id_column, date_column_name=date_column_name, value_column_name=value_column_name
-        )
+                # mapping column from csv file to table column
+                # write here the column name of the csv file
+                user_id_column_name=user_id_column, date_column_name=date_column_name, value_column_name=value_column_name
+            )
+        else:
+            import_csv.insert_files(
+                group_id=group_id, name=group_name, path=csv_file_path,
+                user_id_column_name=user_id_column, date_column_name=date_column_name, value_column_name=value_column_name
+            )
 
 
 class GenerateDataCommand(Command):
@@ -533,7 +634,6 @@ class GenerateDataCommand(Command):
         super().__init__(cm, name="generate",
                          description="This command will generate data in the database.")
         self.configuration = configuration
-        self.query_manager: QueryManager = QueryManager(configuration)
 
     def execute(self, *args) -> None:
         if len(args) > 0:
@@ -562,18 +662,23 @@ class GenerateDataCommand(Command):
         value_range_max: int = CommandlineInput.int_input("Please enter the maximum value", default=100)
         nr_of_users: int = CommandlineInput.int_input("Please enter the number of users", default=10)
         days_per_user: int = CommandlineInput.int_input("Please enter the number of days per user", default=10)
+        seed: int | None = CommandlineInput.optional_int_input(
+            "Please enter the seed (empty for different data on every run): ")
+        print("[INFO] The data can be written to a csv file (e.g. data.csv.gz) or a directory of npz files.")
+        path: str = CommandlineInput.string_input("Please enter the file or directory (empty for the database): ")
 
         print("--------------------------------------------------------------------------------")
 
         sample_generator: Generator = Generator(
             start_date=start_date, date_steps=date_step,
             start_user_id=start_user_id, group_id=sample_id,
-            value_range=(value_range_min, value_range_max)
+            value_range=(value_range_min, value_range_max),
+            seed=seed, config=self.configuration
         )
 
         if CommandlineInput.yes_no_input("Do you want to generate the data? (y/n)"):
             sample_generator.generate_data(
-                users=nr_of_users, days_per_user=days_per_user
+                users=nr_of_users, days_per_user=days_per_user, path=path.strip() or None
             )
             print("[INFO] Data generated.")
         else:
@@ -585,7 +690,6 @@ class ShowCommand(Command):
         super().__init__(cm, name="show",
                          description="This command will show data from the database.")
         self.configuration = configuration
-        self.query_manager: QueryManager = QueryManager(configuration)
 
     def execute(self, *args) -> None:
         if len(args) > 0:
@@ -604,12 +708,34 @@ class ShowCommand(Command):
         print("--------------------------------------------------------------------------------")
 
     def show_samples(self) -> None:
-        print("+------------------------------------------------------------------------------+")
-        print("| Samples                                                                      |")
-        print("+------------------------------------------------------------------------------+")
-        print("|    ID     |                  Name                    |        Columns        |")
-        print("+-----------+------------------------------------------+-----------------------+")
-        for sample in self.query_manager.get_samples():
-            nr_of_columns: int = self.query_manager.get_nr_of_collections_per_sample(sample[0])
-            print(f"| {sample[0]:<9} | {sample[1]:<40} | {nr_of_columns:<21} |")
-        print("+-----------+------------------------------------------+-----------------------+")
+        query_manager: QueryManager = QueryManager(self.configuration)
+        query_manager.count_users()
+        # a bootstrap may write samples meanwhile
+        with ConnectionManager.get(self.configuration).snapshot():
+            has_group_stats: bool = query_manager.table_exists(query_manager.stats_table)
+            group_stats: list[tuple] = query_manager.get_group_stats()
+
+        rows: list[list[str]] = []
+        for group_id, name, storage, nr_of_rows, nr_of_users, min_date, max_date, _ in group_stats:
+            rows.append([
+                f"{group_id}", f"{name}",
+                f"{nr_of_rows} ({storage})" if storage not in (None, "rows") else f"{nr_of_rows}",
+                f"{nr_of_users}" if nr_of_users is not None else "-",
+                *(str(to_date(date)) if date is not None else "-" for date in (min_date, max_date))
+            ])
+        # the names are not cut, the name column is as wide as the longest name
+        titles: list[str] = ["ID", "Name", "Rows", "Users", "From", "To"]
+        widths: list[int] = [5, max([40] + [len(row[1]) for row in rows]), 17, 7, 10, 10]
+        separator: str = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+
+        print("+" + "-" * (len(separator) - 2) + "+")
+        print(f"| {'Samples':<{len(separator) - 4}} |")
+        print(separator)
+        print("| " + " | ".join(f"{title:^{width}}" for title, width in zip(titles, widths)) + " |")
+        print(separator)
+        for row in rows:
+            print("| " + " | ".join(f"{cell:<{width}}" for cell, width in zip(row, widths)) + " |")
+        print(separator)
+        if not has_group_stats:
+            print("[INFO] The database has no group statistics, the rows of every group were counted.")
+            print("[TIPP] You can add the statistics with the command 'database migrate'.")
@@ -1,9 +1,32 @@
+import datetime
+
 import sqlalchemy as sa
 from sqlalchemy.orm import declarative_base
 
+from modules.dates import to_date
+
 Base = declarative_base()
 
 
+class EncodedDate(sa.types.TypeDecorator):
+    """
+    A date column which holds ISO date strings or day numbers since 1970-01-01 (see modules.dates).
+    Both are read as datetime.date, values which are already encoded are written as they are.
+    """
+    impl = sa.Date
+    cache_ok = True
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if isinstance(value, datetime.date):
+                return to_date(value).isoformat()
+            return value
+        return process
+
+    def result_processor(self, dialect, coltype):
+        return to_date
+
+
 class Groups(Base):
     __tablename__ = 'groups'
     id = sa.Column(sa.Integer, primary_key=True)
@@ -19,13 +42,102 @@ class Collections(Base):
     in the same format as the data you want to store.
     """
     __tablename__ = 'collections'
+    __table_args__ = (
+        # covers final_aggregation and every other scan of a group
+        sa.Index('ix_collections_group_id_date_value', 'group_id', 'date', 'value'),
+        # join_users_to_dataset and the user index of the bootstrap
+        sa.Index('ix_collections_user_id_group_id', 'user_id', 'group_id'),
+    )
     id = sa.Column(sa.Integer, primary_key=True)
     group_id = sa.Column(sa.ForeignKey('groups.id'))
 
     # here you can change the table format
     user_id = sa.Column(sa.Integer)
-    date = sa.Column(sa.Date)
+    date = sa.Column(EncodedDate)
     value = sa.Column(sa.Integer)
 
     def __repr__(self):
         return f'<Collection {", ".join([f"{v}" for v in self.__dict__.values()][1:])}>'
+
+
+class GroupStats(Base):
+    """
+    Statistics of every group, they are updated whenever rows of a group are written or deleted,
+    so they never have to be counted from the rows.
+    """
+    __tablename__ = 'group_stats'
+    group_id = sa.Column(sa.ForeignKey('groups.id'), primary_key=True)
+    # rows, weighted or aggregate
+    storage = sa.Column(sa.String(16), nullable=False)
+
+    nr_of_rows = sa.Column(sa.Integer, nullable=False)
+    nr_of_users = sa.Column(sa.Integer)
+    min_date = sa.Column(EncodedDate)
+    max_date = sa.Column(EncodedDate)
+    value_sum = sa.Column(sa.Integer)
+
+    def __repr__(self):
+        return f'<GroupStats(group_id={self.group_id}, storage={self.storage}, nr_of_rows={self.nr_of_rows})>'
+
+
+class GroupVersions(Base):
+    """
+    Write counter of every group, it is increased whenever the rows or the statistics of a group are written.
+    The counter of a deleted group is kept, so a new group with the same id gets a new version.
+    """
+    __tablename__ = 'group_versions'
+    group_id = sa.Column(sa.Integer, primary_key=True)
+    version = sa.Column(sa.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<GroupVersions(group_id={self.group_id}, version={self.version})>'
+
+
+class ImportDigests(Base):
+    """
+    Watermark of the incremental import: the number of rows and a digest of the rows of every user and
+    day of a group, an import only writes the days whose rows changed.
+    """
+    __tablename__ = 'import_digests'
+    group_id = sa.Column(sa.ForeignKey('groups.id'), primary_key=True)
+    user_id = sa.Column(sa.Integer, primary_key=True)
+    date = sa.Column(EncodedDate, primary_key=True)
+
+    nr_of_rows = sa.Column(sa.Integer, nullable=False)
+    digest = sa.Column(sa.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<ImportDigests(group_id={self.group_id}, user_id={self.user_id}, date={self.date})>'
+
+
+class SampleWeights(Base):
+    """
+    Compact storage of a bootstrap sample: every drawn user is stored once together
+    with the number of times it was drawn. The rows of the user are taken from the
+    source group when the sample is read.
+    """
+    __tablename__ = 'sample_weights'
+    id = sa.Column(sa.Integer, primary_key=True)
+    group_id = sa.Column(sa.ForeignKey('groups.id'), index=True)
+    source_group_id = sa.Column(sa.ForeignKey('groups.id'))
+
+    user_id = sa.Column(sa.Integer)
+    multiplicity = sa.Column(sa.Integer)
+
+    def __repr__(self):
+        return f'<SampleWeights(group_id={self.group_id}, user_id={self.user_id}, multiplicity={self.multiplicity})>'
+
+
+class SampleAggregates(Base):
+    """
+    Daily totals of a bootstrap sample, the raw rows of the sample are not stored.
+    """
+    __tablename__ = 'sample_aggregates'
+    id = sa.Column(sa.Integer, primary_key=True)
+    group_id = sa.Column(sa.ForeignKey('groups.id'), index=True)
+
+    date = sa.Column(EncodedDate)
+    value = sa.Column(sa.Integer)
+
+    def __repr__(self):
+        return f'<SampleAggregates(group_id={self.group_id}, date={self.date}, value={self.value})>'
@@ -15,6 +15,18 @@ class CommandlineInput:
                 print("[ERROR] This is not a valid number.")
                 continue
 
+    @staticmethod
+    def optional_int_input(prompt: str) -> int | None:
+        while True:
+            user_input: str = input(prompt).strip()
+            if user_input.isdigit():
+                return int(user_input)
+            elif user_input == '':
+                return None
+            else:
+                print("[ERROR] This is not a valid number.")
+                continue
+
     @staticmethod
     def float_input(prompt: str, default: float = 0.0) -> float:
         while True:
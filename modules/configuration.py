@@ -16,9 +16,23 @@ class Configuration:
     def get_query_path(self) -> str:
         return self.config['queries']['path']
 
+    def get_query_engine(self) -> str:
+        return self.config.get('queries', 'engine', fallback='sqlite')
+
+    def get_query_engine_queries(self) -> list[str]:
+        queries: str = self.config.get(
+            'queries', 'engine_queries',
+            fallback='final_aggregation, final_aggregation_weighted, final_aggregation_aggregated, distinct_users'
+        )
+        return [query.strip() for query in queries.split(',') if query.strip()]
+
+    def get_query_engine_threads(self) -> int:
+        return self.config.getint('queries', 'threads', fallback=0)
+
     def get_query_parser(self) -> configparser.ConfigParser:
         query_parser: configparser.ConfigParser = configparser.ConfigParser()
-        query_parser.read(self.get_query_path())
+        # queries which are missing in the query file are taken from the template
+        query_parser.read([self.get_query_template_path(), self.get_query_path()])
         return query_parser
 
     def get_database_path(self) -> str:
@@ -36,12 +50,97 @@ class Configuration:
     def get_insert_csv_file_path(self, file_type: str) -> str:
         return self.config['insert'][file_type]
 
+    def get_insert_chunk_size(self) -> int:
+        return self.config.getint('insert', 'chunk_size', fallback=1000000)
+
+    def get_insert_commit_rows(self) -> int:
+        return self.config.getint('insert', 'commit_rows', fallback=10000000)
+
+    def get_insert_workers(self) -> int:
+        workers: int = self.config.getint('insert', 'workers', fallback=0)
+        return workers if workers > 0 else os.cpu_count()
+
+    def get_insert_max_in_flight(self) -> int:
+        return self.config.getint('insert', 'max_in_flight', fallback=4)
+
     def get_database_logging(self) -> bool:
         return self.config.getboolean('logging', 'database_logging')
 
     def database_backup_file_exists(self) -> bool:
         return os.path.exists(self.get_backup_database_file_path())
 
+    def get_partition_size(self) -> int:
+        return self.config.getint('database', 'partition_size', fallback=0)
+
+    def get_journal_mode(self) -> str:
+        return self.config.get('database', 'journal_mode', fallback='delete')
+
+    def get_busy_timeout(self) -> int:
+        return self.config.getint('database', 'busy_timeout', fallback=5000)
+
+    def get_lock_retries(self) -> int:
+        return self.config.getint('database', 'lock_retries', fallback=5)
+
+    def get_mmap_size(self) -> int:
+        return self.config.getint('database', 'mmap_size', fallback=0)
+
+    def get_backup_pages(self) -> int:
+        return self.config.getint('database', 'backup_pages', fallback=16384)
+
+    def get_date_encoding(self) -> str:
+        return self.config.get('database', 'date_encoding', fallback='iso')
+
+    def get_ingest_profile(self) -> str:
+        return self.config.get('database', 'ingest_profile', fallback='ingest')
+
+    def get_storage_backend(self) -> str:
+        return self.config.get('storage', 'backend', fallback='sqlite')
+
+    def get_storage_path(self) -> str:
+        return self.config.get('storage', 'path', fallback='data/database/columns')
+
+    def get_storage_format(self) -> str:
+        return self.config.get('storage', 'format', fallback='auto')
+
+    def get_storage_chunk_size(self) -> int:
+        return self.config.getint('storage', 'chunk_size', fallback=1000000)
+
+    def get_matrix_cache_path(self) -> str:
+        return self.config.get('cache', 'path', fallback='data/database/cache')
+
+    def matrix_cache_enabled(self) -> bool:
+        return self.config.getboolean('cache', 'enabled', fallback=True)
+
+    def get_bootstrap_seed(self) -> int | None:
+        seed: str = self.config.get('bootstrap', 'seed', fallback='')
+        return int(seed) if seed else None
+
+    def get_bootstrap_batch_size(self) -> int:
+        return self.config.getint('bootstrap', 'batch_size', fallback=1000)
+
+    def get_bootstrap_workers(self) -> int:
+        workers: int = self.config.getint('bootstrap', 'workers', fallback=1)
+        return workers if workers > 0 else os.cpu_count()
+
+    def get_bootstrap_max_in_flight(self) -> int:
+        return self.config.getint('bootstrap', 'max_in_flight', fallback=2)
+
+    def get_bootstrap_checkpoint_path(self) -> str:
+        return self.config.get('bootstrap', 'checkpoint', fallback='data/database/bootstrap.checkpoint.json')
+
+    def get_bootstrap_storage(self) -> str:
+        return self.config.get('bootstrap', 'storage', fallback='rows')
+
+    def get_project_backup_chunk_size(self) -> int:
+        return self.config.getint('project', 'backup_chunk_size', fallback=4194304)
+
+    def get_project_backup_workers(self) -> int:
+        workers: int = self.config.getint('project', 'backup_workers', fallback=0)
+        return workers if workers > 0 else os.cpu_count()
+
+    def get_project_backup_compression_level(self) -> int:
+        return self.config.getint('project', 'backup_compression_level', fallback=6)
+
     @staticmethod
     def reset_configuration_file() -> None:
         """
@@ -0,0 +1,214 @@
+import atexit
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+
+from modules.configuration import Configuration
+from modules.partitionManager import PartitionManager
+
+
+class ConnectionManager:
+    """
+    Shares the connections to one database file between the query managers, the ORM and the bulk writers.
+    The connections are opened on the first use with the same PRAGMAs, the connections of the bulk writers
+    are pooled and all connections are closed when the program exits.
+    The shared connection of the query managers reads the partitions through a temporary view, the ORM
+    has its own connection which sees the tables as they are.
+    In WAL mode readers never wait for a writer and a writer only waits for other writers, so an analysis
+    can read a consistent snapshot while a bootstrap writes.
+    """
+
+    PRAGMAS: dict[str, str | int] = {
+        "cache_size": -65536,
+        "temp_store": "MEMORY",
+        # new databases release the pages of dropped partitions with PRAGMA incremental_vacuum
+        "auto_vacuum": "INCREMENTAL",
+    }
+    # the first delay of a retried write transaction in seconds, it doubles with every attempt
+    retry_delay: float = 0.05
+
+    managers: dict[str, "ConnectionManager"] = {}
+
+    def __init__(self, configuration: Configuration) -> None:
+        self.configuration: Configuration = configuration
+        self.database_file_path: str = configuration.get_database_file_path()
+        self.journal_mode: str = configuration.get_journal_mode()
+        self.lock_retries: int = configuration.get_lock_retries()
+
+        self.partitions: PartitionManager = PartitionManager(configuration)
+
+        self._connection: sqlite3.Connection | None = None
+        # partition version and schema version of the database when the partition view of the shared
+        # connection was created
+        self._view_version: int | None = None
+        self._view_schema_version: int | None = None
+        self._orm_connection: sqlite3.Connection | None = None
+        self._engine: Engine | None = None
+        self.idle_connections: list[sqlite3.Connection] = []
+
+    @classmethod
+    def get(cls, configuration: Configuration) -> "ConnectionManager":
+        """
+        The manager of the database file of the configuration, it is created on the first call.
+        :param configuration: project configuration
+        :return: connection manager
+        """
+        database_file_path: str = configuration.get_database_file_path()
+        if database_file_path not in cls.managers:
+            cls.managers[database_file_path] = cls(configuration)
+        return cls.managers[database_file_path]
+
+    @classmethod
+    def close_all(cls) -> None:
+        for manager in cls.managers.values():
+            manager.close()
+
+    def connect(self, isolation_level: str | None = "", check_same_thread: bool = True) -> sqlite3.Connection:
+        connection: sqlite3.Connection = sqlite3.connect(
+            self.database_file_path, isolation_level=isolation_level,
+            timeout=self.configuration.get_busy_timeout() / 1000, check_same_thread=check_same_thread
+        )
+        for pragma, value in self.PRAGMAS.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+        # reads of the mapped part of the file do not copy the pages into the cache of the connection
+        connection.execute(f"PRAGMA mmap_size = {self.configuration.get_mmap_size()}")
+        if self.is_wal:
+            # the journal mode is stored in the file, it is only changed by the first connection
+            if connection.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+                self.retry(connection.execute, "PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
+    @property
+    def is_wal(self) -> bool:
+        return self.journal_mode == "wal"
+
+    def retry(self, function: Callable, *args):
+        """
+        Call a function which starts or commits a write transaction again while the database is locked.
+        The busy timeout does not cover every lock, e.g. a WAL reader which has to become a writer
+        after the database changed fails at once.
+        :return: result of the function
+        """
+        for attempt in range(self.lock_retries + 1):
+            try:
+                return function(*args)
+            except sqlite3.OperationalError as error:
+                if attempt == self.lock_retries or ("locked" not in str(error) and "busy" not in str(error)):
+                    raise
+                delay: float = self.retry_delay * 2 ** attempt
+                print(f"[WARNING] The database is locked, retrying in {delay:.2f}s...")
+                time.sleep(delay * random.uniform(1, 1.5))
+
+    def begin_write(self, connection: sqlite3.Connection) -> None:
+        """
+        Start a write transaction which takes the write lock at once, so it can not fail halfway
+        because another connection wrote in the meantime.
+        """
+        if not connection.in_transaction:
+            self.retry(connection.execute, "BEGIN IMMEDIATE")
+
+    @contextmanager
+    def snapshot(self) -> Iterator[sqlite3.Connection]:
+        """
+        All reads of the shared connection in the context see the same state of the database.
+        In WAL mode the writers continue meanwhile, otherwise they wait until the snapshot ends.
+        """
+        connection: sqlite3.Connection = self.connection
+        if connection.in_transaction:
+            yield connection
+            return
+        self.refresh_view()
+        connection.execute("BEGIN")
+        try:
+            # the snapshot is taken by the first read
+            connection.execute("SELECT COUNT(*) FROM main.sqlite_master").fetchone()
+            yield connection
+        finally:
+            if connection.in_transaction:
+                connection.commit()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        The shared connection of the query managers, its partition view is recreated when partitions
+        of this process were created or dropped.
+        """
+        if self._connection is None:
+            self._connection = self.connect()
+            self._view_version = None
+        if self._view_version != self.partitions.version:
+            self.create_view()
+        return self._connection
+
+    def refresh_view(self) -> None:
+        """
+        Recreate the partition view of the shared connection if the schema changed, e.g. because another
+        process created partitions. It is checked once at the start of every snapshot.
+        """
+        connection: sqlite3.Connection = self.connection
+        if connection.execute("PRAGMA main.schema_version").fetchone()[0] != self._view_schema_version:
+            self.create_view()
+
+    def create_view(self) -> None:
+        self.partitions.create_view(self._connection)
+        self._view_version = self.partitions.version
+        self._view_schema_version = self._connection.execute("PRAGMA main.schema_version").fetchone()[0]
+
+    @property
+    def orm_connection(self) -> sqlite3.Connection:
+        if self._orm_connection is None:
+            self._orm_connection = self.connect()
+        return self._orm_connection
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            # all sessions share one connection, the DDL of the ORM must not see the partition view
+            self._engine = create_engine(
+                self.configuration.get_database_path(),
+                creator=lambda: self.orm_connection,
+                poolclass=StaticPool,
+                echo=self.configuration.get_database_logging()
+            )
+        return self._engine
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        A connection without implicit transactions for a bulk writer, an idle connection is reused.
+        The connection may be used by another thread, e.g. the writer thread of a parallel import.
+        :return: connection which has to be given back with release
+        """
+        if self.idle_connections:
+            return self.idle_connections.pop()
+        return self.connect(isolation_level=None, check_same_thread=False)
+
+    def release(self, connection: sqlite3.Connection) -> None:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        self.idle_connections.append(connection)
+
+    def close(self) -> None:
+        """
+        Close all connections, e.g. before the database file is replaced. They are reopened on the next use.
+        """
+        if self._engine is not None:
+            self._engine.dispose()
+            self._engine = None
+        for connection in [self._connection, self._orm_connection]:
+            if connection is not None:
+                connection.close()
+        self._connection = None
+        self._orm_connection = None
+        for connection in self.idle_connections:
+            connection.close()
+        self.idle_connections.clear()
+
+
+atexit.register(ConnectionManager.close_all)
@@ -0,0 +1,77 @@
+import datetime as dt
+
+import numpy as np
+
+# day number 0
+EPOCH: dt.date = dt.date(1970, 1, 1)
+
+
+def to_date(value) -> dt.date | None:
+    """
+    Convert an ISO date string, a day number since 1970-01-01 or a date to a date.
+    """
+    if value is None:
+        return None
+    if isinstance(value, dt.datetime):
+        return value.date()
+    if isinstance(value, dt.date):
+        return value
+    if isinstance(value, (int, np.integer)):
+        return EPOCH + dt.timedelta(days=int(value))
+    return dt.date.fromisoformat(str(value)[:10])
+
+
+def to_days(dates) -> np.ndarray:
+    """
+    Convert ISO date strings, dates or day numbers to day numbers since 1970-01-01, without parsing row by row.
+    """
+    dates = np.asarray(dates)
+    if dates.dtype.kind in "iu":
+        return dates.astype(np.int64)
+    if dates.dtype.kind == "O" and len(dates) > 0 and isinstance(dates.flat[0], (int, np.integer)):
+        return dates.astype(np.int64)
+    # numpy parses ISO dates itself, a timestamp is cut to its date
+    return dates.astype("datetime64[D]").astype(np.int64)
+
+
+def to_iso(dates) -> np.ndarray:
+    """
+    Convert day numbers, dates or ISO date strings to ISO date strings.
+    """
+    dates = np.asarray(dates)
+    if dates.dtype.kind in "US":
+        return dates.astype(str)
+    return to_days(dates).astype("datetime64[D]").astype(str)
+
+
+class DateCodec:
+    """
+    Encoding of the dates which are written to the database, see [database] date_encoding.
+    iso: ISO date strings, which is how SQLAlchemy stores a Date in SQLite.
+    days: day numbers since 1970-01-01, an integer takes 1 to 3 bytes instead of 10 and is compared without
+    parsing. The readers accept both encodings, so only the rows which are written change.
+    """
+
+    encodings: tuple[str, ...] = ("iso", "days")
+
+    def __init__(self, encoding: str = "iso") -> None:
+        if encoding not in self.encodings:
+            raise ValueError(f"unknown date encoding {encoding}, use one of {', '.join(self.encodings)}")
+        self.encoding: str = encoding
+
+    @property
+    def dtype(self) -> type:
+        return np.int64 if self.encoding == "days" else str
+
+    def encode(self, dates) -> np.ndarray:
+        """
+        Encode a column of dates, day numbers or ISO strings.
+        """
+        if self.encoding == "days":
+            return to_days(dates)
+        return to_iso(dates)
+
+    def encode_value(self, value) -> int | str | None:
+        if value is None:
+            return None
+        return self.encode([value])[0].item()
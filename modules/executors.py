@@ -0,0 +1,17 @@
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Iterable, Iterator
+
+
+def bounded_map(executor: Executor, function, arguments: Iterable[tuple], max_in_flight: int) -> Iterator:
+    """
+    Like Executor.map, but submits at most max_in_flight tasks ahead of the consumer.
+    :return: the results in the order of the arguments
+    """
+    pending: deque[Future] = deque()
+    for argument in arguments:
+        pending.append(executor.submit(function, *argument))
+        if len(pending) >= max(max_in_flight, 1):
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
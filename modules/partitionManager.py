@@ -0,0 +1,145 @@
+import re
+import sqlite3
+
+from modules.configuration import Configuration
+
+
+class PartitionManager:
+    """
+    Optional storage layout in which the rows of every range of partition_size groups are written to
+    their own table collections_p<n> instead of the collections table. Deleting a range of samples drops
+    their tables instead of deleting their rows.
+    The partitions are listed in the partitions table. Reading connections get a temporary view named
+    collections, which shadows the collections table and unions it with all partitions, so the named
+    queries read every partition without being changed.
+    """
+
+    table_name: str = "collections"
+    registry: str = "partitions"
+    # SQLite allows at most 500 terms in a compound select
+    max_compound_terms: int = 400
+
+    def __init__(self, configuration: Configuration) -> None:
+        self.partition_size: int = configuration.get_partition_size()
+        # increased when partitions of this process were created or dropped, see changed
+        self.version: int = 0
+
+    def changed(self) -> None:
+        """
+        Partitions were created or dropped and committed, the views are recreated on their next use.
+        """
+        self.version += 1
+
+    def get_table_name(self, group_id: int) -> str:
+        """
+        The table to which the rows of a new group are written.
+        """
+        if self.partition_size <= 0:
+            return self.table_name
+        return f"{self.table_name}_p{int(group_id) // self.partition_size}"
+
+    def get_group_range(self, table_name: str) -> tuple[int, int]:
+        partition: int = int(table_name.rsplit("_p", 1)[1])
+        return partition * self.partition_size, (partition + 1) * self.partition_size - 1
+
+    @staticmethod
+    def table_exists(connection: sqlite3.Connection, table_name: str) -> bool:
+        return connection.execute(
+            "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+        ).fetchone() is not None
+
+    def get_partitions(self, connection: sqlite3.Connection) -> list[tuple[str, int, int]]:
+        """
+        :return: (table name, min group id, max group id) of every partition
+        """
+        if not self.table_exists(connection, self.registry):
+            return []
+        return connection.execute(
+            f"SELECT table_name, min_group_id, max_group_id FROM main.{self.registry} ORDER BY min_group_id"
+        ).fetchall()
+
+    def ensure_partition(self, connection: sqlite3.Connection, group_id: int) -> str:
+        """
+        Create the partition of the group if it does not exist.
+        :return: name of the table to which the rows of the group are written
+        """
+        table_name: str = self.get_table_name(group_id)
+        if table_name == self.table_name or self.table_exists(connection, table_name):
+            return table_name
+
+        create_table: str = connection.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (self.table_name,)
+        ).fetchone()[0]
+        connection.execute(re.sub(rf"^CREATE TABLE \"?{self.table_name}\"?", f"CREATE TABLE main.{table_name}", create_table))
+        self.create_indexes(connection, table_name)
+
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS main.{self.registry} "
+            f"(table_name VARCHAR(255) PRIMARY KEY, min_group_id INTEGER, max_group_id INTEGER)"
+        )
+        connection.execute(
+            f"INSERT INTO main.{self.registry} (table_name, min_group_id, max_group_id) VALUES (?, ?, ?)",
+            (table_name, *self.get_group_range(table_name))
+        )
+        return table_name
+
+    def create_indexes(self, connection: sqlite3.Connection, table_name: str) -> None:
+        """
+        Copy the missing indexes of the collections table to a partition.
+        """
+        for index_name, sql in connection.execute(
+                "SELECT name, sql FROM main.sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (self.table_name,)).fetchall():
+            partition_index_name: str = f"{index_name}_{table_name.rsplit('_', 1)[1]}"
+            connection.execute(re.sub(
+                rf"^CREATE (UNIQUE )?INDEX \"?{index_name}\"? ON \"?{self.table_name}\"?",
+                rf"CREATE \1INDEX IF NOT EXISTS main.{partition_index_name} ON {table_name}",
+                sql
+            ))
+
+    def create_view(self, connection: sqlite3.Connection) -> None:
+        """
+        (Re)create the temporary view collections of the connection, it is only created if partitions exist.
+        """
+        connection.execute(f"DROP VIEW IF EXISTS temp.{self.table_name}")
+        partitions: list[tuple[str, int, int]] = self.get_partitions(connection)
+        if not partitions:
+            return
+
+        selects: list[str] = [f"SELECT * FROM main.{table_name}" for table_name in [self.table_name] + [
+            partition[0] for partition in partitions
+        ]]
+        compounds: list[str] = [
+            " UNION ALL ".join(selects[start:start + self.max_compound_terms])
+            for start in range(0, len(selects), self.max_compound_terms)
+        ]
+        union: str = compounds[0] if len(compounds) == 1 else " UNION ALL ".join(
+            f"SELECT * FROM ({compound})" for compound in compounds
+        )
+        connection.execute(f"CREATE TEMP VIEW {self.table_name} AS {union}")
+
+    def delete_groups(self, connection: sqlite3.Connection, min_group_id: int, max_group_id: int) -> int:
+        """
+        Delete the rows of a range of groups. Partitions which only hold groups of the range are dropped,
+        the rows of the other groups are deleted.
+        :return: number of dropped partitions
+        """
+        dropped: int = 0
+        for table_name, partition_min_group_id, partition_max_group_id in self.get_partitions(connection):
+            if min_group_id <= partition_min_group_id and partition_max_group_id <= max_group_id:
+                connection.execute(f"DROP TABLE main.{table_name}")
+                connection.execute(f"DELETE FROM main.{self.registry} WHERE table_name = ?", (table_name,))
+                dropped += 1
+            elif partition_min_group_id <= max_group_id and min_group_id <= partition_max_group_id:
+                connection.execute(
+                    f"DELETE FROM main.{table_name} WHERE group_id >= ? AND group_id <= ?", (min_group_id, max_group_id)
+                )
+        connection.execute(
+            f"DELETE FROM main.{self.table_name} WHERE group_id >= ? AND group_id <= ?", (min_group_id, max_group_id)
+        )
+        return dropped
+
+    def drop_all(self, connection: sqlite3.Connection) -> None:
+        for table_name, _, _ in self.get_partitions(connection):
+            connection.execute(f"DROP TABLE main.{table_name}")
+        connection.execute(f"DROP TABLE IF EXISTS main.{self.registry}")
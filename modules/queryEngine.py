@@ -0,0 +1,131 @@
+import datetime
+import os
+
+from modules.configuration import Configuration
+from modules.connectionManager import ConnectionManager
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+class DuckDBEngine:
+    """
+    Runs named queries on DuckDB, which scans and aggregates vectorized on all cores.
+    DuckDB reads the SQLite file read-only through its sqlite extension, the partitions are read as one
+    collections table. The extension is only loaded, it has to be installed once, see load_extension.
+    """
+
+    name: str = "duckdb"
+
+    def __init__(self, configuration: Configuration) -> None:
+        self.configuration: Configuration = configuration
+        self.queries: list[str] = configuration.get_query_engine_queries()
+        self.threads: int = configuration.get_query_engine_threads()
+
+        self._connection = None
+        # modification stamp of the database file when the views were created
+        self.source_version: tuple | None = None
+
+    @staticmethod
+    def is_available() -> bool:
+        return duckdb is not None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = duckdb.connect(":memory:")
+            if self.threads > 0:
+                self._connection.execute(f"SET threads = {self.threads}")
+            # the extension is never downloaded on the fly
+            self._connection.execute("SET autoinstall_known_extensions = false")
+            self._connection.execute("LOAD sqlite")
+            self._connection.execute(
+                f"ATTACH '{self.configuration.get_database_file_path()}' AS source (TYPE SQLITE, READ_ONLY)"
+            )
+            self.source_version = None
+
+        source_version: tuple = self.get_source_version()
+        if source_version != self.source_version:
+            self.create_views()
+            self.source_version = source_version
+        return self._connection
+
+    def load_extension(self) -> bool:
+        """
+        Attach the database file with the sqlite extension. The extension is not installed here, because
+        installing downloads it.
+        :return: false if the extension is not installed or the database can not be attached
+        """
+        try:
+            return self.connection is not None
+        except duckdb.Error as error:
+            print(f"[WARNING] duckdb can not read the database ({error}), the queries run on sqlite.")
+            print("[TIPP] The sqlite extension of duckdb is installed once with: "
+                  "python -c \"import duckdb; duckdb.execute('INSTALL sqlite')\"")
+            self.close()
+            return False
+
+    def get_source_version(self) -> tuple:
+        database_file_path: str = self.configuration.get_database_file_path()
+        return tuple(
+            (os.stat(path).st_mtime_ns, os.stat(path).st_size)
+            for path in (database_file_path, f"{database_file_path}-wal") if os.path.exists(path)
+        )
+
+    def get_source_tables(self) -> tuple[list[str], list[str]]:
+        """
+        :return: tables of the database and the partitions of the collections table
+        """
+        connection_manager: ConnectionManager = ConnectionManager.get(self.configuration)
+        partitions: list[str] = [
+            partition[0] for partition in connection_manager.partitions.get_partitions(connection_manager.connection)
+        ]
+        tables: list[str] = [
+            row[0] for row in connection_manager.connection.execute(
+                "SELECT name FROM main.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            ).fetchall() if row[0] not in partitions and row[0] != connection_manager.partitions.registry
+        ]
+        return tables, partitions
+
+    def create_views(self) -> None:
+        tables, partitions = self.get_source_tables()
+        for table_name in tables:
+            select: str = " UNION ALL ".join(
+                f"SELECT * FROM source.{name}" for name in [table_name] + (partitions if table_name == "collections" else [])
+            )
+            self._connection.execute(f"CREATE OR REPLACE VIEW {table_name} AS {select}")
+
+    def run(self, query: str, args: tuple) -> list:
+        rows: list[tuple] = self.connection.execute(query, list(args)).fetchall()
+        # the results look like the ones of sqlite, which returns the dates as ISO strings
+        return [
+            tuple(value.isoformat() if isinstance(value, datetime.date) else value for value in row) for row in rows
+        ]
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+            self.source_version = None
+
+
+engines: dict[str, DuckDBEngine | None] = {}
+
+
+def get_query_engine(configuration: Configuration) -> DuckDBEngine | None:
+    """
+    The engine of the configuration, None if the named queries run on sqlite.
+    """
+    if configuration.get_query_engine() != DuckDBEngine.name:
+        return None
+    database_file_path: str = configuration.get_database_file_path()
+    if database_file_path not in engines:
+        if DuckDBEngine.is_available():
+            engine: DuckDBEngine = DuckDBEngine(configuration)
+            engines[database_file_path] = engine if engine.load_extension() else None
+        else:
+            print("[WARNING] duckdb is not installed (pip install duckdb), the queries run on sqlite.")
+            engines[database_file_path] = None
+    return engines[database_file_path]
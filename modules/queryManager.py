@@ -1,26 +1,99 @@
+import re
 import sqlite3
+import string
 import configparser
+from typing import Iterable
 
 from modules.configuration import Configuration
+from modules.connectionManager import ConnectionManager
+from modules.queryEngine import DuckDBEngine, get_query_engine
+from adapter.database.storage_backend import StorageBackend, get_storage_backend
+from adapter.database.group_stats import increase_versions
 
 
 class QueryManager:
     def __init__(self, configuration: Configuration, connection=None) -> None:
         self.configuration: Configuration = configuration
-        if connection is None:
-            self.connection: sqlite3.Connection = sqlite3.connect(self.configuration.get_database_file_path())
-        else:
-            self.connection: sqlite3.Connection = connection
+        # without an own connection the shared connection of the connection manager is used
+        self._connection: sqlite3.Connection | None = connection
 
         self.query_parser: configparser.ConfigParser = self.configuration.get_query_parser()
 
         self.space_name: str = "queries"
 
+        # tables of the compact sample storages
+        self.sample_tables: list[str] = ["sample_weights", "sample_aggregates"]
+        # statistics of the groups, see refresh_group_stats
+        self.stats_table: str = "group_stats"
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is not None:
+            return self._connection
+        return ConnectionManager.get(self.configuration).connection
+
+    @property
+    def storage(self) -> StorageBackend:
+        return get_storage_backend(self.configuration)
+
+    @property
+    def engine(self) -> DuckDBEngine | None:
+        return get_query_engine(self.configuration)
+
+    def get_query(self, query_name: str, **kwargs) -> str:
+        return self.query_parser[self.space_name][query_name].format(**kwargs)
+
     def get_result(self, query_name: str, *args, **kwargs) -> list:
+        if query_name in self.storage.native_queries:
+            return self.storage.run_query(self, query_name, *args, **kwargs)
+        query: str = self.get_query(query_name, **kwargs)
+        if self.storage.writes_collections and re.search(r"\bcollections\b", query, re.IGNORECASE):
+            # the rows are not in the database, the query would silently return nothing
+            raise ValueError(
+                f"the query {query_name} reads the collections table, but the rows are stored by the "
+                f"{self.storage.name} storage, which only answers the queries {', '.join(self.storage.native_queries)}"
+            )
+        if self.engine is not None and query_name in self.engine.queries:
+            return self.engine.run(query, args)
         cursor = self.connection.cursor()
-        cursor.execute(self.query_parser[self.space_name][query_name].format(**kwargs), args)
+        cursor.execute(query, args)
         return cursor.fetchall()
 
+    def set_bootstrap_users(self, user_ids: Iterable[int], group_id: int) -> None:
+        """
+        Fill the temporary table bootstrap_users, which is used by the join_users_index_to_dataset query.
+        :param user_ids: ids of the users which should be joined
+        :param group_id: group whose rows are joined, the same users are also in the stored samples
+        """
+        # the temporary table does not end a snapshot, see ConnectionManager.snapshot
+        in_snapshot: bool = self.connection.in_transaction
+        self.connection.execute("DROP TABLE IF EXISTS temp.bootstrap_users")
+        self.connection.execute("CREATE TEMP TABLE bootstrap_users (user_id INTEGER PRIMARY KEY, group_id INTEGER)")
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO temp.bootstrap_users (user_id, group_id) VALUES (?, ?)",
+            ((int(user_id), int(group_id)) for user_id in user_ids)
+        )
+        if not in_snapshot:
+            self.connection.commit()
+
+    def get_query_plan(self, query_name: str) -> list[str]:
+        """
+        The query plan of a named query, the parameters of the query are bound to placeholder values.
+        """
+        if query_name in self.storage.native_queries:
+            return [f"native query of the {self.storage.name} storage"]
+        query: str = self.query_parser[self.space_name][query_name]
+        fields: dict[str, int] = {field: 0 for _, field, _, _ in string.Formatter().parse(query) if field}
+        query = query.format(**fields)
+
+        self.set_bootstrap_users([], 0)
+        cursor = self.connection.cursor()
+        cursor.execute(f"EXPLAIN QUERY PLAN {query}", [None] * query.count("?"))
+        return [row[-1] for row in cursor.fetchall()]
+
+    def get_query_names(self) -> list[str]:
+        return list(self.query_parser[self.space_name].keys())
+
     def get_samples(self) -> list[tuple]:
         cursor = self.connection.cursor()
         cursor.execute("SELECT * FROM Groups")
@@ -31,19 +104,159 @@ class QueryManager:
         cursor.execute(f"SELECT COUNT(*) FROM Collections WHERE group_id = {sample_id}")
         return cursor.fetchone()[0]
 
+    def get_nr_of_weights_per_sample(self, sample_id) -> int:
+        return self.count_sample_rows("sample_weights", sample_id)
+
+    def get_nr_of_aggregates_per_sample(self, sample_id) -> int:
+        return self.count_sample_rows("sample_aggregates", sample_id)
+
+    def count_sample_rows(self, table_name: str, sample_id) -> int:
+        if not self.table_exists(table_name):
+            return 0
+        cursor = self.connection.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE group_id = {sample_id}")
+        return cursor.fetchone()[0]
+
+    def get_group_stats(self) -> list[tuple]:
+        """
+        All groups with their statistics, groups without statistics have no rows.
+        Databases without the group_stats table are counted group by group, without users and dates.
+        :return: (id, name, storage, nr_of_rows, nr_of_users, min_date, max_date, value_sum) per group
+        """
+        if not self.table_exists(self.stats_table):
+            return [self.count_group_stats(sample[0], sample[1]) for sample in self.get_samples()]
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "SELECT g.id, g.name, gs.storage, COALESCE(gs.nr_of_rows, 0), gs.nr_of_users, "
+            "gs.min_date, gs.max_date, gs.value_sum "
+            "FROM groups g LEFT JOIN group_stats gs ON gs.group_id = g.id ORDER BY g.id"
+        )
+        return cursor.fetchall()
+
+    def count_group_stats(self, group_id: int, name: str) -> tuple:
+        if self.storage.writes_collections:
+            stats: list[tuple] = self.storage.get_group_stats(group_id)
+            if stats:
+                return group_id, name, *stats[0][1:]
+        nr_of_weights: int = self.get_nr_of_weights_per_sample(group_id)
+        if nr_of_weights > 0:
+            return group_id, name, "weighted", nr_of_weights, None, None, None, None
+        nr_of_aggregates: int = self.get_nr_of_aggregates_per_sample(group_id)
+        if nr_of_aggregates > 0:
+            return group_id, name, "aggregate", nr_of_aggregates, None, None, None, None
+        return group_id, name, "rows", self.get_nr_of_collections_per_sample(group_id), None, None, None, None
+
+    def count_users(self) -> None:
+        """
+        Count the users of the groups whose rows were appended or deleted since their users were counted,
+        see GroupStatsDelta.merge.
+        """
+        if not self.table_exists(self.stats_table):
+            return
+        stale: list[tuple] = self.connection.execute(
+            f"SELECT group_id, storage FROM {self.stats_table} "
+            f"WHERE nr_of_users IS NULL AND nr_of_rows > 0 AND storage IN ('rows', ?)", (self.storage.name,)
+        ).fetchall()
+        if not stale:
+            return
+
+        ConnectionManager.get(self.configuration).begin_write(self.connection)
+        for group_id, storage in stale:
+            if storage == "rows":
+                nr_of_users: int = self.connection.execute(
+                    "SELECT COUNT(DISTINCT user_id) FROM collections WHERE group_id = ?", (group_id,)
+                ).fetchone()[0]
+            else:
+                nr_of_users: int = self.storage.get_group_stats(group_id)[0][3]
+            self.connection.execute(
+                f"UPDATE {self.stats_table} SET nr_of_users = ? WHERE group_id = ?", (nr_of_users, group_id)
+            )
+        self.connection.commit()
+
+    def refresh_group_stats(self, group_id: int | None = None) -> None:
+        """
+        Count the statistics of one or all groups from their rows, e.g. after an import with the ORM
+        or for a database which was created before the group_stats table existed.
+        :param group_id: group which is counted (default: all groups)
+        """
+        if not self.table_exists(self.stats_table):
+            return
+
+        where: str = f"WHERE group_id = {int(group_id)}" if group_id is not None else ""
+        ConnectionManager.get(self.configuration).begin_write(self.connection)
+        self.connection.execute(f"DELETE FROM {self.stats_table} {where}")
+        if not self.storage.writes_collections:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO {self.stats_table} "
+                f"SELECT group_id, 'rows', COUNT(*), COUNT(DISTINCT user_id), MIN(date), MAX(date), SUM(value) "
+                f"FROM collections {where} GROUP BY group_id"
+            )
+        if self.table_exists("sample_weights"):
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO {self.stats_table} "
+                f"SELECT group_id, 'weighted', COUNT(*), COUNT(DISTINCT user_id), NULL, NULL, NULL "
+                f"FROM sample_weights {where} GROUP BY group_id"
+            )
+        if self.table_exists("sample_aggregates"):
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO {self.stats_table} "
+                f"SELECT group_id, 'aggregate', COUNT(*), NULL, MIN(date), MAX(date), SUM(value) "
+                f"FROM sample_aggregates {where} GROUP BY group_id"
+            )
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO {self.stats_table} VALUES (?, ?, ?, ?, ?, ?, ?)",
+            self.storage.get_group_stats(group_id)
+        )
+        # cached matrices of the counted groups are built again
+        increase_versions(self.connection, [
+            row[0] for row in self.connection.execute(f"SELECT DISTINCT group_id FROM {self.stats_table} {where}")
+        ])
+        self.connection.commit()
+
+    def get_group_version(self, group_id: int) -> list:
+        """
+        A stamp of the data of a group, it changes when rows of the group are inserted, deleted or changed.
+        """
+        return self.storage.get_version(group_id)
+
+    def table_exists(self, table_name: str) -> bool:
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+        return cursor.fetchone() is not None
+
     def delete_samples(self, min_group_id: int, max_group_id: int) -> None:
-        self.connection.execute(
-            f"DELETE FROM Collections WHERE group_id >= {min_group_id} AND group_id <= {max_group_id}"
+        ConnectionManager.get(self.configuration).begin_write(self.connection)
+        # partitions which only hold samples of the range are dropped
+        dropped: int = ConnectionManager.get(self.configuration).partitions.delete_groups(
+            self.connection, min_group_id, max_group_id
         )
+        self.storage.delete_groups(min_group_id, max_group_id)
+        # the versions of the deleted groups are kept, so a new group with the same id has a new version
+        increase_versions(self.connection, [
+            row[0] for row in self.connection.execute(
+                f"SELECT id FROM Groups WHERE id >= {min_group_id} AND id <= {max_group_id}")
+        ])
+        for table_name in [*self.sample_tables, self.stats_table, "import_digests"]:
+            if self.table_exists(table_name):
+                self.connection.execute(
+                    f"DELETE FROM {table_name} WHERE group_id >= {min_group_id} AND group_id <= {max_group_id}"
+                )
         self.connection.execute(
             f"DELETE FROM Groups WHERE id >= {min_group_id} AND id <= {max_group_id}"
         )
         self.connection.commit()
+        if dropped > 0:
+            ConnectionManager.get(self.configuration).partitions.changed()
+            # give the pages of the dropped partitions back to the file system,
+            # executescript steps the pragma until all free pages are released
+            self.connection.executescript("PRAGMA incremental_vacuum;")
 
     def delete_sample(self, sample_id: int) -> None:
-        self.connection.execute(f"DELETE FROM Collections WHERE group_id = {sample_id}")
-        self.connection.execute(f"DELETE FROM Groups WHERE id = {sample_id}")
-        self.connection.commit()
+        self.delete_samples(sample_id, sample_id)
 
     def close(self) -> None:
-        self.connection.close()
+        # the shared connection is closed by the connection manager
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
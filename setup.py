@@ -1,5 +1,3 @@
-from sqlalchemy.orm import sessionmaker
-
 from commands.setup import *
 from commands.bootstrap import Bootstrapping
 
@@ -11,8 +9,8 @@ class InitializeProject:
 
         self.close_commandline: bool = False
 
-        self.engine: Engine = create_engine(self.configuration.get_database_path(), echo=True)
-        self.session = sessionmaker(bind=self.engine)()
+        # the connections are opened by the commands on the first use
+        self.connection_manager: ConnectionManager = ConnectionManager.get(self.configuration)
 
         # add commands to the command manager
         self.command_manager: CommandManager = CommandManager()
@@ -53,10 +51,11 @@ class InitializeProject:
             )
 
     def migrate_database(self):
-        self.Base.metadata.create_all(self.engine)
+        self.Base.metadata.create_all(self.connection_manager.engine)
 
     def exit_commandline(self):
         print("Exiting...")
+        ConnectionManager.close_all()
         self.close_commandline = True
 
     @staticmethod
@@ -0,0 +1,62 @@
+import configparser
+import os
+import tempfile
+import unittest
+
+from model.model import Base
+from modules.configuration import Configuration
+from modules.connectionManager import ConnectionManager
+from modules.queryManager import QueryManager
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Every test gets an empty database in a temporary directory, the configuration is the template
+    with the paths of the directory and the settings of the test case.
+    """
+
+    # section -> option -> value, e.g. {"storage": {"backend": "columnar"}}
+    settings: dict[str, dict[str, str]] = {}
+
+    def setUp(self) -> None:
+        self.directory: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.configuration: Configuration = self.create_database(self.get_settings())
+        self.query_manager: QueryManager = QueryManager(self.configuration)
+
+    def tearDown(self) -> None:
+        ConnectionManager.close_all()
+        self.directory.cleanup()
+
+    def get_settings(self) -> dict[str, dict[str, str]]:
+        return self.settings
+
+    def create_database(self, settings: dict[str, dict[str, str]], name: str = "configuration.ini") -> Configuration:
+        configuration: Configuration = self.write_configuration(settings, name)
+        Base.metadata.create_all(ConnectionManager.get(configuration).engine)
+        return configuration
+
+    def get_path(self, name: str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    def write_configuration(self, settings: dict[str, dict[str, str]], name: str = "configuration.ini") -> Configuration:
+        parser: configparser.ConfigParser = configparser.ConfigParser()
+        parser.read(Configuration.get_config_template_path())
+        parser["database"]["running"] = f"sqlite:///{self.get_path('db.sqlite')}"
+        parser["database"]["backup"] = self.get_path("db.sqlite.bak")
+        parser["queries"]["path"] = os.path.abspath(Configuration.get_query_template_path())
+        parser["insert"]["csv"] = self.get_path("insert.csv")
+        parser["bootstrap"]["checkpoint"] = self.get_path("bootstrap.checkpoint.json")
+        parser["storage"]["path"] = self.get_path("columns")
+        parser["cache"]["path"] = self.get_path("cache")
+        for section, options in settings.items():
+            for option, value in options.items():
+                parser[section][option] = value
+
+        config_path: str = self.get_path(name)
+        os.makedirs(os.path.dirname(config_path), exist_ok=True)
+        with open(config_path, "w") as config_file:
+            parser.write(config_file)
+        return Configuration(config_path)
+
+    def fetch(self, query: str, *parameters) -> list[tuple]:
+        return self.query_manager.connection.execute(query, parameters).fetchall()
@@ -0,0 +1,74 @@
+import sqlite3
+import unittest
+from unittest import mock
+
+from adapter.database.backup import DatabaseBackup
+from adapter.database.bulk_writer import BulkWriter
+from tests.database_test_case import DatabaseTestCase
+
+
+class BackupTest(DatabaseTestCase):
+    """
+    A full backup, an incremental backup of the changed groups and the restore of the backup.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        with BulkWriter(self.configuration) as writer:
+            for group_id in [1, 2, 3]:
+                writer.ensure_group(group_id, f"group {group_id}")
+                writer.insert_collections(group_id, [1, 2], ["2022-01-01", "2022-01-02"], [group_id, group_id])
+
+    def get_rows(self, connection: sqlite3.Connection) -> list[tuple]:
+        return connection.execute(
+            "SELECT group_id, user_id, date, value FROM collections ORDER BY group_id, user_id, date, value").fetchall()
+
+    def get_backup_rows(self) -> list[tuple]:
+        connection: sqlite3.Connection = sqlite3.connect(self.configuration.get_backup_database_file_path())
+        try:
+            return self.get_rows(connection)
+        finally:
+            connection.close()
+
+    def change_groups(self) -> None:
+        with BulkWriter(self.configuration) as writer:
+            # the same statistics, only the write counter of the group changes
+            writer.delete_collections(1, [1], ["2022-01-01"])
+            writer.insert_collections(1, [1], ["2022-01-02"], [1])
+            writer.ensure_group(4, "group 4")
+            writer.insert_collections(4, [3], ["2022-01-03"], [4])
+        self.query_manager.delete_sample(3)
+
+    def test_incremental_backup_and_restore(self) -> None:
+        DatabaseBackup(self.configuration).backup()
+        backed_up: list[tuple] = self.get_rows(self.query_manager.connection)
+        self.assertEqual(self.get_backup_rows(), backed_up)
+
+        self.change_groups()
+        changed: list[tuple] = self.get_rows(self.query_manager.connection)
+        DatabaseBackup(self.configuration).backup(incremental=True)
+        self.assertEqual(self.get_backup_rows(), changed)
+
+        with BulkWriter(self.configuration) as writer:
+            writer.insert_collections(2, [5], ["2022-01-05"], [5])
+        DatabaseBackup(self.configuration).restore()
+        self.assertEqual(self.get_rows(self.query_manager.connection), changed)
+        self.assertEqual(self.fetch("SELECT group_id, nr_of_rows, value_sum FROM group_stats ORDER BY group_id"),
+                         [(1, 2, 2), (2, 2, 4), (4, 1, 4)])
+
+    def test_interrupted_incremental_backup_keeps_the_last_backup(self) -> None:
+        DatabaseBackup(self.configuration).backup()
+        backed_up: list[tuple] = self.get_rows(self.query_manager.connection)
+        self.change_groups()
+
+        def interrupt(message: str = "", **kwargs) -> None:
+            if message.startswith("copied 2/"):
+                raise KeyboardInterrupt()
+
+        with mock.patch("builtins.print", side_effect=interrupt), self.assertRaises(KeyboardInterrupt):
+            DatabaseBackup(self.configuration).backup(incremental=True)
+        self.assertEqual(self.get_backup_rows(), backed_up)
+
+
+if __name__ == "__main__":
+    unittest.main()
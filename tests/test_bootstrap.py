@@ -0,0 +1,103 @@
+import configparser
+import os
+import tempfile
+import unittest
+from typing import Iterator
+
+from adapter.database.bulk_writer import BulkWriter
+from adapter.generator.bootstrap import Bootstrap
+from adapter.generator.checkpoint import BootstrapCheckpoint
+from model.model import Base
+from modules.configuration import Configuration
+from modules.connectionManager import ConnectionManager
+from modules.queryManager import QueryManager
+
+
+class TwoGroupsTest(unittest.TestCase):
+    """
+    The same users are in two groups, a bootstrap of one group must only see the rows of this group.
+    """
+
+    def setUp(self) -> None:
+        self.directory: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        parser: configparser.ConfigParser = configparser.ConfigParser()
+        parser.read(Configuration.get_config_template_path())
+        parser["database"]["running"] = f"sqlite:///{os.path.join(self.directory.name, 'db.sqlite')}"
+        parser["database"]["backup"] = os.path.join(self.directory.name, "db.sqlite.bak")
+        parser["queries"]["path"] = Configuration.get_query_template_path()
+        parser["cache"]["path"] = os.path.join(self.directory.name, "cache")
+        config_path: str = os.path.join(self.directory.name, "configuration.ini")
+        with open(config_path, "w") as config_file:
+            parser.write(config_file)
+
+        self.configuration: Configuration = Configuration(config_path)
+        Base.metadata.create_all(ConnectionManager.get(self.configuration).engine)
+        with BulkWriter(self.configuration) as writer:
+            writer.ensure_group(1, "test")
+            writer.ensure_group(2, "other")
+            writer.insert_collections(1, [1, 2], ["2022-01-01", "2022-01-01"], [1, 1])
+            writer.insert_collections(2, [1, 2], ["2022-01-01", "2022-01-01"], [1000, 1000])
+        self.query_manager: QueryManager = QueryManager(self.configuration)
+
+    def tearDown(self) -> None:
+        ConnectionManager.close_all()
+        self.directory.cleanup()
+
+    def get_bootstrap(self, storage: str) -> Bootstrap:
+        bootstrap: Bootstrap = Bootstrap(config=self.configuration, seed=1)
+        bootstrap.storage = storage
+        bootstrap.set_original_dataset(
+            self.query_manager.get_result("data_as_bootstrap_sample", group_id=1), group_id=1)
+        return bootstrap
+
+    def test_matrix_of_the_test_group(self) -> None:
+        self.assertEqual(self.get_bootstrap("aggregate").get_matrix().get_daily_totals().tolist(), [2])
+
+    def test_matrix_cache_is_rebuilt_after_a_write(self) -> None:
+        self.assertEqual(self.get_bootstrap("aggregate").get_matrix().get_daily_totals().tolist(), [2])
+        with BulkWriter(self.configuration) as writer:
+            writer.insert_collections(1, [1], ["2022-01-01"], [5])
+        self.assertEqual(self.get_bootstrap("aggregate").get_matrix().get_daily_totals().tolist(), [7])
+
+    def test_user_index_of_the_test_group(self) -> None:
+        user_index: dict[int, list] = self.get_bootstrap("rows").build_user_index([1, 2])
+        self.assertEqual({user_id: [row[-1] for row in rows] for user_id, rows in user_index.items()}, {1: [1], 2: [1]})
+
+    def test_stored_samples_of_the_test_group(self) -> None:
+        bootstrap: Bootstrap = self.get_bootstrap("rows")
+        list(bootstrap.stream(3, batch_size=3, sample_start_id=3))
+        totals: list[tuple] = self.query_manager.connection.execute(
+            "SELECT group_id, SUM(value) FROM collections WHERE group_id >= 3 GROUP BY group_id").fetchall()
+        self.assertEqual(totals, [(3, 2), (4, 2), (5, 2)])
+
+    def test_empty_test_group_is_rejected(self) -> None:
+        bootstrap: Bootstrap = Bootstrap(config=self.configuration, seed=1)
+        bootstrap.set_original_dataset(
+            self.query_manager.get_result("data_as_bootstrap_sample", group_id=0), group_id=0)
+        with self.assertRaisesRegex(ValueError, "test-group 0 has no rows"):
+            bootstrap.choice(3)
+        with self.assertRaisesRegex(ValueError, "test-group 0 has no rows"):
+            next(bootstrap.stream(3, workers=2))
+
+    def test_resume_keeps_the_configured_storage(self) -> None:
+        checkpoint_path: str = os.path.join(self.directory.name, "checkpoint.json")
+        run: Iterator[int] = self.get_bootstrap("weighted").stream(
+            3, batch_size=1, sample_start_id=3, checkpoint_path=checkpoint_path)
+        next(run)
+        run.close()
+
+        bootstrap: Bootstrap = self.get_bootstrap("rows")
+        list(bootstrap.resume(BootstrapCheckpoint.load(checkpoint_path)))
+        self.assertEqual(bootstrap.storage, "rows")
+        weighted: list[tuple] = self.query_manager.connection.execute(
+            "SELECT DISTINCT group_id FROM sample_weights ORDER BY group_id").fetchall()
+        self.assertEqual(weighted, [(3,), (4,), (5,)])
+
+        list(bootstrap.stream(1, sample_start_id=6))
+        totals: list[tuple] = self.query_manager.connection.execute(
+            "SELECT group_id, SUM(value) FROM collections WHERE group_id >= 3 GROUP BY group_id").fetchall()
+        self.assertEqual(totals, [(6, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
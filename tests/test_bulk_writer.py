@@ -0,0 +1,67 @@
+import unittest
+
+from adapter.database.bulk_writer import BulkWriter
+from commands.setup import DatabaseCommand
+from tests.database_test_case import DatabaseTestCase
+
+
+class BulkWriterTest(DatabaseTestCase):
+    """
+    The rows and the statistics of a group are written in one transaction, a failed write leaves nothing behind.
+    """
+
+    stats_query: str = "SELECT group_id, storage, nr_of_rows, nr_of_users, min_date, max_date, value_sum FROM group_stats"
+
+    def test_rows_and_statistics_are_committed_together(self) -> None:
+        with BulkWriter(self.configuration) as writer:
+            writer.ensure_group(1, "test")
+            writer.insert_collections(1, [1, 2, 2], ["2022-01-02", "2022-01-01", "2022-01-03"], [1, 2, 3])
+        self.assertEqual(self.fetch("SELECT group_id, user_id, date, value FROM collections ORDER BY id"), [
+            (1, 1, "2022-01-02", 1), (1, 2, "2022-01-01", 2), (1, 2, "2022-01-03", 3)
+        ])
+        self.assertEqual(self.fetch(self.stats_query), [(1, "rows", 3, 2, "2022-01-01", "2022-01-03", 6)])
+        self.assertEqual(self.fetch("SELECT group_id, version FROM group_versions"), [(1, 1)])
+
+    def test_failed_write_is_rolled_back(self) -> None:
+        with self.assertRaises(RuntimeError):
+            with BulkWriter(self.configuration) as writer:
+                writer.ensure_group(1, "test")
+                writer.insert_collections(1, [1, 2], ["2022-01-01", "2022-01-01"], [1, 2])
+                raise RuntimeError("the write fails")
+        for table_name in ["groups", "collections", "group_stats", "group_versions"]:
+            self.assertEqual(self.fetch(f"SELECT COUNT(*) FROM {table_name}"), [(0,)], table_name)
+
+    def test_appended_and_deleted_rows_update_the_statistics(self) -> None:
+        with BulkWriter(self.configuration) as writer:
+            writer.ensure_group(1, "test")
+            writer.insert_collections(1, [1, 2], ["2022-01-02", "2022-01-03"], [1, 2])
+        with BulkWriter(self.configuration) as writer:
+            writer.insert_collections(1, [2, 3], ["2022-01-01", "2022-01-03"], [10, 20])
+        with BulkWriter(self.configuration) as writer:
+            self.assertEqual(writer.delete_collections(1, [1], ["2022-01-02"]), 1)
+        self.query_manager.count_users()
+        merged: list[tuple] = self.fetch(self.stats_query)
+        # the deleted rows do not narrow the date range, it is only widened by new rows
+        self.assertEqual(merged, [(1, "rows", 3, 2, "2022-01-01", "2022-01-03", 32)])
+        self.assertEqual(self.fetch("SELECT version FROM group_versions WHERE group_id = 1"), [(3,)])
+
+        self.query_manager.refresh_group_stats(1)
+        self.assertEqual(self.fetch(self.stats_query)[0][:4], merged[0][:4])
+
+    def test_migrate_counts_the_statistics_of_an_old_database(self) -> None:
+        with BulkWriter(self.configuration) as writer:
+            writer.ensure_group(1, "test")
+            writer.insert_collections(1, [1, 2], ["2022-01-01", "2022-01-02"], [1, 2])
+        self.query_manager.connection.executescript(
+            "DROP TABLE group_stats; DROP TABLE group_versions; DROP TABLE import_digests; "
+            "DROP INDEX ix_collections_user_id_group_id;"
+        )
+        DatabaseCommand(None, self.configuration).migrate()
+        self.assertEqual(self.fetch(self.stats_query), [(1, "rows", 2, 2, "2022-01-01", "2022-01-02", 3)])
+        self.assertEqual(self.fetch("SELECT COUNT(*) FROM import_digests"), [(0,)])
+        self.assertEqual(self.fetch("SELECT name FROM sqlite_master WHERE name = 'ix_collections_user_id_group_id'"),
+                         [("ix_collections_user_id_group_id",)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import unittest
+from unittest import mock
+
+from adapter.database.bulk_writer import BulkWriter
+from adapter.database.columnar_store import ColumnarStore
+from adapter.database.storage_backend import get_storage_backend
+from adapter.generator.bootstrap import Bootstrap
+from modules.configuration import Configuration
+from modules.queryManager import QueryManager
+from tests.database_test_case import DatabaseTestCase
+
+
+class ColumnarAggregationTest(DatabaseTestCase):
+    """
+    The columnar storage answers the aggregation queries itself, with the same rows as the SQL on the sqlite storage.
+    """
+
+    queries: str = """[queries]
+final_aggregation =
+    SELECT cd.date, cd.group_id, sum(cd.value)
+    FROM collections cd
+    WHERE cd.group_id IN (1, 2) AND cd.date BETWEEN '2022-01-02' AND '2022-01-09'
+    GROUP BY 1, 2
+final_aggregation_weighted =
+    SELECT cd.date, sw.group_id, sum(cd.value * sw.multiplicity)
+    FROM sample_weights sw
+    JOIN collections cd ON cd.user_id = sw.user_id AND cd.group_id = sw.source_group_id
+    WHERE sw.group_id >= 4 AND cd.date < '2022-01-08'
+    GROUP BY 1, 2
+"""
+
+    def get_settings(self) -> dict[str, dict[str, str]]:
+        with open(self.get_path("queries.ini"), "w") as queries_file:
+            queries_file.write(self.queries)
+        return {"queries": {"path": self.get_path("queries.ini")}, "bootstrap": {"storage": "weighted"}}
+
+    def setUp(self) -> None:
+        super().setUp()
+        columnar: dict[str, dict[str, str]] = self.get_settings()
+        columnar["database"] = {"running": f"sqlite:///{self.get_path('columnar.sqlite')}"}
+        # small chunks, so that the zone maps skip some of them
+        columnar["storage"] = {"backend": "columnar", "chunk_size": "4"}
+        self.columnar: Configuration = self.create_database(columnar, "columnar.ini")
+        for configuration in (self.configuration, self.columnar):
+            self.write_groups(configuration)
+
+    @staticmethod
+    def write_groups(configuration: Configuration) -> None:
+        with BulkWriter(configuration) as writer:
+            for group_id in [1, 2, 3]:
+                writer.ensure_group(group_id, f"group {group_id}")
+                for day in range(1, 11):
+                    users: list[int] = [user_id for user_id in range(1, 6) if (user_id + day) % 3 != 0]
+                    writer.insert_collections(
+                        group_id, users, [f"2022-01-{day:02d}"] * len(users),
+                        [user_id * day * group_id for user_id in users]
+                    )
+        query_manager: QueryManager = QueryManager(configuration)
+        bootstrap: Bootstrap = Bootstrap(config=configuration, seed=7)
+        bootstrap.set_original_dataset(query_manager.get_result("data_as_bootstrap_sample", group_id=2), group_id=2)
+        list(bootstrap.stream(3, batch_size=2, sample_start_id=4))
+
+    def test_final_aggregation(self) -> None:
+        store: ColumnarStore = get_storage_backend(self.columnar)
+        with mock.patch.object(store, "read_chunk", wraps=store.read_chunk) as read_chunk:
+            rows: list[tuple] = QueryManager(self.columnar).get_result("final_aggregation")
+        self.assertEqual(rows, sorted(self.query_manager.get_result("final_aggregation")))
+        self.assertEqual({(group_id, date) for date, group_id, _ in rows},
+                         {(group_id, f"2022-01-{day:02d}") for group_id in [1, 2] for day in range(2, 10)})
+
+        # the chunks of group 3 and the chunks after the last date are not opened
+        read: set[str] = {os.path.relpath(call.args[0], store.path) for call in read_chunk.call_args_list}
+        chunks: dict[str, list[dict]] = store.manifest["groups"]
+        self.assertEqual(read, {
+            os.path.join(f"group_{group_id}", chunk["file"]) for group_id in ["1", "2"] for chunk in chunks[group_id]
+            if chunk["min_date"] <= "2022-01-09" and chunk["max_date"] >= "2022-01-02"
+        })
+        self.assertLess(len(read), sum(len(chunks[group_id]) for group_id in ["1", "2"]))
+
+    def test_final_aggregation_weighted(self) -> None:
+        rows: list[tuple] = QueryManager(self.columnar).get_result("final_aggregation_weighted")
+        self.assertEqual(rows, sorted(self.query_manager.get_result("final_aggregation_weighted")))
+        self.assertEqual({group_id for _, group_id, _ in rows}, {4, 5, 6})
+
+    def test_other_conditions_are_rejected(self) -> None:
+        query_manager: QueryManager = QueryManager(self.columnar)
+        query_manager.query_parser["queries"]["final_aggregation"] = \
+            "SELECT date, group_id, sum(value) FROM collections WHERE group_id = 1 OR value > 3 GROUP BY 1, 2"
+        with self.assertRaises(ValueError):
+            query_manager.get_result("final_aggregation")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import sqlite3
+import threading
+import unittest
+
+from adapter.database.bulk_writer import BulkWriter
+from modules.connectionManager import ConnectionManager
+from modules.queryManager import QueryManager
+from tests.database_test_case import DatabaseTestCase
+
+
+class ConnectionManagerTest(DatabaseTestCase):
+    """
+    The query managers share one connection, in WAL mode they read while a writer holds the write lock,
+    and a writer retries while another connection holds the lock.
+    """
+
+    # a locked database fails at once, so the writers only wait through their retries
+    settings = {"database": {"busy_timeout": "0", "lock_retries": "5"}}
+
+    def setUp(self) -> None:
+        super().setUp()
+        with BulkWriter(self.configuration) as writer:
+            writer.ensure_group(1, "test")
+            writer.insert_collections(1, [1], ["2022-01-01"], [1])
+        self.blocker: sqlite3.Connection = ConnectionManager.get(self.configuration).connect(
+            isolation_level=None, check_same_thread=False)
+
+    def tearDown(self) -> None:
+        self.blocker.close()
+        super().tearDown()
+
+    def count_rows(self) -> int:
+        return self.fetch("SELECT COUNT(*) FROM collections")[0][0]
+
+    def test_query_managers_share_the_connection(self) -> None:
+        self.assertIs(QueryManager(self.configuration).connection, self.query_manager.connection)
+        ConnectionManager.get(self.configuration).close()
+        # the connection is opened again on its next use
+        self.assertEqual(self.count_rows(), 1)
+
+    def test_readers_do_not_wait_for_a_writer(self) -> None:
+        self.assertEqual(self.fetch("PRAGMA journal_mode"), [("wal",)])
+        writer: BulkWriter = BulkWriter(self.configuration)
+        writer.insert_collections(1, [2], ["2022-01-01"], [2])
+        # the writer holds the write lock, the reader sees the last commit
+        self.assertEqual(self.count_rows(), 1)
+        writer.close()
+        self.assertEqual(self.count_rows(), 2)
+
+    def test_writer_retries_while_the_database_is_locked(self) -> None:
+        self.blocker.execute("BEGIN IMMEDIATE")
+        timer: threading.Timer = threading.Timer(0.2, self.blocker.execute, ["COMMIT"])
+        timer.start()
+        try:
+            with BulkWriter(self.configuration) as writer:
+                writer.insert_collections(1, [2], ["2022-01-01"], [2])
+        finally:
+            timer.join()
+        self.assertEqual(self.count_rows(), 2)
+
+    def test_writer_gives_up_after_its_retries(self) -> None:
+        ConnectionManager.get(self.configuration).lock_retries = 1
+        self.blocker.execute("BEGIN IMMEDIATE")
+        with self.assertRaises(sqlite3.OperationalError):
+            with BulkWriter(self.configuration) as writer:
+                writer.insert_collections(1, [2], ["2022-01-01"], [2])
+        self.blocker.execute("ROLLBACK")
+        self.assertEqual(self.count_rows(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
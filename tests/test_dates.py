@@ -0,0 +1,64 @@
+import datetime
+import unittest.mock
+
+import numpy as np
+import pandas as pd
+
+from adapter.database.bulk_writer import BulkWriter
+from adapter.inserting.csv import ImportCSV
+from commands.setup import ShowCommand
+from modules.dates import DateCodec, to_date, to_days, to_iso
+from tests.database_test_case import DatabaseTestCase
+
+
+class DatesTest(unittest.TestCase):
+
+    def test_conversions(self) -> None:
+        days: np.ndarray = to_days(["1970-01-01", "2022-01-01", "2022-01-01T12:00:00"])
+        self.assertEqual(days.tolist(), [0, 18993, 18993])
+        self.assertEqual(to_days([datetime.date(2022, 1, 1), 18993]).tolist(), [18993, 18993])
+        self.assertEqual(to_iso([0, 18993]).tolist(), ["1970-01-01", "2022-01-01"])
+        self.assertEqual(to_iso(["2022-01-01"]).tolist(), ["2022-01-01"])
+        self.assertEqual(to_date(18993), datetime.date(2022, 1, 1))
+        self.assertEqual(to_date("2022-01-01"), datetime.date(2022, 1, 1))
+
+    def test_codecs(self) -> None:
+        self.assertEqual(DateCodec("days").encode(["2022-01-01", "2022-01-02"]).tolist(), [18993, 18994])
+        self.assertEqual(DateCodec("iso").encode([18993]).tolist(), ["2022-01-01"])
+        self.assertEqual(DateCodec("days").encode_value("2022-01-01"), 18993)
+        with self.assertRaises(ValueError):
+            DateCodec("unix")
+
+
+class DayNumberDatabaseTest(DatabaseTestCase):
+    """
+    A database with the days encoding stores day numbers, the dates are converted when they are shown.
+    """
+
+    settings = {"database": {"date_encoding": "days"}}
+
+    def test_written_and_imported_dates(self) -> None:
+        with BulkWriter(self.configuration) as writer:
+            writer.ensure_group(1, "written")
+            writer.insert_collections(1, [1, 2], ["2022-01-01", datetime.date(2022, 1, 3)], [1, 2])
+        path: str = self.get_path("rows.csv")
+        pd.DataFrame({"uid": [1, 2], "day": ["2022-01-01", "2022-01-03"], "val": [1, 2]}).to_csv(path, index=False)
+        ImportCSV(self.configuration).insert(2, "imported", "uid", "day", "val", csv_file=path)
+
+        for group_id in [1, 2]:
+            self.assertEqual(self.fetch("SELECT date, typeof(date) FROM collections WHERE group_id = ? ORDER BY date", group_id),
+                             [(18993, "integer"), (18995, "integer")])
+        self.assertEqual(self.fetch("SELECT DISTINCT min_date, max_date FROM group_stats"), [(18993, 18995)])
+        self.assertEqual(self.query_manager.get_result("group_dataset", 1), [(1, 18993, 1), (2, 18995, 2)])
+
+    def test_show_samples_converts_the_dates(self) -> None:
+        with BulkWriter(self.configuration) as writer:
+            writer.ensure_group(1, "written")
+            writer.insert_collections(1, [1], [18993], [1])
+        with unittest.mock.patch("builtins.print") as output:
+            ShowCommand(None, self.configuration).show_samples()
+        self.assertIn("2022-01-01", "".join(str(call.args[0]) for call in output.call_args_list if call.args))
+
+
+if __name__ == "__main__":
+    unittest.main()
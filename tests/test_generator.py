@@ -0,0 +1,64 @@
+import datetime
+import os
+import unittest
+
+import numpy as np
+
+from adapter.generator.generate_testdata import Generator
+from adapter.inserting.csv import ImportCSV
+from tests.database_test_case import DatabaseTestCase
+
+
+class GeneratorTest(DatabaseTestCase):
+    """
+    The generated rows only depend on the seed and the chunk size, they are written to the database
+    like an import or to files which can be imported.
+    """
+
+    settings = {"insert": {"chunk_size": "10", "commit_rows": "20"}}
+
+    def get_generator(self, seed: int | None = 1, group_id: int = 1) -> Generator:
+        return Generator(start_date=datetime.date(2022, 1, 1), start_user_id=5, group_id=group_id,
+                         value_range=(0, 3), seed=seed, config=self.configuration)
+
+    def get_chunks(self, generator: Generator) -> list[np.ndarray]:
+        return [np.stack(chunk) for chunk in generator.generate_chunks(users=7, days_per_user=4)]
+
+    def get_rows(self, group_id: int) -> list[tuple]:
+        return self.fetch(
+            "SELECT user_id, date, value FROM collections WHERE group_id = ? ORDER BY user_id, date", group_id)
+
+    def test_same_seed_gives_the_same_rows(self) -> None:
+        chunks: list[np.ndarray] = self.get_chunks(self.get_generator())
+        self.assertEqual(len(chunks), 4)
+        np.testing.assert_array_equal(np.concatenate(chunks, axis=1), np.concatenate(self.get_chunks(self.get_generator()), axis=1))
+        self.assertFalse(np.array_equal(
+            np.concatenate(chunks, axis=1), np.concatenate(self.get_chunks(self.get_generator(seed=2)), axis=1)))
+
+        user_ids, days, values = np.concatenate(chunks, axis=1)
+        self.assertEqual(sorted(set(user_ids.tolist())), list(range(5, 12)))
+        self.assertEqual(sorted(set(days.tolist())), list(range(18993, 18997)))
+        self.assertTrue(((values >= 0) & (values <= 3)).all())
+
+    def test_generated_group_in_the_database(self) -> None:
+        self.get_generator().generate_data(users=7, days_per_user=4)
+        self.assertEqual(self.fetch("SELECT id, name FROM groups"), [(1, "Generated 1")])
+        rows: list[tuple] = self.get_rows(1)
+        self.assertEqual(len(rows), 28)
+        self.assertEqual(self.fetch("SELECT nr_of_rows, nr_of_users, min_date, max_date, value_sum FROM group_stats"),
+                         [(28, 7, "2022-01-01", "2022-01-04", sum(row[2] for row in rows))])
+
+    def test_generated_files_import_the_same_rows(self) -> None:
+        self.get_generator().generate_data(users=7, days_per_user=4)
+        self.get_generator().generate_data(users=7, days_per_user=4, path=self.get_path("rows.csv.gz"))
+        self.get_generator().generate_data(users=7, days_per_user=4, path=self.get_path("parts"))
+        self.assertEqual(len(os.listdir(self.get_path("parts"))), 4)
+
+        ImportCSV(self.configuration).insert(2, "csv", "user_id", "date", "value", csv_file=self.get_path("rows.csv.gz"))
+        ImportCSV(self.configuration).insert_files(3, "npz", "user_id", "date", "value", path=self.get_path("parts"))
+        self.assertEqual(self.get_rows(2), self.get_rows(1))
+        self.assertEqual(self.get_rows(3), self.get_rows(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
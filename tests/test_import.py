@@ -0,0 +1,146 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from adapter.inserting import csv
+from adapter.inserting.csv import ImportCSV
+from tests.database_test_case import DatabaseTestCase
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class ImportTestCase(DatabaseTestCase):
+    """
+    The files are read in chunks of two rows, the import is committed every three rows.
+    """
+
+    settings = {"insert": {"workers": "2", "chunk_size": "2", "commit_rows": "3", "max_in_flight": "1"}}
+
+    rows: pd.DataFrame = pd.DataFrame({
+        "uid": [1, 1, 2, 3, 3],
+        "day": ["2022-01-01", "2022-01-02", "2022-01-01", "2022-01-03", "2022-01-04"],
+        "val": [1, 2, 3, 4, 5]
+    })
+
+    def write_csv(self, name: str, rows: pd.DataFrame) -> str:
+        path: str = self.get_path(name)
+        rows.to_csv(path, index=False, compression="infer")
+        return path
+
+    def get_rows(self, group_id: int = 1) -> list[tuple]:
+        return self.fetch("SELECT user_id, date, value FROM collections WHERE group_id = ? ORDER BY id", group_id)
+
+    def get_stats(self) -> list[tuple]:
+        self.query_manager.count_users()
+        return self.fetch("SELECT group_id, nr_of_rows, nr_of_users, min_date, max_date, value_sum FROM group_stats")
+
+
+class ImportTest(ImportTestCase):
+    """
+    A file is imported chunk by chunk, whatever its format.
+    """
+
+    def import_file(self, path: str, importer: ImportCSV | None = None) -> None:
+        (importer or ImportCSV(self.configuration)).insert(1, "import", "uid", "day", "val", csv_file=path)
+
+    def assert_imported(self) -> None:
+        self.assertEqual(self.get_rows(), list(self.rows.itertuples(index=False, name=None)))
+        self.assertEqual(self.get_stats(), [(1, 5, 3, "2022-01-01", "2022-01-04", 15)])
+
+    def test_chunked_import(self) -> None:
+        self.import_file(self.write_csv("rows.csv", self.rows))
+        self.assert_imported()
+
+    def test_compressed_files(self) -> None:
+        for extension in [".csv.gz", ".csv.bz2", ".csv.xz"] + ([".csv.zst"] if zstandard is not None else []):
+            with self.subTest(extension=extension):
+                self.query_manager.delete_sample(1)
+                self.import_file(self.write_csv(f"rows{extension}", self.rows))
+                self.assert_imported()
+
+    def test_npz_file(self) -> None:
+        path: str = self.get_path("rows.npz")
+        np.savez(path, uid=self.rows["uid"].to_numpy(), day=self.rows["day"].to_numpy().astype("datetime64[D]"),
+                 val=self.rows["val"].to_numpy())
+        self.import_file(path)
+        self.assert_imported()
+
+    @unittest.skipIf(csv.pa is None, "pyarrow is not installed")
+    def test_parquet_and_arrow_files(self) -> None:
+        table = csv.pa.Table.from_pandas(self.rows, preserve_index=False)
+        for extension in [".parquet", ".arrow"]:
+            with self.subTest(extension=extension):
+                path: str = self.get_path(f"rows{extension}")
+                if extension == ".parquet":
+                    csv.pq.write_table(table, path, row_group_size=2)
+                else:
+                    with csv.pa.ipc.new_file(path, table.schema) as writer:
+                        writer.write_table(table)
+                self.query_manager.delete_sample(1)
+                self.import_file(path)
+                self.assert_imported()
+
+    def test_failed_import_is_rolled_back(self) -> None:
+        rows: pd.DataFrame = self.rows.copy()
+        rows.loc[4, "day"] = "not a date"
+        importer: ImportCSV = ImportCSV(self.configuration)
+        # without a commit before the failing chunk
+        importer.commit_rows = 0
+        with self.assertRaises(ValueError):
+            self.import_file(self.write_csv("rows.csv", rows), importer)
+        self.assertEqual(self.fetch("SELECT COUNT(*) FROM groups"), [(0,)])
+        self.assertEqual(self.get_rows(), [])
+        self.assertEqual(self.get_stats(), [])
+
+    def test_failed_import_keeps_the_statistics_of_the_committed_rows(self) -> None:
+        rows: pd.DataFrame = self.rows.copy()
+        rows.loc[4, "day"] = "not a date"
+        with self.assertRaises(ValueError):
+            self.import_file(self.write_csv("rows.csv", rows))
+        # the first two chunks were committed
+        self.assertEqual(self.get_rows(), list(self.rows[:4].itertuples(index=False, name=None)))
+        self.assertEqual(self.get_stats(), [(1, 4, 3, "2022-01-01", "2022-01-03", 10)])
+
+
+class ImportFilesTest(ImportTestCase):
+    """
+    The files of a directory or glob pattern are imported into one group.
+    """
+
+    def import_files(self, group_id: int, path: str) -> None:
+        ImportCSV(self.configuration).insert_files(group_id, "import", "uid", "day", "val", path=path)
+
+    def test_files_of_a_pattern_are_imported(self) -> None:
+        self.write_csv("a.csv", self.rows[:3])
+        self.write_csv("b.csv.gz", self.rows[3:])
+        self.write_csv("c.txt", self.rows)
+        self.import_files(1, self.get_path("*"))
+        self.assertEqual(sorted(self.get_rows()), sorted(self.rows.itertuples(index=False, name=None)))
+        self.assertEqual(self.get_stats(), [(1, 5, 3, "2022-01-01", "2022-01-04", 15)])
+
+    def test_failed_file_stops_the_import(self) -> None:
+        rows: pd.DataFrame = self.rows.copy()
+        rows.loc[4, "day"] = "not a date"
+        for number in range(4):
+            self.write_csv(f"part-{number}.csv", self.rows)
+        self.write_csv("part-4.csv", rows)
+        with self.assertRaises(ValueError):
+            self.import_files(1, self.get_path("*.csv"))
+        # the committed rows and their statistics match
+        nr_of_rows: int = len(self.get_rows())
+        self.assertEqual(self.get_stats()[0][1], nr_of_rows)
+
+    def test_no_matching_files_create_no_group(self) -> None:
+        self.write_csv("rows.txt", self.rows)
+        self.import_files(1, self.get_path("*.csv"))
+        self.import_files(1, self.get_path("*.txt"))
+        self.assertEqual(self.fetch("SELECT id FROM groups"), [])
+        self.assertEqual(self.fetch("SELECT * FROM group_stats"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+import pandas as pd
+
+from adapter.inserting.csv import ImportCSV
+from tests.database_test_case import DatabaseTestCase
+
+
+class IncrementalImportTest(DatabaseTestCase):
+    """
+    A second export of the group only writes the new and changed days, missing days are kept.
+    """
+
+    # user ids above 2^32, 2^32 and 2^33 are only apart in the high bits
+    users: tuple[int, int, int] = (1, 2 ** 32, 2 ** 33)
+
+    def import_rows(self, rows: list[tuple[int, str, int]]) -> None:
+        path: str = self.get_path("export.csv")
+        pd.DataFrame(rows, columns=["uid", "day", "val"]).to_csv(path, index=False)
+        ImportCSV(self.configuration).insert_incremental(1, "export", "uid", "day", "val", path=path)
+
+    def get_rows(self) -> list[tuple]:
+        return self.fetch("SELECT user_id, date, value FROM collections WHERE group_id = 1 ORDER BY user_id, date, value")
+
+    def test_new_changed_and_missing_days(self) -> None:
+        small, large, larger = self.users
+        self.import_rows([
+            (small, "2022-01-01", 1), (small, "2022-01-02", 2),
+            (large, "2022-01-01", 3), (large, "2022-01-01", 4), (large, "2022-01-02", 5),
+            (larger, "2022-01-01", 6)
+        ])
+        self.import_rows([
+            # unchanged
+            (small, "2022-01-01", 1),
+            # changed, one row of the day is replaced
+            (large, "2022-01-01", 3), (large, "2022-01-01", 40),
+            # new, a user id which differs from another one only in the high bits
+            (larger, "2022-01-02", 7),
+            # changed
+            (larger, "2022-01-01", 60)
+            # missing: the second day of the small user and of the large user
+        ])
+        self.assertEqual(self.get_rows(), [
+            (small, "2022-01-01", 1), (small, "2022-01-02", 2),
+            (large, "2022-01-01", 3), (large, "2022-01-01", 40), (large, "2022-01-02", 5),
+            (larger, "2022-01-01", 60), (larger, "2022-01-02", 7)
+        ])
+        # the users of a group which got rows are counted when they are shown
+        self.query_manager.count_users()
+        self.assertEqual(self.fetch("SELECT nr_of_rows, nr_of_users, value_sum FROM group_stats"), [(7, 3, 118)])
+
+    def test_unchanged_export_writes_nothing(self) -> None:
+        rows: list[tuple[int, str, int]] = [(user_id, "2022-01-01", 1) for user_id in self.users]
+        self.import_rows(rows)
+        self.import_rows(rows)
+        self.assertEqual(self.get_rows(), [(user_id, "2022-01-01", 1) for user_id in self.users])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from adapter.database.bulk_writer import BulkWriter
+from tests.database_test_case import DatabaseTestCase
+
+
+class PartitionTest(DatabaseTestCase):
+    """
+    Every two groups are written to their own partition, the readers see all rows through the view.
+    """
+
+    settings = {"database": {"partition_size": "2"}}
+
+    def setUp(self) -> None:
+        super().setUp()
+        with BulkWriter(self.configuration) as writer:
+            for group_id in range(1, 6):
+                writer.ensure_group(group_id, f"group {group_id}")
+                writer.insert_collections(group_id, list(range(500)), ["2022-01-01"] * 500, [group_id] * 500)
+
+    def get_partitions(self) -> list[str]:
+        return [row[0] for row in self.fetch("SELECT table_name FROM partitions ORDER BY min_group_id")]
+
+    def test_rows_are_read_through_the_view(self) -> None:
+        self.assertEqual(self.get_partitions(), ["collections_p0", "collections_p1", "collections_p2"])
+        self.assertEqual(self.fetch("SELECT COUNT(*) FROM main.collections"), [(0,)])
+        self.assertEqual(self.fetch("SELECT group_id, COUNT(*), SUM(value) FROM collections GROUP BY group_id"),
+                         [(group_id, 500, 500 * group_id) for group_id in range(1, 6)])
+
+    def test_deleting_a_range_drops_its_partitions(self) -> None:
+        self.query_manager.delete_samples(2, 4)
+        # the partition of the groups 2 and 3 is dropped, group 4 is deleted from the partition of group 5
+        self.assertEqual(self.get_partitions(), ["collections_p0", "collections_p2"])
+        self.assertEqual(self.fetch("SELECT group_id, COUNT(*) FROM collections GROUP BY group_id"), [(1, 500), (5, 500)])
+        self.assertEqual(self.fetch("SELECT id FROM groups"), [(1,), (5,)])
+        self.assertEqual(self.fetch("SELECT group_id FROM group_stats"), [(1,), (5,)])
+        # the pages of the dropped partition are given back to the file system
+        self.assertEqual(self.fetch("PRAGMA freelist_count"), [(0,)])
+
+        # a new group in the range of the dropped partition gets a new partition
+        with BulkWriter(self.configuration) as writer:
+            writer.ensure_group(3, "new group 3")
+            writer.insert_collections(3, [1], ["2022-01-02"], [7])
+        self.assertEqual(self.get_partitions(), ["collections_p0", "collections_p1", "collections_p2"])
+        self.assertEqual(self.fetch("SELECT group_id, value FROM collections WHERE group_id = 3"), [(3, 7)])
+
+
+if __name__ == "__main__":
+    unittest.main()
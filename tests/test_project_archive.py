@@ -0,0 +1,75 @@
+import os
+import unittest
+
+from adapter.database.bulk_writer import BulkWriter
+from adapter.database.project_archive import ProjectArchive
+from modules.configuration import Configuration
+from modules.connectionManager import ConnectionManager
+from modules.queryManager import QueryManager
+from tests.database_test_case import DatabaseTestCase
+
+
+class ProjectArchiveTest(DatabaseTestCase):
+    """
+    The project files are stored with the relative paths of the data directory, the test runs in the temporary
+    directory. A snapshot holds the committed rows of the database, the chunks are shared between snapshots.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        os.makedirs(self.get_path(Configuration.get_database_directory_path()))
+        self.configuration = self.create_database(
+            {"database": {"running": f"sqlite:///{self.get_path('data/database/db.sqlite')}"}},
+            Configuration.get_config_path()
+        )
+        self.query_manager = QueryManager(self.configuration)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.directory.name)
+
+    def insert_group(self, group_id: int) -> None:
+        with BulkWriter(self.configuration) as writer:
+            writer.ensure_group(group_id, f"group {group_id}")
+            writer.insert_collections(group_id, [1, 2], ["2022-01-01", "2022-01-02"], [group_id, group_id])
+
+    def count_chunks(self, archive: ProjectArchive) -> int:
+        return sum(len(files) for _, _, files in os.walk(archive.chunk_path))
+
+    def test_restore_the_committed_rows(self) -> None:
+        self.insert_group(1)
+        # the rows are only in the WAL while the connection is open
+        self.assertTrue(os.path.getsize(self.get_path("data/database/db.sqlite-wal")) > 0)
+        archive: ProjectArchive = ProjectArchive(self.configuration, self.get_path("backups/first.snapshot"))
+        os.makedirs(self.get_path("backups"))
+        archive.create()
+
+        self.insert_group(2)
+        ConnectionManager.close_all()
+        archive.restore()
+        self.query_manager = QueryManager(self.configuration)
+        self.assertEqual(self.fetch("SELECT id, name FROM groups"), [(1, "group 1")])
+        self.assertEqual(self.fetch("SELECT group_id, user_id, value FROM collections"), [(1, 1, 1), (1, 2, 1)])
+        self.assertTrue(os.path.exists(self.get_path("data/config/queries.ini")))
+
+    def test_snapshots_share_their_chunks(self) -> None:
+        self.insert_group(1)
+        os.makedirs(self.get_path("backups"))
+        ProjectArchive(self.configuration, self.get_path("backups/first.snapshot")).create()
+        archive: ProjectArchive = ProjectArchive(self.configuration, self.get_path("backups/second.snapshot"))
+        nr_of_chunks: int = self.count_chunks(archive)
+        self.assertTrue(nr_of_chunks > 0)
+        archive.create()
+        self.assertEqual(self.count_chunks(archive), nr_of_chunks)
+
+        # a damaged chunk is not restored
+        chunk_directory, _, chunk_files = next(
+            (root, directories, files) for root, directories, files in os.walk(archive.chunk_path) if files
+        )
+        with open(os.path.join(chunk_directory, chunk_files[0]), "wb") as chunk_file:
+            chunk_file.write(b"damaged")
+        ConnectionManager.close_all()
+        with self.assertRaises(Exception):
+            archive.restore()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from adapter.database.bulk_writer import BulkWriter
+from modules import queryEngine
+from modules.configuration import Configuration
+from modules.queryManager import QueryManager
+from tests.database_test_case import DatabaseTestCase
+
+
+class QueryEngineTest(DatabaseTestCase):
+    """
+    The queries of the engine return the rows of sqlite, also when duckdb is not installed.
+    """
+
+    def test_engine_queries_match_sqlite(self) -> None:
+        for group_id in [1, 2, 3]:
+            with BulkWriter(self.configuration) as writer:
+                writer.ensure_group(group_id, f"group {group_id}")
+                writer.insert_collections(group_id, [1, 2, 3], ["2022-01-01", "2022-01-01", "2022-01-02"],
+                                          [group_id, 2 * group_id, 3 * group_id])
+
+        engine_configuration: Configuration = self.write_configuration(
+            {"queries": {"engine": "duckdb", "engine_queries": "final_aggregation, distinct_users"}}, "engine.ini"
+        )
+        engine_query_manager: QueryManager = QueryManager(engine_configuration)
+        if not queryEngine.DuckDBEngine.is_available():
+            self.assertIsNone(engine_query_manager.engine)
+
+        self.assertEqual(sorted(engine_query_manager.get_result("final_aggregation")),
+                         sorted(self.query_manager.get_result("final_aggregation")))
+        self.assertEqual(sorted(self.query_manager.get_result("final_aggregation")),
+                         [("2022-01-01", 3, 9), ("2022-01-02", 3, 9)])
+
+
+if __name__ == "__main__":
+    unittest.main()